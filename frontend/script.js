@@ -10,29 +10,45 @@ const loadingDiv = document.getElementById('loading');
 const errorDiv = document.getElementById('error');
 const resultsDiv = document.getElementById('results');
 
-// Store fighters list
-let allFighters = [];
+// Typeahead settings
+const SEARCH_LIMIT = 10;
+const SEARCH_DELAY_MS = 150;
+let searchTimer = null;
+let searchRequest = 0;
 
-// Load fighters on page load
-async function loadFighters() {
+// Suggest fighters matching the text typed so far
+async function searchFighters(query) {
+    const request = ++searchRequest;
+    if (!query) {
+        fightersList.innerHTML = '';
+        return;
+    }
     try {
-        const response = await fetch(`${API_URL}/fighters`);
+        const params = new URLSearchParams({ q: query, limit: SEARCH_LIMIT });
+        const response = await fetch(`${API_URL}/fighters/search?${params}`);
         const data = await response.json();
-        allFighters = data.fighters;
+        // Ignore responses overtaken by a newer keystroke
+        if (request !== searchRequest) return;
         
         // Populate datalist
         fightersList.innerHTML = '';
-        allFighters.forEach(fighter => {
+        data.fighters.forEach(fighter => {
             const option = document.createElement('option');
             option.value = fighter;
             fightersList.appendChild(option);
         });
     } catch (error) {
-        showError('Failed to load fighters. Please refresh the page.');
-        console.error('Error loading fighters:', error);
+        console.error('Error searching fighters:', error);
     }
 }
 
+// Search shortly after the user stops typing
+function scheduleSearch(event) {
+    clearTimeout(searchTimer);
+    const query = event.target.value.trim();
+    searchTimer = setTimeout(() => searchFighters(query), SEARCH_DELAY_MS);
+}
+
 // Validate inputs and enable/disable button
 function validateInputs() {
     const fighter1 = fighter1Input.value.trim();
@@ -166,8 +182,7 @@ async function predictFight() {
 // Event Listeners
 fighter1Input.addEventListener('input', validateInputs);
 fighter2Input.addEventListener('input', validateInputs);
+fighter1Input.addEventListener('input', scheduleSearch);
+fighter2Input.addEventListener('input', scheduleSearch);
 predictBtn.addEventListener('click', predictFight);
 
-// Load fighters when page loads
-loadFighters();
-
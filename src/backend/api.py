@@ -1,19 +1,76 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
+import io
+import os
+import secrets
+import time
+from functools import partial
+import numpy as np
 from pathlib import Path
-from fighters import get_all_fighters, fighter_exists, _get_preprocessed_data, _get_features_data
-from predict import predict_fight, _get_model
+from typing import Dict, List, Optional, Union
+from fighters import (get_all_fighters, search_fighters, fighter_exists, get_weightclass_fighters, get_event_card,
+                      _get_fighter_index)
+from predict import (predict_fight, predict_fights, predict_card, predict_matrix, prediction_cache, reload_plan, refresh_plan,
+                     stage_latency, _get_plan)
+from serving import load_bundle, split_bout, watched_files_signature
+from metrics import ScrapedMetric, render
+from backend.batching import PredictionBatcher
+from backend.reloading import ServingReloader
+from backend.streaming import NDJSONStreamingResponse, stream_predictions
+from backend.instrumentation import RequestMetricsMiddleware, request_count, request_latency
 
 app = FastAPI(title="UFC Predictor API")
 
+# Most matchups accepted by one /predict/batch request
+MAX_BATCH_SIZE = 10000
+
+# Matchups scored per model call by /predict/stream (overridable per request, up to MAX_BATCH_SIZE)
+STREAM_CHUNK_SIZE = 1024
+
+# Opt-in micro-batching of /predict: set PREDICT_BATCH_WINDOW_MS (e.g. 2-5) to score requests
+# arriving within that window together, up to PREDICT_MAX_BATCH_SIZE per model call
+PREDICT_BATCH_WINDOW_MS = float(os.environ.get("PREDICT_BATCH_WINDOW_MS", 0))
+PREDICT_MAX_BATCH_SIZE = int(os.environ.get("PREDICT_MAX_BATCH_SIZE", 64))
+
+# Response header naming the model and feature snapshot a prediction was made with
+VERSION_HEADER = "X-Model-Version"
+
+# Hot reload of the model and snapshot: POST /admin/reload with an X-Admin-Token header
+# matching ADMIN_TOKEN (disabled when unset). POST /admin/refresh, every
+# REFRESH_INTERVAL_HOURS, or within RELOAD_POLL_SECONDS of the serving bundle, model file or
+# data CSVs changing, brings the serving bundle up to date (rebuilding it from new data in a
+# separate process) and serves it
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+RELOAD_POLL_SECONDS = float(os.environ.get("RELOAD_POLL_SECONDS", 0))
+REFRESH_INTERVAL_HOURS = float(os.environ.get("REFRESH_INTERVAL_HOURS", 0))
+reloader = ServingReloader(reload_plan, watched_files_signature, RELOAD_POLL_SECONDS,
+                           refresh_plan, REFRESH_INTERVAL_HOURS * 3600)
+
+# Scores a micro-batch with one plan, tagging each result with its version
+def _predict_pairs(pairs):
+    plan = _get_plan()
+    return [dict(result, version=plan.label) for result in predict_fights(pairs, plan=plan)]
+
+batcher = PredictionBatcher(_predict_pairs, PREDICT_BATCH_WINDOW_MS, PREDICT_MAX_BATCH_SIZE) if PREDICT_BATCH_WINDOW_MS > 0 else None
+
 @app.on_event("startup")
 async def startup_event():
-    _get_preprocessed_data()
-    _get_features_data()
-    _get_model()
+    # Boot from the prebuilt serving bundle (python src/serving.py) when it matches the
+    # model and data; otherwise build the index and snapshots from the data
+    load_bundle()
+    _get_fighter_index()
+    reloader.version = _get_plan().label
+    reloader.start_watching()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    reloader.stop_watching()
+    if batcher is not None:
+        await batcher.close()
 
 # Get frontend directory path (works for both local and deployed)
 frontend_dir = Path(__file__).parent.parent.parent / "frontend"
@@ -35,6 +92,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latency and status of every request, exported at /metrics
+app.add_middleware(RequestMetricsMiddleware)
+
 class PredictionRequest(BaseModel):
     fighter1: str
     fighter2: str
@@ -46,18 +106,231 @@ class PredictionResponse(BaseModel):
     fighter2_win_probability: float
     predicted_winner: str
 
+class BatchPredictionItem(BaseModel):
+    fighter1: str
+    fighter2: str
+    fighter1_win_probability: Optional[float] = None
+    fighter2_win_probability: Optional[float] = None
+    predicted_winner: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchPredictionResponse(BaseModel):
+    predictions: List[BatchPredictionItem]
+
+class CardRequest(BaseModel):
+    # An event in the data, or ad-hoc bouts ("Fighter1 vs. Fighter2" or fighter1/fighter2)
+    event: Optional[str] = None
+    bouts: Optional[List[Union[str, PredictionRequest]]] = None
+
+class CardPredictionItem(BatchPredictionItem):
+    cached: bool
+    latency_ms: float
+
+class CardPredictionResponse(BaseModel):
+    event: Optional[str] = None
+    bouts: List[CardPredictionItem]
+    timings_ms: Dict[str, float]
+
+# Most names returned by one /fighters/search request
+MAX_SEARCH_LIMIT = 50
+
 @app.get("/fighters")
 def list_fighters():
     return {"fighters": get_all_fighters()}
 
-@app.post("/predict", response_model=PredictionResponse)
-def predict(request: PredictionRequest):
-    if request.fighter1 == request.fighter2:
-        raise HTTPException(400, "Fighter1 and Fighter2 must be different")
-    
+# Typeahead search: case- and accent-insensitive prefix and trigram matching, active fighters first
+@app.get("/fighters/search")
+def find_fighters(q: str = "", limit: int = 10):
+    return {"fighters": search_fighters(q, max(0, min(limit, MAX_SEARCH_LIMIT)))}
+
+# Checks both fighters exist (timed as the 'validate' stage whether or not /predict batches)
+def _validate_fighters(request: PredictionRequest):
+    start = time.perf_counter()
     if not fighter_exists(request.fighter1):
         raise HTTPException(404, f"Fighter '{request.fighter1}' not found")
     if not fighter_exists(request.fighter2):
         raise HTTPException(404, f"Fighter '{request.fighter2}' not found")
+    stage_latency.observe(('validate', 'fight'), time.perf_counter() - start)
+
+def _predict_one(request: PredictionRequest, plan):
+    _validate_fighters(request)
+    try:
+        return predict_fight(request.fighter1, request.fighter2, plan=plan)
+    except ValueError as e:
+        # A fighter added by a reload that finished after this request took its plan
+        raise HTTPException(404, str(e))
+
+@app.post("/predict", response_model=PredictionResponse)
+async def predict(request: PredictionRequest):
+    if request.fighter1 == request.fighter2:
+        raise HTTPException(400, "Fighter1 and Fighter2 must be different")
+    
+    if batcher is None:
+        # The request keeps this plan even if a reload swaps in a new one meanwhile
+        plan = _get_plan()
+        result, version = await run_in_threadpool(_predict_one, request, plan), plan.label
+    else:
+        _validate_fighters(request)
+        try:
+            result = await batcher.predict(request.fighter1, request.fighter2)
+        except ValueError as e:
+            raise HTTPException(404, str(e))
+        version = result.pop('version')
+    
+    # The result already has PredictionResponse's fields, so it is rendered directly (and timed)
+    start = time.perf_counter()
+    rendered = JSONResponse(result, headers={VERSION_HEADER: version})
+    stage_latency.observe(('serialize', 'fight'), time.perf_counter() - start)
+    return rendered
+
+# Every metric in the Prometheus text format: request latency and counts per route, time
+# per prediction stage, prediction cache, reloads, micro-batching and the served version
+@app.get("/metrics")
+def prometheus_metrics():
+    metrics = [request_latency, request_count, stage_latency, *_scrape_metrics]
+    return PlainTextResponse(render(metrics), media_type="text/plain; version=0.0.4")
+
+def _cache_stat(key):
+    return lambda: [((), prediction_cache.stats()[key])]
+
+def _cache_hit_ratio():
+    stats = prediction_cache.stats()
+    lookups = stats['hits'] + stats['misses']
+    return [((), stats['hits'] / lookups if lookups else 0.0)]
+
+def _batching_stat(key):
+    return lambda: [((), batcher.stats()[key])] if batcher is not None else []
+
+# Metrics read from the cache, reloader and batcher when /metrics is scraped
+_scrape_metrics = [
+    ScrapedMetric('ufc_model_info', "Model and feature snapshot being served", 'gauge',
+                  lambda: [((reloader.version,), 1)], ('version',)),
+    ScrapedMetric('ufc_prediction_cache_hits_total', "Prediction cache hits", 'counter', _cache_stat('hits')),
+    ScrapedMetric('ufc_prediction_cache_misses_total', "Prediction cache misses", 'counter', _cache_stat('misses')),
+    ScrapedMetric('ufc_prediction_cache_evictions_total', "Prediction cache evictions", 'counter', _cache_stat('evictions')),
+    ScrapedMetric('ufc_prediction_cache_size', "Predictions in the cache", 'gauge', _cache_stat('size')),
+    ScrapedMetric('ufc_prediction_cache_hit_ratio', "Prediction cache hits per lookup since startup", 'gauge',
+                  _cache_hit_ratio),
+    ScrapedMetric('ufc_reloads_total', "Successful reloads and refreshes", 'counter', lambda: [((), reloader.reloads)]),
+    ScrapedMetric('ufc_reload_failures_total', "Failed reloads and refreshes", 'counter', lambda: [((), reloader.failures)]),
+    ScrapedMetric('ufc_batches_total', "Micro-batches scored for /predict", 'counter', _batching_stat('batches')),
+    ScrapedMetric('ufc_batched_requests_total', "/predict requests scored in micro-batches", 'counter',
+                  _batching_stat('requests')),
+]
+
+# Prediction cache size and hit/miss counters
+@app.get("/metrics/cache")
+def cache_metrics():
+    return prediction_cache.stats()
+
+# Micro-batching window, batch sizes and queueing delay of /predict (empty when disabled)
+@app.get("/metrics/batching")
+def batching_metrics():
+    return {"enabled": batcher is not None, **(batcher.stats() if batcher is not None else {})}
+
+# Model and snapshot being served, and the outcome of the latest reload
+@app.get("/metrics/reload")
+def reload_metrics():
+    return reloader.stats()
+
+# Rebuild the model and snapshot from the files on disk in the background and swap them in
+# once warmed; requests keep being served by the current version meanwhile
+@app.post("/admin/reload", status_code=202)
+def admin_reload(x_admin_token: Optional[str] = Header(None)):
+    _check_admin_token(x_admin_token)
+    return {"started": reloader.trigger('reload'), **reloader.stats()}
+
+# Pick up new rows in the data CSVs: rebuild the serving bundle in a separate process,
+# validate it (fighter count, no all-NaN model inputs, smoke predictions), publish it
+# atomically and swap it in. Does nothing when the bundle is already up to date
+@app.post("/admin/refresh", status_code=202)
+def admin_refresh(x_admin_token: Optional[str] = Header(None)):
+    _check_admin_token(x_admin_token)
+    return {"started": reloader.trigger('refresh'), **reloader.stats()}
+
+def _check_admin_token(token):
+    if not ADMIN_TOKEN:
+        raise HTTPException(403, "Reloading is disabled; set ADMIN_TOKEN to enable it")
+    if token is None or not secrets.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(403, "Invalid admin token")
+
+# Predict many matchups in one request; invalid pairs get an error instead of failing the batch
+@app.post("/predict/batch", response_model=BatchPredictionResponse)
+def predict_batch(requests: List[PredictionRequest], response: Response):
+    if len(requests) > MAX_BATCH_SIZE:
+        raise HTTPException(400, f"At most {MAX_BATCH_SIZE} matchups per batch")
+    
+    plan = _get_plan()
+    response.headers[VERSION_HEADER] = plan.label
+    pairs = [(request.fighter1, request.fighter2) for request in requests]
+    return BatchPredictionResponse(predictions=predict_fights(pairs, plan=plan))
+
+# Bulk scoring of any number of matchups: an NDJSON body of {"fighter1", "fighter2"} lines in,
+# one NDJSON result per line out, in order. Lines are scored chunk_size at a time as they
+# arrive and each chunk is sent as soon as it is scored, so memory does not grow with the
+# request and results start before the upload ends. Bypasses the prediction cache
+@app.post("/predict/stream")
+async def predict_stream(request: Request, chunk_size: int = STREAM_CHUNK_SIZE):
+    if not 1 <= chunk_size <= MAX_BATCH_SIZE:
+        raise HTTPException(400, f"chunk_size must be between 1 and {MAX_BATCH_SIZE}")
+    
+    # The whole stream is scored with one plan, even if a reload swaps in a new one meanwhile
+    plan = _get_plan()
+    predict_many = partial(predict_fights, plan=plan, cache=False)
+    return NDJSONStreamingResponse(stream_predictions(request.stream(), predict_many, chunk_size),
+                                   headers={VERSION_HEADER: plan.label})
+
+# Predict a whole card in one request: every bout of an event in ufc_fight_results.csv, or
+# an ad-hoc list of bouts, scored together. Each bout says whether it came from the cache
+# and when its result was ready; timings_ms breaks the request down by stage
+@app.post("/predict/card", response_model=CardPredictionResponse)
+def predict_event_card(request: CardRequest, response: Response):
+    if (request.event is None) == (request.bouts is None):
+        raise HTTPException(400, "Provide either an event or a list of bouts")
+    
+    if request.event is not None:
+        try:
+            event, bouts = get_event_card(request.event)
+        except ValueError as e:
+            raise HTTPException(404, str(e))
+    else:
+        if len(request.bouts) > MAX_BATCH_SIZE:
+            raise HTTPException(400, f"At most {MAX_BATCH_SIZE} bouts per card")
+        try:
+            event = None
+            bouts = [split_bout(bout) if isinstance(bout, str) else (bout.fighter1, bout.fighter2)
+                     for bout in request.bouts]
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+    
+    plan = _get_plan()
+    response.headers[VERSION_HEADER] = plan.label
+    return predict_card(bouts, event, plan=plan)
+
+# Win probability of every fighter against every other in a weight class. Rows are fighter1,
+# columns fighter2. active_days=0 includes inactive fighters. format=npz returns the float32
+# matrix and fighter names as a NumPy .npz file instead of JSON
+@app.get("/weightclasses/{weightclass}/matrix")
+def weightclass_matrix(weightclass: str, response: Response, active_days: int = 730, format: str = "json"):
+    if format not in ("json", "npz"):
+        raise HTTPException(400, "format must be 'json' or 'npz'")
+    try:
+        fighters = get_weightclass_fighters(weightclass, active_days or None)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    plan = _get_plan()
+    try:
+        matrix = predict_matrix(fighters, plan=plan)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    
+    if format == "npz":
+        buffer = io.BytesIO()
+        np.savez(buffer, fighters=np.array(fighters), probabilities=matrix)
+        return Response(buffer.getvalue(), media_type="application/octet-stream", headers={VERSION_HEADER: plan.label})
     
-    return PredictionResponse(**predict_fight(request.fighter1, request.fighter2))
\ No newline at end of file
+    response.headers[VERSION_HEADER] = plan.label
+    probabilities = np.round(matrix.astype(np.float64), 4).tolist()
+    for i, row in enumerate(probabilities):
+        row[i] = None
+    return {"weightclass": weightclass, "fighters": fighters, "probabilities": probabilities}
@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+# Micro-batching for single predictions: requests arriving within `window_ms` of the first
+# pending one (or until `max_batch_size` are pending) are scored together with one
+# predict_many call in a worker thread, and each caller's future gets its own result.
+
+
+class PredictionBatcher:
+    """Coalesces concurrent (fighter1, fighter2) predictions into batched model calls."""
+
+    def __init__(self, predict_many, window_ms=2.0, max_batch_size=64):
+        # predict_many(pairs) -> one result dict per pair, with 'error' for invalid pairs
+        self.predict_many = predict_many
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending = []
+        self._timer = None
+        # Scoring tasks in flight; the loop only keeps weak references to tasks
+        self._tasks = set()
+
+        # Metrics
+        self.batches = 0
+        self.requests = 0
+        self.largest_batch = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.full_flushes = 0
+
+    async def predict(self, fighter1_name, fighter2_name):
+        """Result dict for one fight; raises ValueError for an invalid pair"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(((fighter1_name, fighter2_name), future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self.full_flushes += 1
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._score(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def close(self, timeout=5.0):
+        """Score what is pending and wait up to `timeout` seconds for batches in flight, then cancel the rest"""
+        self._flush()
+        if not self._tasks:
+            return
+        _, unfinished = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+
+    async def _score(self, batch):
+        start = time.perf_counter()
+        waits = [start - queued for _, _, queued in batch]
+        self.batches += 1
+        self.requests += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        self.total_wait += sum(waits)
+        self.max_wait = max(self.max_wait, max(waits))
+
+        pairs = [pair for pair, _, _ in batch]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(None, self.predict_many, pairs)
+        except asyncio.CancelledError:
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if future.done():  # caller went away
+                continue
+            if 'error' in result:
+                future.set_exception(ValueError(result['error']))
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            'window_ms': self.window * 1000,
+            'max_batch_size': self.max_batch_size,
+            'batches': self.batches,
+            'requests': self.requests,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'full_batches': self.full_flushes,
+            'mean_wait_ms': self.total_wait / self.requests * 1000 if self.requests else 0.0,
+            'max_wait_ms': self.max_wait * 1000,
+        }
@@ -0,0 +1,40 @@
+import time
+from metrics import Counter, Histogram
+
+# Request latency and counts per route, recorded by a plain ASGI middleware (Starlette's
+# BaseHTTPMiddleware would add a task and a body copy to every request). Requests are
+# labelled with the route's path template ("/weightclasses/{weightclass}/matrix"), so
+# the number of series stays bounded whatever paths clients request.
+
+request_latency = Histogram('ufc_http_request_duration_seconds', "HTTP request latency, until the response is sent",
+                            ('method', 'route'))
+request_count = Counter('ufc_http_requests_total', "HTTP requests by response status", ('method', 'route', 'status'))
+
+
+class RequestMetricsMiddleware:
+    """Records the latency and status of every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route in the scope
+            route = scope.get('route')
+            labels = (scope['method'], route.path if route is not None else 'unmatched')
+            request_latency.observe(labels, time.perf_counter() - start)
+            request_count.inc(labels + (str(status),))
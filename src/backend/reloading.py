@@ -0,0 +1,107 @@
+import threading
+import time
+
+# Hot reload of the serving plan: reload() and refresh() run in a background thread (one
+# job at a time) and swap the new plan in when it is built and validated, so requests never
+# wait for them. With `poll_seconds`, a watcher thread also refreshes (or reloads, without
+# a refresh job) when the watched files change; with `refresh_seconds`, a scheduler thread
+# refreshes at that interval.
+
+
+class ServingReloader:
+    """Runs reloads and refreshes in the background, on demand, on file changes or on a schedule."""
+
+    def __init__(self, reload, signature, poll_seconds=0.0, refresh=None, refresh_seconds=0.0):
+        # reload() / refresh() -> the plan served afterwards; signature() -> a value that
+        # changes with the watched files
+        self.jobs = {'reload': reload, 'refresh': refresh}
+        self.signature = signature
+        self.poll_seconds = poll_seconds
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._thread = None
+        self._watcher = None
+        self._scheduler = None
+        self._stop = threading.Event()
+
+        # Metrics
+        self.version = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_job = None
+        self.last_reload = None
+        self.last_duration = None
+        self.last_error = None
+
+    def trigger(self, job='reload', reason='admin'):
+        """Start `job` ('reload' or 'refresh') in the background; False when a job is already running"""
+        if self.jobs.get(job) is None:
+            raise ValueError(f"Unknown job '{job}'")
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._thread = threading.Thread(target=self._run, args=(job, reason), name=f'serving-{job}', daemon=True)
+            self._thread.start()
+            return True
+
+    def wait(self, timeout=None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self, job, reason):
+        start = time.perf_counter()
+        self.last_job = job
+        try:
+            plan = self.jobs[job]()
+        except Exception as e:
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"{job.capitalize()} ({reason}) failed, still serving {self.version}: {self.last_error}")
+            return
+        self.reloads += 1
+        self.version = plan.label
+        self.last_reload = time.time()
+        self.last_duration = time.perf_counter() - start
+        self.last_error = None
+        print(f"{job.capitalize()} ({reason}) took {self.last_duration:.2f}s, now serving {self.version}")
+
+    def start_watching(self):
+        if self.poll_seconds > 0 and self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name='serving-watch', daemon=True)
+            self._watcher.start()
+        if self.refresh_seconds > 0 and self.jobs['refresh'] is not None and self._scheduler is None:
+            self._scheduler = threading.Thread(target=self._schedule, name='serving-schedule', daemon=True)
+            self._scheduler.start()
+
+    def stop_watching(self):
+        self._stop.set()
+
+    def _watch(self):
+        last = self.signature()
+        while not self._stop.wait(self.poll_seconds):
+            current = self.signature()
+            # Once the files have stopped changing (so a half-copied file is not picked up),
+            # refresh when possible: new data is then built into a bundle in another process
+            job = 'refresh' if self.jobs['refresh'] is not None else 'reload'
+            if current != last and self.signature() == current and self.trigger(job, 'files changed'):
+                last = current
+
+    def _schedule(self):
+        while not self._stop.wait(self.refresh_seconds):
+            self.trigger('refresh', 'scheduled')
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'reloading': self._thread is not None and self._thread.is_alive(),
+            'watching': self._watcher is not None,
+            'poll_seconds': self.poll_seconds,
+            'refresh_seconds': self.refresh_seconds,
+            'last_job': self.last_job,
+            'reloads': self.reloads,
+            'failures': self.failures,
+            'last_reload': self.last_reload,
+            'last_duration_s': self.last_duration,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,87 @@
+import json
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
+
+# Streaming bulk scoring: the request body is NDJSON, one {"fighter1", "fighter2"} object
+# per line, read as it arrives. Every `chunk_size` lines are scored with one predict_many
+# call in a worker thread and written out as NDJSON, one result per input line, as soon as
+# they are ready. The next chunk is only read once the previous one has been sent, so a
+# slow reader holds up reading the request (the server stops reading the socket once its
+# buffer fills) and memory stays at about one chunk whatever the size of the request.
+
+# Longest accepted input line; a longer one ends the stream with an error line
+MAX_LINE_BYTES = 4096
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse whose body generator reads the request body itself. Starlette's
+    StreamingResponse listens for the client disconnecting by receiving request messages
+    while it streams, which would take body chunks away from the generator; here a
+    disconnect ends the request body stream (with ClientDisconnect) instead.
+    """
+
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+async def read_lines(chunks, max_line_bytes=MAX_LINE_BYTES):
+    """Lines (without the newline) of an async stream of byte chunks"""
+    pending = b''
+    async for chunk in chunks:
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            # A line can end in the same chunk that takes it past the limit
+            if len(line) > max_line_bytes:
+                raise ValueError(f"longer than {max_line_bytes} bytes")
+            yield line
+        if len(pending) > max_line_bytes:
+            raise ValueError(f"longer than {max_line_bytes} bytes")
+    if pending:
+        yield pending
+
+async def stream_predictions(chunks, predict_many, chunk_size):
+    """NDJSON result chunks for an NDJSON request body, scored `chunk_size` lines at a time"""
+    lines, first_line = [], 1
+    try:
+        async for line in read_lines(chunks):
+            lines.append(line)
+            if len(lines) == chunk_size:
+                yield await run_in_threadpool(score_lines, lines, first_line, predict_many)
+                lines, first_line = [], first_line + len(lines)
+    except ValueError as e:
+        error = {'fighter1': None, 'fighter2': None, 'error': f"Line {first_line + len(lines)}: {e}"}
+        if lines:
+            yield await run_in_threadpool(score_lines, lines, first_line, predict_many)
+        yield (json.dumps(error) + '\n').encode()
+        return
+    except ClientDisconnect:
+        # Nobody is left to read the results
+        return
+    if lines:
+        yield await run_in_threadpool(score_lines, lines, first_line, predict_many)
+
+def score_lines(lines, first_line, predict_many):
+    """NDJSON results for NDJSON input lines numbered from `first_line`; invalid lines get an error, blank ones nothing"""
+    results = [None] * len(lines)
+    pairs, positions = [], []
+    for i, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            pair = (item['fighter1'], item['fighter2'])
+            if not all(isinstance(name, str) for name in pair):
+                raise TypeError
+        except (ValueError, KeyError, TypeError):
+            results[i] = {'fighter1': None, 'fighter2': None,
+                          'error': f'Line {first_line + i}: expected {{"fighter1": "...", "fighter2": "..."}}'}
+            continue
+        pairs.append(pair)
+        positions.append(i)
+    for i, result in zip(positions, predict_many(pairs)):
+        results[i] = result
+    return ''.join(json.dumps(result) + '\n' for result in results if result is not None).encode()
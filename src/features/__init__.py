@@ -1,6 +1,8 @@
 import pandas as pd
 from preprocessor import preprocess_data
-from .basic import create_basic_features
+from .timeline import FighterTimeline, HISTORY_VERSION, LEGACY_HISTORY_VERSION, HISTORY_VERSIONS
+from .registry import FEATURES, plan_features, run_features
+from .basic import create_basic_features, sort_by_date
 from .historical import create_historical_features
 from .title_fights import create_title_fight_features
 from .ratios import create_ratio_features
@@ -8,20 +10,46 @@ from .momentum import create_momentum_features
 from .interactions import create_interaction_features
 from .consistency import create_consistency_features
 from .encoding import create_encoding_features
+from .stage_cache import run_stages_cached
 
-# Create all features
-def create_features():
-    df = preprocess_data()
-    df = df.copy()
-    # Create features in order
-    df = create_basic_features(df)
-    df = create_historical_features(df)
-    df = create_title_fight_features(df)  # Must run after historical (needs fighter1_won_shifted)
-    df = create_ratio_features(df)
-    df = create_momentum_features(df)
-    df = create_interaction_features(df)
-    df = create_consistency_features(df)
-    df = create_encoding_features(df)
+# Bump when a stage changes its output so stored feature tables are rebuilt
+FEATURES_VERSION = 2
+
+# Columns identifying each bout, kept in front of feature tables built with_keys
+ROW_KEYS = ['EVENT', 'BOUT']
+
+# Create all features, or only the given columns (e.g. a model's feature_names_in_),
+# with the given per-fighter history version (see timeline.py).
+# Each stage's output is cached on disk unless use_cache=False
+def create_features(columns=None, use_cache=True, with_keys=False, history_version=HISTORY_VERSION):
+    return build_features(preprocess_data(), columns=columns, use_cache=use_cache, with_keys=with_keys,
+                          history_version=history_version)
+
+# Run the feature stages over a preprocessed frame. Stages register their features in
+# import order above (basic, historical, title, ratios, momentum, interactions,
+# consistency); with `columns`, only the features those columns depend on are run
+# and the result holds exactly those columns. With use_cache, unchanged stages load
+# their columns from disk (see stage_cache.py). With with_keys, each row keeps the
+# EVENT/BOUT of its fight so it can be matched back to the preprocessed data.
+# `fill_values` maps fill constants (see FighterTimeline.fill_value) to the values to use,
+# e.g. those of the whole dataset for a subset of fights; the constants it lacks are
+# computed from `df` and added to it.
+def build_features(df, categories=None, columns=None, use_cache=False, with_keys=False,
+                   history_version=HISTORY_VERSION, fill_values=None):
+    if use_cache and fill_values is not None:
+        # Cached stages neither compute nor take fill constants
+        raise ValueError("fill_values requires use_cache=False")
+    df = sort_by_date(df)
+    keys = df[ROW_KEYS]
+    features = FEATURES if columns is None else plan_features(columns, df.columns)
+    # Shared per-fighter history for every rolling/expanding stat
+    timeline = FighterTimeline(df, history_version, fill_values)
+    if use_cache:
+        df = run_stages_cached(df, features, timeline)
+    else:
+        df = run_features(df, features, timeline)
+    df = create_encoding_features(df, categories, columns)
+    if with_keys:
+        df = pd.concat([keys, df.drop(columns=ROW_KEYS, errors='ignore')], axis=1)
     
     return df
-
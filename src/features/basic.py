@@ -1,58 +1,74 @@
 import pandas as pd
 import numpy as np
+from .registry import feature, corners, run_features, stage_features
 
-def create_basic_features(df):
+# Sort by date for temporal calculations (every history feature relies on this order)
+def sort_by_date(df):
+    return df.sort_values('DATE').reset_index(drop=True)
+
+def create_basic_features(df, timeline=None):
     """
     Create basic features: temporal, age, differences, days since last fight, etc.
     """
-    # Extract temporal features (DATE is already datetime from preprocessor)
-    df['month'] = df['DATE'].dt.month
-    
-    # Calculate ages at fight date (DOB is already datetime from preprocessor)
-    df['fighter1_age'] = (df['DATE'] - df['fighter1_dob']).dt.days / 365.25
-    df['fighter2_age'] = (df['DATE'] - df['fighter2_dob']).dt.days / 365.25
-    
-    # Create age_unknown flags
-    df['fighter1_age_unknown'] = df['fighter1_age'].isna().astype(int)
-    df['fighter2_age_unknown'] = df['fighter2_age'].isna().astype(int)
-    
-    # Transform TIME FORMAT to is_title_fight (1 for 5 rounds, 0 for 3 rounds)
-    df['is_title_fight'] = df['TIME FORMAT'].str.contains('5 Rnd').astype(int)
-    
-    # Create stance matchup feature
-    df['stance_matchup'] = df['fighter1_stance'].fillna('Unknown') + '_vs_' + df['fighter2_stance'].fillna('Unknown')
-    
-    # Sort by date for temporal calculations
-    df = df.sort_values('DATE').reset_index(drop=True)
-    
-    # Calculate difference features
-    df['height_diff'] = df['fighter1_height'] - df['fighter2_height']
-    df['weight_diff'] = df['fighter1_weight'] - df['fighter2_weight']
-    df['reach_diff'] = df['fighter1_reach'] - df['fighter2_reach']
-    df['age_diff'] = df['fighter1_age'] - df['fighter2_age']
-    df['age_diff_unknown'] = (df['fighter1_age_unknown'] | df['fighter2_age_unknown']).astype(int)
-    
-    # Calculate days since last fight for each fighter
-    df['fighter1_days_since_last_fight'] = df.groupby('fighter1_name')['DATE'].diff().dt.days
-    df['fighter2_days_since_last_fight'] = df.groupby('fighter2_name')['DATE'].diff().dt.days
-    
-    # Fill NaN for first fights with median
-    median_days_f1 = df['fighter1_days_since_last_fight'].median()
-    median_days_f2 = df['fighter2_days_since_last_fight'].median()
-    df['fighter1_days_since_last_fight'] = df['fighter1_days_since_last_fight'].fillna(median_days_f1 if not pd.isna(median_days_f1) else 180)
-    df['fighter2_days_since_last_fight'] = df['fighter2_days_since_last_fight'].fillna(median_days_f2 if not pd.isna(median_days_f2) else 180)
-    
-    # Calculate total fights up to this point for each fighter
-    df['fighter1_total_fights'] = df.groupby('fighter1_name').cumcount() + 1
-    df['fighter2_total_fights'] = df.groupby('fighter2_name').cumcount() + 1
-    
-    # Calculate days since first UFC fight (career length in days)
-    df['fighter1_first_fight_date'] = df.groupby('fighter1_name')['DATE'].transform('min')
-    df['fighter1_days_in_ufc'] = (df['DATE'] - df['fighter1_first_fight_date']).dt.days
-    df['fighter2_first_fight_date'] = df.groupby('fighter2_name')['DATE'].transform('min')
-    df['fighter2_days_in_ufc'] = (df['DATE'] - df['fighter2_first_fight_date']).dt.days
-    # Drop intermediate columns
-    df = df.drop(columns=['fighter1_first_fight_date', 'fighter2_first_fight_date'])
-    
-    return df
+    return run_features(sort_by_date(df), stage_features(__name__), timeline)
+
+# Extract temporal features (DATE is already datetime from preprocessor)
+@feature(outputs=['month'], inputs=['DATE'])
+def add_month(df, timeline):
+    return {'month': df['DATE'].dt.month}
+
+# Calculate ages at fight date (DOB is already datetime from preprocessor)
+@feature(outputs=corners('age', 'age_unknown'), inputs=['DATE', 'fighter1_dob', 'fighter2_dob'])
+def add_ages(df, timeline):
+    age_f1 = (df['DATE'] - df['fighter1_dob']).dt.days / 365.25
+    age_f2 = (df['DATE'] - df['fighter2_dob']).dt.days / 365.25
+    return {
+        'fighter1_age': age_f1,
+        'fighter2_age': age_f2,
+        # Create age_unknown flags
+        'fighter1_age_unknown': age_f1.isna().astype(int),
+        'fighter2_age_unknown': age_f2.isna().astype(int),
+    }
+
+# Transform TIME FORMAT to is_title_fight (1 for 5 rounds, 0 for 3 rounds)
+@feature(outputs=['is_title_fight'], inputs=['TIME FORMAT'])
+def add_is_title_fight(df, timeline):
+    return {'is_title_fight': df['TIME FORMAT'].str.contains('5 Rnd').astype(int)}
 
+# Create stance matchup feature
+@feature(outputs=['stance_matchup'], inputs=['fighter1_stance', 'fighter2_stance'])
+def add_stance_matchup(df, timeline):
+    return {'stance_matchup': df['fighter1_stance'].fillna('Unknown') + '_vs_' + df['fighter2_stance'].fillna('Unknown')}
+
+# Calculate difference features
+@feature(outputs=['height_diff', 'weight_diff', 'reach_diff', 'age_diff', 'age_diff_unknown'],
+         inputs=corners('height', 'weight', 'reach', 'age', 'age_unknown'))
+def add_differences(df, timeline):
+    return {
+        'height_diff': df['fighter1_height'] - df['fighter2_height'],
+        'weight_diff': df['fighter1_weight'] - df['fighter2_weight'],
+        'reach_diff': df['fighter1_reach'] - df['fighter2_reach'],
+        'age_diff': df['fighter1_age'] - df['fighter2_age'],
+        'age_diff_unknown': (df['fighter1_age_unknown'] | df['fighter2_age_unknown']).astype(int),
+    }
+
+# Career history per fighter across both corners
+@feature(outputs=corners('days_since_last_fight', 'total_fights', 'days_in_ufc'), inputs=['DATE'])
+def add_career_history(df, timeline):
+    dates = timeline.gather_shared(df, ['DATE'])
+    history = pd.DataFrame({
+        # Days since last fight for each fighter
+        'days_since_last_fight': timeline.diff(dates)['DATE'].dt.days,
+        # Total fights up to this point for each fighter
+        'total_fights': timeline.count(),
+        # Days since first UFC fight (career length in days)
+        'days_in_ufc': (dates['DATE'] - timeline.first(dates)['DATE']).dt.days,
+    })
+    columns = timeline.scatter(history)
+
+    # Fill NaN for first fights with median
+    for col in ['fighter1_days_since_last_fight', 'fighter2_days_since_last_fight']:
+        days = pd.Series(columns[col], index=df.index)
+        median_days = timeline.fill_value(col, days.median)
+        columns[col] = days.fillna(median_days if not pd.isna(median_days) else 180)
+    return columns
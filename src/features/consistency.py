@@ -1,61 +1,49 @@
 import pandas as pd
+from .registry import feature, corners, run_features, stage_features
 
-def create_consistency_features(df):
+# ========== CONSISTENCY FEATURES ==========
+# Performance consistency metrics (variance/standard deviation over last 5 fights)
+# Lower variance = more consistent performance
+CONSISTENCY_STATS = {
+    'won': 'win_rate_std',                         # Win rate consistency
+    'sig_strikes_landed': 'strike_output_std',     # Strike output consistency
+    'win_finish': 'finish_consistency',            # Finish rate consistency (binary: finish or not)
+    'control_time_sec': 'control_time_std',        # Control time consistency
+    'takedowns_attempted': 'takedown_std',         # Takedown activity consistency
+}
+
+def create_consistency_features(df, timeline=None):
     """
     Create consistency features: variance/standard deviation metrics.
     """
-    # ========== CONSISTENCY FEATURES ==========
-    # Performance consistency metrics (variance/standard deviation)
-    # Lower variance = more consistent performance
-    
-    # Win rate consistency (variance in win/loss results over last 5 fights)
-    df['fighter1_win_rate_std'] = df.groupby('fighter1_name')['fighter1_won_shifted'].transform(
-        lambda x: x.rolling(window=5, min_periods=2).std()
-    ).fillna(0.5)  # Default to 0.5 (moderate variance) for fighters with < 2 fights
-    df['fighter2_win_rate_std'] = df.groupby('fighter2_name')['fighter2_won_shifted'].transform(
-        lambda x: x.rolling(window=5, min_periods=2).std()
-    ).fillna(0.5)
-    df['win_rate_consistency_diff'] = df['fighter1_win_rate_std'] - df['fighter2_win_rate_std']
-    
-    # Strike output consistency (variance in strikes landed over last 5 fights)
-    df['fighter1_strike_output_std'] = df.groupby('fighter1_name')['fighter1_sig_strikes_landed'].transform(
-        lambda x: x.shift(1).rolling(window=5, min_periods=2).std()
-    ).fillna(df['fighter1_sig_strikes_landed'].std() if df['fighter1_sig_strikes_landed'].std() > 0 else 50)
-    df['fighter2_strike_output_std'] = df.groupby('fighter2_name')['fighter2_sig_strikes_landed'].transform(
-        lambda x: x.shift(1).rolling(window=5, min_periods=2).std()
-    ).fillna(df['fighter2_sig_strikes_landed'].std() if df['fighter2_sig_strikes_landed'].std() > 0 else 50)
-    df['strike_output_consistency_diff'] = df['fighter1_strike_output_std'] - df['fighter2_strike_output_std']
-    
-    # Finish rate consistency (variance in finishing ability - binary: finish or not)
-    # Use finish rate variance over last 5 wins
-    df['fighter1_finish_consistency'] = df.groupby('fighter1_name')['fighter1_win_finish_shifted'].transform(
-        lambda x: x.rolling(window=5, min_periods=2).std()
-    ).fillna(0.5)
-    df['fighter2_finish_consistency'] = df.groupby('fighter2_name')['fighter2_win_finish_shifted'].transform(
-        lambda x: x.rolling(window=5, min_periods=2).std()
-    ).fillna(0.5)
-    df['finish_consistency_diff'] = df['fighter1_finish_consistency'] - df['fighter2_finish_consistency']
-    
-    # Control time consistency (variance in control time over last 5 fights)
-    df['fighter1_control_time_std'] = df.groupby('fighter1_name')['fighter1_control_time_sec'].transform(
-        lambda x: x.shift(1).rolling(window=5, min_periods=2).std()
-    ).fillna(df['fighter1_control_time_sec'].std() if df['fighter1_control_time_sec'].std() > 0 else 30)
-    df['fighter2_control_time_std'] = df.groupby('fighter2_name')['fighter2_control_time_sec'].transform(
-        lambda x: x.shift(1).rolling(window=5, min_periods=2).std()
-    ).fillna(df['fighter2_control_time_sec'].std() if df['fighter2_control_time_sec'].std() > 0 else 30)
-    df['control_time_consistency_diff'] = df['fighter1_control_time_std'] - df['fighter2_control_time_std']
-    
-    # Takedown activity consistency (variance in takedown attempts over last 5 fights)
-    df['fighter1_takedown_std'] = df.groupby('fighter1_name')['fighter1_takedowns_attempted'].transform(
-        lambda x: x.shift(1).rolling(window=5, min_periods=2).std()
-    ).fillna(df['fighter1_takedowns_attempted'].std() if df['fighter1_takedowns_attempted'].std() > 0 else 2)
-    df['fighter2_takedown_std'] = df.groupby('fighter2_name')['fighter2_takedowns_attempted'].transform(
-        lambda x: x.shift(1).rolling(window=5, min_periods=2).std()
-    ).fillna(df['fighter2_takedowns_attempted'].std() if df['fighter2_takedowns_attempted'].std() > 0 else 2)
-    df['takedown_consistency_diff'] = df['fighter1_takedown_std'] - df['fighter2_takedown_std']
+    return run_features(df, stage_features(__name__), timeline)
+
+@feature(outputs=corners(*CONSISTENCY_STATS.values()) + [
+             'win_rate_consistency_diff', 'strike_output_consistency_diff', 'finish_consistency_diff',
+             'control_time_consistency_diff', 'takedown_consistency_diff'],
+         inputs=corners(*CONSISTENCY_STATS))
+def add_consistency(df, timeline):
+    stds = timeline.lagged_rolling_std(timeline.gather(df, CONSISTENCY_STATS.keys()), window=5, min_periods=2)
+    columns = {col: pd.Series(values, index=df.index)
+               for col, values in timeline.scatter(stds.rename(columns=CONSISTENCY_STATS)).items()}
     
-    # Defragment DataFrame after consistency features
-    df = df.copy()
+    # Fill fighters with < 2 previous fights: 0.5 (moderate variance) for binary results,
+    # the column's overall std for counts (fallback when it is 0)
+    fallback_std = {'strike_output_std': ('sig_strikes_landed', 50),
+                    'control_time_std': ('control_time_sec', 30),
+                    'takedown_std': ('takedowns_attempted', 2)}
+    for fighter_num in [1, 2]:
+        for name in ['win_rate_std', 'finish_consistency']:
+            col = f'fighter{fighter_num}_{name}'
+            columns[col] = columns[col].fillna(0.5)
+        for name, (stat, default) in fallback_std.items():
+            col = f'fighter{fighter_num}_{name}'
+            stat_std = timeline.fill_value(col, df[f'fighter{fighter_num}_{stat}'].std)
+            columns[col] = columns[col].fillna(stat_std if stat_std > 0 else default)
     
-    return df
-
+    columns['win_rate_consistency_diff'] = columns['fighter1_win_rate_std'] - columns['fighter2_win_rate_std']
+    columns['strike_output_consistency_diff'] = columns['fighter1_strike_output_std'] - columns['fighter2_strike_output_std']
+    columns['finish_consistency_diff'] = columns['fighter1_finish_consistency'] - columns['fighter2_finish_consistency']
+    columns['control_time_consistency_diff'] = columns['fighter1_control_time_std'] - columns['fighter2_control_time_std']
+    columns['takedown_consistency_diff'] = columns['fighter1_takedown_std'] - columns['fighter2_takedown_std']
+    return columns
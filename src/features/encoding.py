@@ -1,22 +1,40 @@
 import pandas as pd
 import numpy as np
-from listOfFeatures import COLS_TO_DROP
+from listOfFeatures import COLS_TO_DROP, CATEGORICAL_COLS
+from .outcomes import decode_target
 
-def create_encoding_features(df):
+def create_encoding_features(df, categories=None, columns=None):
     """
     Create target variable and encode categorical features.
+    `categories` optionally maps a categorical column to its full list of levels, so a
+    subset of fights is encoded with the same dummy columns as the whole dataset.
+    `columns` optionally selects the output columns (in order) instead of dropping COLS_TO_DROP.
     """
     # Create target variable (fighter1_won: 1 if W/L, 0 if L/W, NaN for draws)
-    df['target'] = df['OUTCOME'].apply(lambda x: 1 if x == 'W/L' else (0 if x == 'L/W' else np.nan))
+    df['target'] = decode_target(df)
     
-    # Drop columns we don't want in the final model
-    df = df.drop(columns=[col for col in COLS_TO_DROP if col in df.columns])
+    if columns is None:
+        # Drop columns we don't want in the final model
+        df = df.drop(columns=[col for col in COLS_TO_DROP if col in df.columns])
+        categorical_cols = CATEGORICAL_COLS
+    else:
+        # Keep the requested columns and the categorical columns their dummies come from
+        categorical_cols = [cat for cat in CATEGORICAL_COLS
+                            if any(col.startswith(f'{cat}_') for col in columns)]
+        keep = set(columns) | set(categorical_cols)
+        df = df[[col for col in df.columns if col in keep]].copy()
     
-    # Encode categorical variables (one-hot encoding)
-    categorical_cols = ['REFEREE', 'WEIGHTCLASS', 'stance_matchup']
+    # Pin the levels so drop_first drops the same category as on the full dataset
+    for col, levels in (categories or {}).items():
+        if col in categorical_cols:
+            df[col] = pd.Categorical(df[col], categories=levels)
     
     # One-hot encode categorical columns, drop first category to avoid multicollinearity
-    df = pd.get_dummies(df, columns=categorical_cols, prefix=categorical_cols, drop_first=True)
+    if categorical_cols:
+        df = pd.get_dummies(df, columns=categorical_cols, prefix=categorical_cols, drop_first=True)
+    
+    # Levels absent from these fights have no dummy column
+    if columns is not None:
+        df = df.reindex(columns=columns, fill_value=False)
     
     return df
-
@@ -1,4 +1,6 @@
+import numpy as np
 import pandas as pd
+from .timeline import LEGACY_HISTORY_VERSION
 
 # Parse METHOD to categorize finish type
 def categorize_method(method):
@@ -13,14 +15,22 @@ def categorize_method(method):
         return 'Decision'
     return None
 
-# Helper function to calculate historical averages
-def calc_historical_avg(df, fighter_num, stat_name, window=3):
-    col_name = f'fighter{fighter_num}_{stat_name}'
-    avg_name = f'fighter{fighter_num}_avg_{stat_name}_last_{window}'
-    avg = df.groupby(f'fighter{fighter_num}_name')[col_name].apply(
-        lambda x: x.shift(1).rolling(window=window, min_periods=1).mean()
-    ).reset_index(level=0, drop=True)
-    df[avg_name] = avg.values
-    df[avg_name] = df[avg_name].fillna(df[avg_name].mean())
-    return df
-
+# Helper function to calculate historical averages over each fighter's last `window` fights
+# (both corners), returned as fighter{1,2}_avg_{stat}_last_{window} unless renamed in `names`
+def calc_historical_avg(df, timeline, stats, window=3, names=None):
+    avgs = timeline.lagged_rolling_mean(timeline.gather(df, stats), window)
+    avgs.columns = [(names or {}).get(stat, f'avg_{stat}_last_{window}') for stat in stats]
+    columns = timeline.scatter(avgs)
+    if timeline.history_version == LEGACY_HISTORY_VERSION:
+        # Version 1 assigned each corner's groupby(fighter name).apply(...) result by
+        # position, so the values are in fighter-name order instead of on their fights
+        for fighter_num in [1, 2]:
+            codes, _ = pd.factorize(df[f'fighter{fighter_num}_name'], sort=True)
+            for col in avgs.columns:
+                col = f'fighter{fighter_num}_{col}'
+                columns[col] = np.asarray(columns[col])[np.argsort(codes, kind='stable')]
+    # First fights have no history: fill with column mean
+    for col, values in columns.items():
+        avg = pd.Series(values, index=df.index)
+        columns[col] = avg.fillna(timeline.fill_value(col, avg.mean))
+    return columns
@@ -1,43 +1,61 @@
-def create_interaction_features(df):
+import pandas as pd
+import numpy as np
+from .registry import feature, corners, run_features, stage_features
+
+def create_interaction_features(df, timeline=None):
     """
     Create interaction features: physical attribute interactions.
     """
-    # ========== INTERACTION FEATURES ==========
-    # Fill missing height/weight/reach for interaction features
-    df['fighter1_height_filled'] = df['fighter1_height'].fillna(df['fighter1_height'].median())
-    df['fighter2_height_filled'] = df['fighter2_height'].fillna(df['fighter2_height'].median())
-    df['fighter1_weight_filled'] = df['fighter1_weight'].fillna(df['fighter1_weight'].median())
-    df['fighter2_weight_filled'] = df['fighter2_weight'].fillna(df['fighter2_weight'].median())
-    df['fighter1_reach_filled'] = df['fighter1_reach'].fillna(df['fighter1_reach'].median())
-    df['fighter2_reach_filled'] = df['fighter2_reach'].fillna(df['fighter2_reach'].median())
-    
-    # Reach advantage x striking ability
-    df['reach_advantage_x_striking'] = df['reach_diff'] * df['avg_sig_strikes_ratio']
-    
-    # Age x experience difference
-    df['age_x_experience_diff'] = df['age_diff'] * (df['fighter1_total_fights'] - df['fighter2_total_fights'])
-    
-    # Size advantage (height * weight)
-    df['size_advantage_f1'] = df['fighter1_height_filled'] * df['fighter1_weight_filled']
-    df['size_advantage_f2'] = df['fighter2_height_filled'] * df['fighter2_weight_filled']
-    df['size_advantage_diff'] = df['size_advantage_f1'] - df['size_advantage_f2']
-    
-    # Power advantage (weight * reach)
-    df['power_advantage_f1'] = df['fighter1_weight_filled'] * df['fighter1_reach_filled']
-    df['power_advantage_f2'] = df['fighter2_weight_filled'] * df['fighter2_reach_filled']
-    df['power_advantage_diff'] = df['power_advantage_f1'] - df['power_advantage_f2']
-    
-    # Reach x win rate interaction
-    df['reach_x_win_rate'] = df['reach_diff'] * df['win_rate_ratio']
-    
-    # Age x momentum interaction
-    df['age_x_momentum'] = df['age_diff'] * df['momentum_diff']
-    
-    # Size x finish rate interaction
-    df['size_x_finish_rate'] = df['size_advantage_diff'] * df['finish_rate_ratio']
-    
-    # Defragment DataFrame after interaction features
-    df = df.copy()
-    
-    return df
+    return run_features(df, stage_features(__name__), timeline)
+
+# ========== INTERACTION FEATURES ==========
+# Fill missing height/weight/reach for interaction features
+@feature(outputs=corners('height_filled', 'weight_filled', 'reach_filled'),
+         inputs=corners('height', 'weight', 'reach'))
+def add_filled_physicals(df, timeline):
+    return {
+        f'fighter{fighter_num}_{attr}_filled': df[f'fighter{fighter_num}_{attr}'].fillna(
+            timeline.fill_value(f'fighter{fighter_num}_{attr}_filled', df[f'fighter{fighter_num}_{attr}'].median))
+        for attr in ['height', 'weight', 'reach'] for fighter_num in [1, 2]
+    }
+
+# Reach advantage x striking ability
+@feature(outputs=['reach_advantage_x_striking'], inputs=['reach_diff', 'avg_sig_strikes_ratio'])
+def add_reach_advantage_x_striking(df, timeline):
+    return {'reach_advantage_x_striking': df['reach_diff'] * df['avg_sig_strikes_ratio']}
+
+# Age x experience difference
+@feature(outputs=['age_x_experience_diff'], inputs=['age_diff'] + corners('total_fights'))
+def add_age_x_experience_diff(df, timeline):
+    return {'age_x_experience_diff': df['age_diff'] * (df['fighter1_total_fights'] - df['fighter2_total_fights'])}
+
+# Size advantage (height * weight)
+@feature(outputs=['size_advantage_f1', 'size_advantage_f2', 'size_advantage_diff'],
+         inputs=corners('height_filled', 'weight_filled'))
+def add_size_advantage(df, timeline):
+    size_f1 = df['fighter1_height_filled'] * df['fighter1_weight_filled']
+    size_f2 = df['fighter2_height_filled'] * df['fighter2_weight_filled']
+    return {'size_advantage_f1': size_f1, 'size_advantage_f2': size_f2, 'size_advantage_diff': size_f1 - size_f2}
+
+# Power advantage (weight * reach)
+@feature(outputs=['power_advantage_f1', 'power_advantage_f2', 'power_advantage_diff'],
+         inputs=corners('weight_filled', 'reach_filled'))
+def add_power_advantage(df, timeline):
+    power_f1 = df['fighter1_weight_filled'] * df['fighter1_reach_filled']
+    power_f2 = df['fighter2_weight_filled'] * df['fighter2_reach_filled']
+    return {'power_advantage_f1': power_f1, 'power_advantage_f2': power_f2, 'power_advantage_diff': power_f1 - power_f2}
+
+# Reach x win rate interaction
+@feature(outputs=['reach_x_win_rate'], inputs=['reach_diff', 'win_rate_ratio'])
+def add_reach_x_win_rate(df, timeline):
+    return {'reach_x_win_rate': df['reach_diff'] * df['win_rate_ratio']}
+
+# Age x momentum interaction
+@feature(outputs=['age_x_momentum'], inputs=['age_diff', 'momentum_diff'])
+def add_age_x_momentum(df, timeline):
+    return {'age_x_momentum': df['age_diff'] * df['momentum_diff']}
 
+# Size x finish rate interaction
+@feature(outputs=['size_x_finish_rate'], inputs=['size_advantage_diff', 'finish_rate_ratio'])
+def add_size_x_finish_rate(df, timeline):
+    return {'size_x_finish_rate': df['size_advantage_diff'] * df['finish_rate_ratio']}
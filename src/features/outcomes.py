@@ -0,0 +1,78 @@
+import pandas as pd
+import numpy as np
+from parsers import parse_time_seconds_column
+from .helpers import categorize_method
+
+# Vectorized decoding of OUTCOME/METHOD/ROUND/TIME into per-fighter outcome columns.
+# OUTCOME is 'W/L' when fighter1 won, 'L/W' when fighter2 won, anything else for
+# draws/no contests. Indicator columns are 1/0 for the winner and NaN otherwise.
+
+# Columns added by decode_outcomes, in order
+OUTCOME_COLUMNS = ['ROUND_numeric', 'TIME_seconds'] + [
+    f'fighter{k}_{name}'
+    for name in ['win_method', 'win_round', 'win_time_sec', 'win_finish', 'win_ko', 'win_sub', 'win_decision', 'win_early']
+    for k in [1, 2]
+]
+
+# Categorize each distinct METHOD once and map the result back to every fight
+def categorize_methods(methods):
+    codes, uniques = pd.factorize(methods)
+    categories = np.array([categorize_method(m) for m in uniques] + [None], dtype=object)
+    return categories[codes]
+
+# Binary indicator for each winner: 1 where the condition holds, 0 otherwise, NaN if they did not win
+def _indicator(won, condition):
+    return np.where(won, np.where(condition, 1.0, 0.0), np.nan)
+
+# 1 for a win, 0 for a loss, NaN for draws/no contests
+def _won(outcome, win, loss):
+    return np.where(outcome == win, 1.0, np.where(outcome == loss, 0.0, np.nan))
+
+def decode_winners(df):
+    """fighter{1,2}_won columns from OUTCOME."""
+    outcome = df['OUTCOME'].to_numpy(dtype=object)
+    return {
+        'fighter1_won': _won(outcome, 'W/L', 'L/W'),
+        'fighter2_won': _won(outcome, 'L/W', 'W/L'),
+    }
+
+def decode_target(df):
+    """Model target (fighter1 won: 1, lost: 0, draw/no contest: NaN)."""
+    return decode_winners(df)['fighter1_won']
+
+def decode_outcomes(df):
+    """
+    Round/time parsing and every per-fighter win-method indicator, as a dict of
+    columns in the order they are added to the frame.
+    """
+    outcome = df['OUTCOME'].to_numpy(dtype=object)
+    round_numeric = pd.to_numeric(df['ROUND'], errors='coerce')
+    time_seconds = parse_time_seconds_column(df['TIME'])
+    method = categorize_methods(df['METHOD'])
+
+    columns = {'ROUND_numeric': round_numeric, 'TIME_seconds': time_seconds}
+    won = {1: outcome == 'W/L', 2: outcome == 'L/W'}
+    # How each fighter won (method category if they won, None otherwise)
+    for k in [1, 2]:
+        columns[f'fighter{k}_win_method'] = pd.Series(np.where(won[k], method, None), index=df.index)
+    # Finish round/time for wins
+    for k in [1, 2]:
+        columns[f'fighter{k}_win_round'] = np.where(won[k], round_numeric.to_numpy(dtype='float64'), np.nan)
+    for k in [1, 2]:
+        columns[f'fighter{k}_win_time_sec'] = np.where(won[k], time_seconds.astype('float64'), np.nan)
+    # Binary indicators for finish types (a win whose method is unknown counts as no method)
+    indicators = {
+        'win_finish': (method == 'KO/TKO') | (method == 'Submission'),
+        'win_ko': method == 'KO/TKO',
+        'win_sub': method == 'Submission',
+        'win_decision': method == 'Decision',
+    }
+    known = pd.notna(method)
+    for name, condition in indicators.items():
+        for k in [1, 2]:
+            columns[f'fighter{k}_{name}'] = _indicator(won[k] & known, condition)
+    # Early finish: win in rounds 1-2
+    for k in [1, 2]:
+        win_round = columns[f'fighter{k}_win_round']
+        columns[f'fighter{k}_win_early'] = _indicator(~np.isnan(win_round), win_round <= 2)
+    return columns
@@ -0,0 +1,142 @@
+import pandas as pd
+from listOfFeatures import CATEGORICAL_COLS
+from .timeline import FighterTimeline
+
+# Feature registry: every feature function declares the columns it adds to the fight
+# frame and the columns it reads, so a requested column set can be built by running
+# only the functions it depends on. Features run in registration order (stage module
+# import order, then definition order), which is also the column order of the full
+# feature table, so every feature must be registered after the features it reads.
+#
+# Features do not modify the frame: each returns its new columns as a dict of arrays
+# (or Series), later features read them through a FeatureFrame, and the pipeline joins
+# them to the input frame in a single concat at the end.
+
+
+class Feature:
+    """A function adding `outputs` to the fight frame from its `inputs`."""
+
+    def __init__(self, func, outputs, inputs, name=None):
+        self.func = func
+        self.stage = func.__module__
+        self.name = f"{self.stage}.{name or func.__name__}"
+        self.outputs = list(outputs)
+        self.inputs = list(inputs)
+
+    def __repr__(self):
+        return f"Feature({self.name})"
+
+
+class FeatureFrame:
+    """Read view over an input frame plus the feature columns built on top of it so far."""
+
+    def __init__(self, df):
+        self.df = df
+        self.index = df.index
+        self.new = {}
+
+    def __getitem__(self, col):
+        if col in self.new:
+            return self.new[col]
+        return self.df[col]
+
+    def __contains__(self, col):
+        return col in self.new or col in self.df.columns
+
+    def __len__(self):
+        return len(self.df)
+
+    def add(self, columns):
+        for col, values in columns.items():
+            if not isinstance(values, pd.Series):
+                values = pd.Series(values, index=self.index)
+            self.new[col] = values
+
+    def new_columns(self, cols=None):
+        """New columns (optionally only `cols`) as one DataFrame."""
+        cols = list(self.new) if cols is None else cols
+        return pd.DataFrame({col: self.new[col] for col in cols}, index=self.index)
+
+    def to_frame(self):
+        """Input frame with every new column appended, built in one concat."""
+        if not self.new:
+            return self.df
+        return pd.concat([self.df, self.new_columns()], axis=1)
+
+
+FEATURES = []
+_PRODUCERS = {}
+
+# Register a feature function: func(df, timeline) -> {column: values} for its outputs
+def feature(outputs, inputs=(), name=None):
+    def decorator(func):
+        spec = Feature(func, outputs, inputs, name)
+        for col in spec.outputs:
+            if col in _PRODUCERS:
+                raise ValueError(f"Column '{col}' is produced by both {_PRODUCERS[col].name} and {spec.name}")
+            _PRODUCERS[col] = spec
+        FEATURES.append(spec)
+        return func
+    return decorator
+
+# Per-fighter column names for both corners, e.g. corners('age') -> fighter1_age, fighter2_age
+def corners(*names):
+    return [f'fighter{k}_{name}' for name in names for k in [1, 2]]
+
+# Column a requested column is encoded from when no feature produces it (see encoding.py)
+def _source_column(col):
+    if col == 'target':
+        return 'OUTCOME'
+    for categorical in CATEGORICAL_COLS:
+        if col.startswith(f'{categorical}_'):
+            return categorical
+    return None
+
+def plan_features(columns, available=()):
+    """
+    Registered features needed to build `columns` from a frame holding the `available`
+    columns, in the order they must run.
+    """
+    needed = set()
+    pending = list(columns)
+    seen = set()
+    while pending:
+        col = pending.pop()
+        if col in seen:
+            continue
+        seen.add(col)
+        if col in _PRODUCERS:
+            spec = _PRODUCERS[col]
+            if spec not in needed:
+                needed.add(spec)
+                pending.extend(spec.inputs)
+        elif col in available:
+            continue
+        elif _source_column(col) is not None:
+            pending.append(_source_column(col))
+        else:
+            raise KeyError(f"No feature produces column '{col}'")
+    return [spec for spec in FEATURES if spec in needed]
+
+def stage_features(stage):
+    """Every registered feature of a stage module, in run order."""
+    return [spec for spec in FEATURES if spec.stage == stage]
+
+def build_columns(frame, features, timeline):
+    """Run features in order, adding their columns to a FeatureFrame."""
+    order = {spec: i for i, spec in enumerate(FEATURES)}
+    for spec in features:
+        for col in spec.inputs:
+            if col in _PRODUCERS and order[_PRODUCERS[col]] > order[spec]:
+                raise ValueError(f"{spec.name} reads '{col}' before {_PRODUCERS[col].name} produces it")
+        columns = spec.func(frame, timeline)
+        if list(columns) != spec.outputs:
+            raise ValueError(f"{spec.name} returned {list(columns)}, expected {spec.outputs}")
+        frame.add(columns)
+    return frame
+
+def run_features(df, features, timeline=None):
+    """Run features in order over a DATE-sorted fight frame and append their columns."""
+    if timeline is None:
+        timeline = FighterTimeline(df)
+    return build_columns(FeatureFrame(df), features, timeline).to_frame()
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+# Grouped window kernels over a pre-sorted group index. Rows of each group must be
+# contiguous and in time order (see FighterTimeline). Every kernel works on a 2D
+# float array (rows x columns) and runs a fixed number of whole-array NumPy passes:
+# rolling windows stack `window` lagged copies of the array, expanding stats use
+# cumulative sums rebased at each group start. Nothing is called per group.
+
+class GroupIndex:
+    """Group boundaries of a sorted key array and each row's position in its group."""
+
+    def __init__(self, group):
+        group = np.asarray(group)
+        self.size = len(group)
+        rows = np.arange(self.size)
+        boundary = np.ones(self.size, dtype=bool)
+        boundary[1:] = group[1:] != group[:-1]
+        # Index of the first row of each row's group
+        self.start = np.maximum.accumulate(np.where(boundary, rows, 0))
+        self.pos = rows - self.start
+
+
+# ---- Index kernels: source row for each row, -1 when there is none ----
+
+def lag_index(index, periods=1):
+    """Row holding each row's value `periods` rows earlier in its group."""
+    src = np.arange(index.size) - periods
+    src[index.pos < periods] = -1
+    return src
+
+def ffill_index(index, valid):
+    """Row holding each row's last valid value so far in its group."""
+    last = np.maximum.accumulate(np.where(valid, np.arange(index.size), -1))
+    last[last < index.start] = -1
+    return last
+
+def first_valid_index(index, valid):
+    """Row holding the first valid value of each row's group."""
+    rows = np.arange(index.size)
+    firsts = np.where(valid, rows, index.size)
+    starts = np.flatnonzero(index.pos == 0)
+    group_first = np.minimum.reduceat(firsts, starts) if len(starts) else firsts
+    first = np.repeat(group_first, np.diff(np.append(starts, index.size)))
+    first[first == index.size] = -1
+    return first
+
+def take(values, src):
+    """values[src] with -1 mapped to the dtype's missing value (ints become floats)."""
+    return pd.api.extensions.take(np.asarray(values), src, allow_fill=True)
+
+
+# ---- Value kernels on 2D float arrays ----
+
+def _lagged_windows(values, index, window):
+    # Yield each row's value 1..window rows earlier in its group (NaN outside the group)
+    for lag in range(1, window + 1):
+        src = np.arange(index.size) - lag
+        in_group = (index.pos >= lag)[:, None]
+        yield np.where(in_group, values[np.maximum(src, 0)], np.nan)
+
+def lagged_rolling_sum_count(values, index, window):
+    """Sum and count of non-missing values over each row's previous `window` rows."""
+    sums = np.zeros(values.shape)
+    counts = np.zeros(values.shape)
+    for lagged in _lagged_windows(values, index, window):
+        present = ~np.isnan(lagged)
+        sums += np.where(present, lagged, 0.0)
+        counts += present
+    return sums, counts
+
+def lagged_rolling_sum(values, index, window, min_periods=1):
+    sums, counts = lagged_rolling_sum_count(values, index, window)
+    return np.where(counts >= min_periods, sums, np.nan)
+
+def lagged_rolling_mean(values, index, window, min_periods=1):
+    sums, counts = lagged_rolling_sum_count(values, index, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts >= max(min_periods, 1), sums / counts, np.nan)
+
+def lagged_rolling_std(values, index, window, min_periods=2):
+    """Sample standard deviation (ddof=1), computed in two passes for stability."""
+    sums, counts = lagged_rolling_sum_count(values, index, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        squares = np.zeros(values.shape)
+        for lagged in _lagged_windows(values, index, window):
+            squares += np.where(np.isnan(lagged), 0.0, (lagged - means) ** 2)
+        std = np.sqrt(squares / (counts - 1))
+    return np.where(counts >= max(min_periods, 2), std, np.nan)
+
+def _lagged_prefix_sums(values, index):
+    # Sum of each row's previous values in its group (missing values count as 0)
+    filled = np.where(np.isnan(values), 0.0, values)
+    exclusive = np.cumsum(filled, axis=0) - filled
+    return exclusive - exclusive[index.start]
+
+def lagged_cumsum(values, index):
+    return _lagged_prefix_sums(values, index)
+
+def lagged_expanding_mean(values, index, min_periods=1):
+    sums = _lagged_prefix_sums(values, index)
+    counts = _lagged_prefix_sums((~np.isnan(values)).astype('float64'), index)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts >= max(min_periods, 1), sums / counts, np.nan)
+
+
+# ---- Run-length kernels on 1D boolean arrays ----
+
+def run_lengths(mask, index):
+    """Length of the run of True values ending at each row of its group (0 where False)."""
+    rows = np.arange(index.size)
+    # Last False row at or before each row, clamped to just before the group start
+    last_break = np.maximum.accumulate(np.where(mask, -1, rows))
+    last_break = np.maximum(last_break, index.start - 1)
+    return np.where(mask, rows - last_break, 0)
+
+def grouped_cummax(values, index):
+    """Running maximum of non-negative integers within each group."""
+    # Offset each group above every earlier group so one accumulate pass never crosses groups
+    offset = index.start.astype('int64') * (int(values.max(initial=0)) + 1)
+    return np.maximum.accumulate(values + offset) - offset
@@ -0,0 +1,55 @@
+import hashlib
+import inspect
+import sys
+import pandas as pd
+from preprocessor import CACHE_DIR, read_cached_frame, write_cached_frame, touch_cached_frame
+from .registry import FeatureFrame, build_columns
+
+# On-disk memoization of feature stages. Each stage's new columns are stored under a
+# key chaining the previous stage's key with the stage's source and the features it
+# runs, starting from a fingerprint of the input frame. An unchanged stage loads its
+# columns from disk; editing a stage changes its key and every key downstream of it,
+# so only that stage and the stages after it rerun.
+
+STAGE_CACHE_DIR = CACHE_DIR / "stages"
+
+# Entries kept per stage (least recently used pruned first), so runs building different
+# column plans (training, serving) do not evict each other
+STAGE_CACHE_ENTRIES = 8
+
+# Modules every stage depends on: editing one of these reruns all stages
+SHARED_MODULES = ['features.registry', 'features.timeline', 'features.rolling',
+                  'features.helpers', 'features.outcomes', 'parsers', 'listOfFeatures']
+
+def _hash(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+    return digest.hexdigest()[:16]
+
+def _module_source(name):
+    return inspect.getsource(sys.modules[name])
+
+# Content fingerprint of a frame: its column names, dtypes, index and values
+def frame_fingerprint(df):
+    values = pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes()
+    return _hash(list(df.columns), [str(dtype) for dtype in df.dtypes], values)
+
+def run_stages_cached(df, features, timeline):
+    """run_features, loading each stage's new columns from disk when its key matches."""
+    key = _hash(frame_fingerprint(df), timeline.history_version, *[_module_source(name) for name in SHARED_MODULES])
+    frame = FeatureFrame(df)
+    stages = list(dict.fromkeys(spec.stage for spec in features))
+    for stage in stages:
+        stage_features = [spec for spec in features if spec.stage == stage]
+        key = _hash(key, _module_source(stage), [spec.name for spec in stage_features])
+        stage_name = stage.rsplit('.', 1)[-1]
+        path = STAGE_CACHE_DIR / f'{stage_name}_{key}.feather'
+        if path.exists():
+            frame.add(dict(read_cached_frame(path).set_axis(df.index).items()))
+            touch_cached_frame(path)
+            continue
+        build_columns(frame, stage_features, timeline)
+        stage_columns = [col for spec in stage_features for col in spec.outputs]
+        write_cached_frame(frame.new_columns(stage_columns), path, stage_name, STAGE_CACHE_ENTRIES)
+    return frame.to_frame()
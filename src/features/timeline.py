@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+from . import rolling
+
+# Versions of the per-fighter history. ufc_model_final.pkl was trained on version 1;
+# version 2 fixes three flaws of it:
+# - 1 keeps a separate history per corner (a fighter's fights as fighter1 and as
+#   fighter2), 2 one history per fighter across both corners
+# - 1 writes the last-3 averages in fighter-name order rather than on their own fights
+#   (calc_historical_avg used to assign a groupby.apply result by position)
+# - 1 counts days since the last title fight from the fight after it
+# Models record the version they were trained on (see model.py) and are served with it.
+LEGACY_HISTORY_VERSION = 1
+HISTORY_VERSION = 2
+HISTORY_VERSIONS = (LEGACY_HISTORY_VERSION, HISTORY_VERSION)
+
+class FighterTimeline:
+    """
+    Long-format view of the fights with one appearance per fighter per fight.
+
+    Appearances are sorted by fighter and then by fight order, so each fighter's
+    history is contiguous and chronological no matter which corner they fought
+    from. Per-fighter stats are gathered from the fighter1_/fighter2_ columns into
+    this order, computed in one grouped pass, and scattered back to both corners.
+    The fight frame must already be sorted by DATE (see create_basic_features). With
+    LEGACY_HISTORY_VERSION, each corner of a fighter is a history of its own.
+    Constants that fill missing values (e.g. a column's median for debut fights) go
+    through fill_value, so a subset of fights can be filled like the whole dataset.
+    """
+
+    def __init__(self, df, history_version=HISTORY_VERSION, fill_values=None):
+        if history_version not in HISTORY_VERSIONS:
+            raise ValueError(f"Unknown history version {history_version}")
+        self.history_version = history_version
+        self.fill_values = {} if fill_values is None else fill_values
+        self.n_fights = len(df)
+        names = np.concatenate([df['fighter1_name'].to_numpy(dtype=object),
+                                df['fighter2_name'].to_numpy(dtype=object)])
+        codes, _ = pd.factorize(names)
+        corners = np.repeat([0, 1], self.n_fights)
+        if history_version == LEGACY_HISTORY_VERSION:
+            codes = np.where(codes >= 0, 2 * codes + corners, -1)
+        rows = np.tile(np.arange(self.n_fights), 2)
+        # Sort by fighter, then by row so each fighter's appearances are in fight order
+        self.order = np.lexsort((rows, codes))
+        self.group = codes[self.order]
+        self.index = rolling.GroupIndex(self.group)
+        # Appearances without a fighter name belong to no history
+        self.valid = self.group >= 0
+        self.appearances = pd.DataFrame({
+            'fighter': names[self.order],
+            'row': rows[self.order],
+            'corner': (corners + 1)[self.order],
+        })
+
+    def fill_value(self, name, compute):
+        """Fill constant `name` from fill_values, or compute() over these fights and recorded there."""
+        if name not in self.fill_values:
+            self.fill_values[name] = float(compute())
+        return self.fill_values[name]
+
+    def _long(self, fighter1_values, fighter2_values):
+        return np.concatenate([np.asarray(fighter1_values), np.asarray(fighter2_values)])[self.order]
+
+    def gather(self, df, stats):
+        """Long frame of each fighter's own fighter{1,2}_{stat} values."""
+        return pd.DataFrame({
+            stat: self._long(df[f'fighter1_{stat}'], df[f'fighter2_{stat}']) for stat in stats
+        })
+
+    def gather_shared(self, df, cols):
+        """Long frame of fight-level columns, repeated for both fighters."""
+        return pd.DataFrame({col: self._long(df[col], df[col]) for col in cols})
+
+    def scatter(self, long):
+        """Each long column as fighter1_{col} and fighter2_{col} arrays in fight order."""
+        columns = {}
+        for col in long.columns:
+            values = long[col].to_numpy()
+            if not self.valid.all():
+                values = values.astype('float64') if values.dtype.kind in 'biu' else values.copy()
+                values[~self.valid] = np.nan if values.dtype.kind != 'M' else np.datetime64('NaT')
+            wide = np.empty_like(values)
+            wide[self.order] = values
+            columns[f'fighter1_{col}'] = wide[:self.n_fights]
+            columns[f'fighter2_{col}'] = wide[self.n_fights:]
+        return columns
+
+    # ---- History operations on long frames (one vectorized pass for all columns) ----
+
+    def _values(self, long):
+        return long.to_numpy(dtype='float64', na_value=np.nan)
+
+    def _frame(self, values, long):
+        return pd.DataFrame(values, columns=long.columns)
+
+    def _take(self, long, src):
+        return pd.DataFrame({col: rolling.take(long[col].to_numpy(), src) for col in long.columns})
+
+    def lag(self, long, periods=1):
+        """Value from each fighter's previous fight."""
+        return self._take(long, rolling.lag_index(self.index, periods))
+
+    def lagged_rolling_mean(self, long, window, min_periods=1):
+        """Mean over each fighter's previous `window` fights."""
+        return self._frame(rolling.lagged_rolling_mean(self._values(long), self.index, window, min_periods), long)
+
+    def lagged_rolling_std(self, long, window, min_periods=2):
+        """Sample std over each fighter's previous `window` fights."""
+        return self._frame(rolling.lagged_rolling_std(self._values(long), self.index, window, min_periods), long)
+
+    def lagged_rolling_sum(self, long, window, min_periods=1):
+        """Sum over each fighter's previous `window` fights."""
+        return self._frame(rolling.lagged_rolling_sum(self._values(long), self.index, window, min_periods), long)
+
+    def lagged_expanding_mean(self, long, min_periods=1):
+        """Mean over all of each fighter's previous fights."""
+        return self._frame(rolling.lagged_expanding_mean(self._values(long), self.index, min_periods), long)
+
+    def lagged_cumsum(self, long):
+        """Sum over all of each fighter's previous fights (missing values count as 0)."""
+        return self._frame(rolling.lagged_cumsum(self._values(long), self.index), long)
+
+    def ffill(self, long):
+        """Carry each fighter's last non-missing value forward."""
+        return pd.DataFrame({
+            col: rolling.take(long[col].to_numpy(), rolling.ffill_index(self.index, long[col].notna().to_numpy()))
+            for col in long.columns
+        })
+
+    def diff(self, long):
+        """Change since each fighter's previous fight."""
+        return long - self.lag(long)
+
+    def first(self, long):
+        """First non-missing value of each fighter's history."""
+        return pd.DataFrame({
+            col: rolling.take(long[col].to_numpy(), rolling.first_valid_index(self.index, long[col].notna().to_numpy()))
+            for col in long.columns
+        })
+
+    def count(self):
+        """Number of fights so far for each fighter, including the current one."""
+        return pd.Series(self.index.pos + 1)
+
+    def run_length(self, long, value):
+        """Consecutive fights ending at each fight whose result equals `value`, including it."""
+        return pd.DataFrame({
+            col: rolling.run_lengths(long[col].to_numpy() == value, self.index) for col in long.columns
+        })
+
+    def streak(self, long, value):
+        """Current streak of `value` results each fighter carries into each fight."""
+        return self.run_length(self.lag(long), value)
+
+    def longest_streak(self, long, value):
+        """Longest streak of `value` results in each fighter's history before each fight."""
+        streaks = self.streak(long, value)
+        return pd.DataFrame({
+            col: rolling.grouped_cummax(streaks[col].to_numpy(), self.index) for col in streaks.columns
+        })
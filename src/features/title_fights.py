@@ -1,100 +1,85 @@
 import pandas as pd
 import numpy as np
+from .registry import feature, corners, run_features, stage_features
+from .timeline import LEGACY_HISTORY_VERSION
 
-def create_title_fight_features(df):
+def create_title_fight_features(df, timeline=None):
     """
     Create title fight-related features:
     - Number of title fights (cumulative)
     - Days since last title fight
     - Is current champion (last fight was title fight and they won)
     """
-    # ========== NUMBER OF TITLE FIGHTS ==========
+    return run_features(df, stage_features(__name__), timeline)
+
+# ========== NUMBER OF TITLE FIGHTS ==========
+@feature(outputs=corners('num_title_fights') + ['title_fights_diff', 'title_fights_ratio'],
+         inputs=['is_title_fight'])
+def add_title_fight_counts(df, timeline):
     # Calculate cumulative number of title fights (excluding current fight)
-    df['fighter1_is_title_shifted'] = df.groupby('fighter1_name')['is_title_fight'].shift(1)
-    df['fighter1_num_title_fights'] = df.groupby('fighter1_name')['fighter1_is_title_shifted'].transform(
-        lambda x: x.fillna(0).cumsum()
-    )
-    
-    df['fighter2_is_title_shifted'] = df.groupby('fighter2_name')['is_title_fight'].shift(1)
-    df['fighter2_num_title_fights'] = df.groupby('fighter2_name')['fighter2_is_title_shifted'].transform(
-        lambda x: x.fillna(0).cumsum()
-    )
-    
+    title = timeline.gather_shared(df, ['is_title_fight'])
+    num_title = timeline.lagged_cumsum(title).set_axis(['num_title_fights'], axis=1)
+    columns = timeline.scatter(num_title)
+    num_f1, num_f2 = columns['fighter1_num_title_fights'], columns['fighter2_num_title_fights']
+
     # Difference and ratio features for title fights
-    df['title_fights_diff'] = df['fighter1_num_title_fights'] - df['fighter2_num_title_fights']
-    df['title_fights_ratio'] = df['fighter1_num_title_fights'] / (df['fighter2_num_title_fights'] + 1)
-    
-    # ========== DAYS SINCE LAST TITLE FIGHT ==========
-    # For fighter1: find the date of their last title fight (before current fight)
-    # Shift to exclude current fight, then use ffill to carry forward last title fight date
-    df['fighter1_title_fight_date'] = df.groupby('fighter1_name', group_keys=False).apply(
-        lambda x: x['DATE'].where(x['is_title_fight'].shift(1) == 1)
-    )
-    df['fighter1_last_title_fight_date'] = df.groupby('fighter1_name')['fighter1_title_fight_date'].transform(
-        lambda x: x.ffill()
-    )
-    
-    df['fighter2_title_fight_date'] = df.groupby('fighter2_name', group_keys=False).apply(
-        lambda x: x['DATE'].where(x['is_title_fight'].shift(1) == 1)
-    )
-    df['fighter2_last_title_fight_date'] = df.groupby('fighter2_name')['fighter2_title_fight_date'].transform(
-        lambda x: x.ffill()
-    )
-    
-    # Calculate days since last title fight
-    df['fighter1_days_since_last_title_fight'] = (df['DATE'] - df['fighter1_last_title_fight_date']).dt.days
-    df['fighter2_days_since_last_title_fight'] = (df['DATE'] - df['fighter2_last_title_fight_date']).dt.days
-    
-    # Fill NaN with median (for fighters who never fought for a title)
-    median_days_f1 = df['fighter1_days_since_last_title_fight'].median()
-    median_days_f2 = df['fighter2_days_since_last_title_fight'].median()
-    df['fighter1_days_since_last_title_fight'] = df['fighter1_days_since_last_title_fight'].fillna(
-        median_days_f1 if not pd.isna(median_days_f1) else 365
-    )
-    df['fighter2_days_since_last_title_fight'] = df['fighter2_days_since_last_title_fight'].fillna(
-        median_days_f2 if not pd.isna(median_days_f2) else 365
-    )
-    
+    columns['title_fights_diff'] = num_f1 - num_f2
+    columns['title_fights_ratio'] = num_f1 / (num_f2 + 1)
+    return columns
+
+# ========== DAYS SINCE LAST TITLE FIGHT ==========
+@feature(outputs=corners('days_since_last_title_fight') + ['days_since_last_title_fight_diff'],
+         inputs=['is_title_fight', 'DATE'])
+def add_days_since_title_fight(df, timeline):
+    # Date of each fighter's last title fight before the current one: keep title fight dates,
+    # shift to exclude the current fight, then ffill to carry the last one forward
+    title = timeline.gather_shared(df, ['is_title_fight', 'DATE'])
+    if timeline.history_version == LEGACY_HISTORY_VERSION:
+        # Version 1 kept the date of the fight after each title fight instead
+        after_title = timeline.lag(title[['is_title_fight']])['is_title_fight'] == 1
+        last_title_date = timeline.ffill(title[['DATE']].where(after_title))
+    else:
+        title_dates = title[['DATE']].where(title['is_title_fight'] == 1)
+        last_title_date = timeline.ffill(timeline.lag(title_dates))
+    last_title_date = last_title_date.set_axis(['last_title_fight_date'], axis=1)
+    last_title_dates = timeline.scatter(last_title_date)
+
+    columns = {}
+    for fighter_num in [1, 2]:
+        # Calculate days since last title fight
+        days = (df['DATE'] - pd.Series(last_title_dates[f'fighter{fighter_num}_last_title_fight_date'], index=df.index)).dt.days
+        # Fill NaN with median (for fighters who never fought for a title)
+        col = f'fighter{fighter_num}_days_since_last_title_fight'
+        median_days = timeline.fill_value(col, days.median)
+        columns[col] = days.fillna(
+            median_days if not pd.isna(median_days) else 365
+        )
+
     # Difference feature
-    df['days_since_last_title_fight_diff'] = (
-        df['fighter1_days_since_last_title_fight'] - df['fighter2_days_since_last_title_fight']
+    columns['days_since_last_title_fight_diff'] = (
+        columns['fighter1_days_since_last_title_fight'] - columns['fighter2_days_since_last_title_fight']
     )
-    
-    # ========== IS CURRENT CHAMPION ==========
-    # Current champion: last fight was a title fight AND they won it
-    # fighter1_won_shifted and fighter2_won_shifted are already created in historical.py
-    
-    df['fighter1_last_fight_was_title'] = df.groupby('fighter1_name')['is_title_fight'].shift(1).fillna(0)
-    df['fighter1_is_current_champion'] = (
-        (df['fighter1_last_fight_was_title'] == 1) & 
-        (df['fighter1_won_shifted'] == 1)
-    ).astype(int)
-    
-    df['fighter2_last_fight_was_title'] = df.groupby('fighter2_name')['is_title_fight'].shift(1).fillna(0)
-    df['fighter2_is_current_champion'] = (
-        (df['fighter2_last_fight_was_title'] == 1) & 
-        (df['fighter2_won_shifted'] == 1)
-    ).astype(int)
-    
-    # Difference feature (1 if fighter1 is champion and fighter2 is not, -1 if opposite, 0 if both/neither)
-    df['champion_diff'] = df['fighter1_is_current_champion'] - df['fighter2_is_current_champion']
-    
-    # Both champions flag (indicates championship bout)
-    df['both_champions'] = (
-        (df['fighter1_is_current_champion'] == 1) & 
-        (df['fighter2_is_current_champion'] == 1)
-    ).astype(int)
-    
-    # Drop intermediate columns
-    df = df.drop(columns=[
-        'fighter1_is_title_shifted', 'fighter2_is_title_shifted',
-        'fighter1_title_fight_date', 'fighter2_title_fight_date',
-        'fighter1_last_title_fight_date', 'fighter2_last_title_fight_date',
-        'fighter1_last_fight_was_title', 'fighter2_last_fight_was_title'
-    ])
-    
-    # Defragment DataFrame after title fight features
-    df = df.copy()
-    
-    return df
+    return columns
 
+# ========== IS CURRENT CHAMPION ==========
+@feature(outputs=corners('is_current_champion') + ['champion_diff', 'both_champions'],
+         inputs=['is_title_fight'] + corners('won_shifted'))
+def add_champion_status(df, timeline):
+    # Current champion: last fight was a title fight AND they won it
+    # fighter1_won_shifted and fighter2_won_shifted are created in historical.py
+    title = timeline.gather_shared(df, ['is_title_fight'])
+    last_was_title = timeline.lag(title).fillna(0).set_axis(['last_fight_was_title'], axis=1)
+    last_was_title = timeline.scatter(last_was_title)
+    champion = {
+        fighter_num: ((last_was_title[f'fighter{fighter_num}_last_fight_was_title'] == 1) &
+                      (df[f'fighter{fighter_num}_won_shifted'] == 1)).astype(int)
+        for fighter_num in [1, 2]
+    }
+    return {
+        'fighter1_is_current_champion': champion[1],
+        'fighter2_is_current_champion': champion[2],
+        # Difference feature (1 if fighter1 is champion and fighter2 is not, -1 if opposite, 0 if both/neither)
+        'champion_diff': champion[1] - champion[2],
+        # Both champions flag (indicates championship bout)
+        'both_champions': ((champion[1] == 1) & (champion[2] == 1)).astype(int),
+    }
@@ -1,61 +1,199 @@
-import pandas as pd
-from preprocessor import preprocess_data
-from features import create_features
+import numpy as np
+from serving import (FighterIndex, FighterSnapshots, get_bundle, normalize_name,
+                     ACTIVE_DAYS, WEIGHTCLASSES)
+
+# pandas and the data pipeline are imported when the data is first loaded, so a server
+# booting from the serving bundle (see serving.py) never imports them
 
 # Cache the preprocessed and features data to avoid reloading
 _df_preprocessed = None
 _df_features = None
+_df_features_complete = False
+_df_features_version = None
+_snapshots = None
+_fighter_index = None
+
+#Loads all preprocessed data for the database (ingested tables when up to date)
+def _load_preprocessed_data():
+    from preprocessor import preprocess_data
+    from ingest import load_ingested_table
+    df_preprocessed = load_ingested_table('preprocessed')
+    return df_preprocessed if df_preprocessed is not None else preprocess_data()
+
+#Loads all features for the database (ingested tables when up to date), or the `columns`
+#the caller needs when building them; also says whether every feature column is included.
+#`history_version` is the per-fighter history version to build them with (see features/timeline.py)
+def _load_features_data(columns=None, history_version=None):
+    from features import create_features, HISTORY_VERSION
+    from ingest import load_ingested_table
+    if history_version is None:
+        history_version = HISTORY_VERSION
+    df_features = load_ingested_table('features', history_version)
+    if df_features is not None:
+        return df_features, True
+    return create_features(columns, with_keys=True, history_version=history_version), columns is None
 
-#Gets all preprocessed data for the database
+#Gets all preprocessed data for the database (loaded once)
 def _get_preprocessed_data():
     global _df_preprocessed
     if _df_preprocessed is None:
-        _df_preprocessed = preprocess_data()
+        _df_preprocessed = _load_preprocessed_data()
     return _df_preprocessed
 
-#Gets all features for the database
-def _get_features_data():
-    global _df_features
-    if _df_features is None:
-        _df_features = create_features()
+#Gets all features for the database, loading them again when the cached table lacks `columns`
+#or was built for another history version (None: that of the cached table, if any)
+def _get_features_data(columns=None, history_version=None):
+    global _df_features, _df_features_complete, _df_features_version
+    if history_version is None:
+        history_version = _df_features_version
+    cached = _df_features is not None and history_version == _df_features_version and (
+        _df_features_complete or (columns is not None and set(columns).issubset(_df_features.columns))
+    )
+    if not cached:
+        _df_features, _df_features_complete = _load_features_data(columns, history_version)
+        _df_features_version = _history_version(history_version)
     return _df_features
 
+#The history version a table loaded for `history_version` is built with
+def _history_version(history_version):
+    from features import HISTORY_VERSION
+    return HISTORY_VERSION if history_version is None else history_version
+
+#Builds the fighter name index from the preprocessed data: days each fighter last fought
+#before the newest fight, the weight class of their latest weight-class bout, and each
+#event's card
+def build_fighter_index(df_preprocessed):
+    import pandas as pd
+    bouts = pd.concat([
+        df_preprocessed[[f'fighter{k}_name', 'DATE', 'WEIGHTCLASS']].set_axis(['fighter', 'DATE', 'WEIGHTCLASS'], axis=1)
+        for k in [1, 2]
+    ]).dropna(subset=['fighter']).sort_values('DATE', kind='stable')
+    last_fight = bouts.groupby('fighter')['DATE'].max()
+    bouts['weightclass'] = bouts['WEIGHTCLASS'].map(get_weightclass)
+    latest = bouts.dropna(subset=['weightclass']).drop_duplicates('fighter', keep='last').set_index('fighter')['weightclass']
+
+    names = sorted(last_fight.index.tolist())
+    days = (df_preprocessed['DATE'].max() - last_fight[names]).dt.days.to_numpy()
+    # A bout appears once per match of a fighter name in ufc_fighter_tott.csv; its fight URL
+    # tells those copies apart from a same-night rematch
+    cards = df_preprocessed.drop_duplicates('URL')[['EVENT', 'fighter1_name', 'fighter2_name']].dropna()
+    return FighterIndex.build(names, days, [latest.get(name) for name in names], cards.itertuples(index=False))
+
+#Gets the fighter name index (from the serving bundle when one is loaded, else built once)
+def _get_fighter_index():
+    global _fighter_index
+    if _fighter_index is None:
+        bundle = get_bundle()
+        _fighter_index = bundle.index if bundle is not None else build_fighter_index(_get_preprocessed_data())
+    return _fighter_index
+
 #Gets all fighters in the database
 def get_all_fighters():
-    df = _get_preprocessed_data()
-    fighters = pd.concat([df['fighter1_name'], df['fighter2_name']]).dropna().unique()
-    return sorted(fighters.tolist())
+    return _get_fighter_index().names.tolist()
+
+#Searches fighter names (case- and accent-insensitive, active fighters first)
+def search_fighters(query: str, limit: int = 10):
+    return _get_fighter_index().search(query, limit)
 
 #Checks if a fighter exists in the database
 def fighter_exists(fighter_name: str) -> bool:
-    df = _get_preprocessed_data()
-    return fighter_name in df['fighter1_name'].values or fighter_name in df['fighter2_name'].values
+    return fighter_name in _get_fighter_index()
 
-#Gets all features for a fighter
-def get_fighter_features(fighter_name: str, df_preprocessed: pd.DataFrame = None, df_features: pd.DataFrame = None):
-    # Use cached data if not provided
-    if df_preprocessed is None:
-        df_preprocessed = _get_preprocessed_data()
-    if df_features is None:
-        df_features = _get_features_data()
-    
-    # Find fighter's latest fight
-    mask = (df_preprocessed['fighter1_name'] == fighter_name) | (df_preprocessed['fighter2_name'] == fighter_name)
-    fighter_fights = df_preprocessed[mask]
-    
-    if len(fighter_fights) == 0:
-        raise ValueError(f"Fighter '{fighter_name}' not found")
-    
-    latest_fight = fighter_fights.sort_values('DATE').iloc[-1]
-    feature_row = df_features[df_features['DATE'] == latest_fight['DATE']].iloc[0]
-    
-    # Determine which fighter position and extract features
-    prefix = 'fighter1_' if latest_fight['fighter1_name'] == fighter_name else 'fighter2_'
-    fighter_features = feature_row.filter(regex=f'^{prefix}').copy()
-    
-    # Rename to fighter1_* format if needed
-    if prefix == 'fighter2_':
-        fighter_features.index = fighter_features.index.str.replace('fighter2_', 'fighter1_')
-    
-    return fighter_features
+#Gets an event's name and its bouts as (fighter1, fighter2) pairs in card order
+def get_event_card(event: str):
+    return _get_fighter_index().card(event)
+
+#Gets the weight class of a bout's WEIGHTCLASS (None for catch/open weight and early tournaments)
+def get_weightclass(bout_weightclass):
+    if not isinstance(bout_weightclass, str):
+        return None
+    for weightclass in WEIGHTCLASSES:
+        if weightclass in bout_weightclass and not (weightclass == 'Heavyweight' and 'Light Heavyweight' in bout_weightclass):
+            return weightclass
+    return None
 
+#Gets the fighters whose latest weight-class bout was in `weightclass`, and who have fought
+#within `active_days` of the newest fight in the database (any time if None)
+def get_weightclass_fighters(weightclass: str, active_days: int = ACTIVE_DAYS):
+    return _get_fighter_index().weightclass_fighters(weightclass, active_days)
+
+#Builds the fighter snapshots from a feature table. Feature rows are matched to their
+#fighters by EVENT+BOUT and are in fight order, so a fighter's latest bout is their last
+#appearance in the table
+def build_snapshots(df_preprocessed, df_features):
+    import pandas as pd
+    from features import ROW_KEYS
+    bouts = df_preprocessed[ROW_KEYS + ['fighter1_name', 'fighter2_name']].drop_duplicates(ROW_KEYS)
+    bouts = df_features[ROW_KEYS].merge(bouts, on=ROW_KEYS, how='left')
+    n_rows = len(bouts)
+
+    # Every appearance in fight order; the last one per fighter is their latest bout
+    appearances = pd.DataFrame({
+        'fighter': np.concatenate([bouts['fighter1_name'].to_numpy(dtype=object),
+                                   bouts['fighter2_name'].to_numpy(dtype=object)]),
+        'row': np.tile(np.arange(n_rows), 2),
+        'corner': np.repeat([1, 2], n_rows),
+    }).dropna(subset=['fighter']).sort_values('row', kind='stable')
+    latest = appearances.drop_duplicates('fighter', keep='last')
+
+    # Per-fighter columns with both corners in the table, in fighter1_ and fighter2_ names
+    fighter_columns = [col for col in df_features.columns if col.startswith('fighter1_')
+                       and col.replace('fighter1_', 'fighter2_', 1) in df_features.columns]
+    fighter2_columns = [col.replace('fighter1_', 'fighter2_', 1) for col in fighter_columns]
+    bout_columns = [col for col in df_features.columns if not col.startswith('fighter')
+                    and col not in ['DATE', 'target'] + ROW_KEYS]
+
+    rows = df_features.iloc[latest['row'].to_numpy()]
+    corner1 = rows[fighter_columns].to_numpy(dtype='float64', na_value=np.nan)
+    corner2 = rows[fighter2_columns].to_numpy(dtype='float64', na_value=np.nan)
+    in_corner1 = (latest['corner'].to_numpy() == 1)[:, None]
+    vectors = np.where(in_corner1, corner1, corner2)
+    bout_vectors = rows[bout_columns].to_numpy(dtype='float64', na_value=np.nan)
+    return FighterSnapshots(latest['fighter'].tolist(), vectors, bout_vectors, fighter_columns, bout_columns, df_features)
+
+#Gets the snapshot index for the cached feature table (rebuilt when the table changes)
+def _get_snapshots(columns=None, history_version=None):
+    global _snapshots
+    df_features = _get_features_data(columns, history_version)
+    if _snapshots is None or _snapshots.df_features is not df_features:
+        _snapshots = build_snapshots(_get_preprocessed_data(), df_features)
+    return _snapshots
+
+#Gets the snapshot index built last, without loading or building anything
+def _current_snapshots():
+    return _snapshots
+
+#Loads the data from disk again and builds a new fighter index and snapshots from it,
+#without touching the cached ones (see set_serving_data)
+def load_serving_data(columns=None, history_version=None):
+    df_preprocessed = _load_preprocessed_data()
+    df_features, complete = _load_features_data(columns, history_version)
+    return {
+        'df_preprocessed': df_preprocessed,
+        'df_features': df_features,
+        'features_complete': complete,
+        'history_version': _history_version(history_version),
+        'index': build_fighter_index(df_preprocessed),
+        'snapshots': build_snapshots(df_preprocessed, df_features),
+    }
+
+#Replaces the fighter index, and the cached data and snapshots when `data` comes from
+#load_serving_data
+def set_serving_data(index, data=None):
+    global _fighter_index, _df_preprocessed, _df_features, _df_features_complete, _df_features_version, _snapshots
+    if data is not None:
+        _df_preprocessed, _df_features = data['df_preprocessed'], data['df_features']
+        _df_features_complete, _snapshots = data['features_complete'], data['snapshots']
+        _df_features_version = data['history_version']
+    _fighter_index = index
+
+#Gets all features for a fighter
+def get_fighter_features(fighter_name: str, df_preprocessed: "pd.DataFrame" = None, df_features: "pd.DataFrame" = None):
+    import pandas as pd
+    # Use the cached snapshot index unless other data is provided
+    if df_preprocessed is None and df_features is None:
+        snapshots = _get_snapshots()
+    else:
+        snapshots = build_snapshots(_get_preprocessed_data() if df_preprocessed is None else df_preprocessed,
+                                    _get_features_data() if df_features is None else df_features)
+    return pd.Series(snapshots.fighter_vector(fighter_name), index=snapshots.fighter_columns)
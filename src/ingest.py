@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import pandas as pd
+from preprocessor import (DATA_DIR, CACHE_DIR, build_preprocessed_data, combine_event_dataframes, fill_nan_values,
+                          preprocessed_cache_key,
+                          read_cached_frame, write_cached_frame)
+from features import build_features, FEATURES_VERSION, HISTORY_VERSION, LEGACY_HISTORY_VERSION
+from model import UFCXGBoostModel
+from serving import MODEL_PATH
+
+# Incremental event ingestion: keeps the preprocessed and feature tables on disk
+# and appends newly added events to them instead of rerunning the full pipeline.
+#
+# Only the new events' rows are read from the CSVs, and only the fighters on a new card
+# have their rolling/expanding features recomputed, from their own fight history. Rows
+# already in the tables are never rewritten. The fill constants of the last full rebuild
+# (weight-class means/modes for missing physical attributes, column means/medians for
+# debut fights) are kept in the manifest and fill the new rows too, so they match the
+# rows already stored. Feature rows keep their fight's
+# EVENT/BOUT so serving can match them back to the fighters in them.
+# The tables are built for one per-fighter history version, that of the deployed model.
+# Version 1 features of a fight depend on every other fight (see timeline.py), so under
+# it new events rebuild the tables in full instead.
+
+TABLES_DIR = CACHE_DIR / "tables"
+MANIFEST_PATH = TABLES_DIR / "manifest.json"
+
+
+def _read_manifest():
+    if not MANIFEST_PATH.exists():
+        return None
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)
+
+# Write both tables under versioned names, then publish them by replacing the manifest
+def _write_tables(df_preprocessed, df_features, events, input_key, history_version, fill_values):
+    TABLES_DIR.mkdir(parents=True, exist_ok=True)
+    preprocessed_path = TABLES_DIR / f'preprocessed_{input_key}.feather'
+    features_path = TABLES_DIR / f'features_{input_key}.feather'
+    write_cached_frame(df_preprocessed, preprocessed_path)
+    write_cached_frame(df_features, features_path)
+    manifest = {
+        'input_key': input_key,
+        'features_version': FEATURES_VERSION,
+        'history_version': history_version,
+        'preprocessed': preprocessed_path.name,
+        'features': features_path.name,
+        'events': sorted(events),
+        # Fill constants of the last rebuild ('preprocessed' and 'features'), used for appended rows
+        'fill_values': fill_values,
+    }
+    tmp_path = MANIFEST_PATH.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, MANIFEST_PATH)
+    # Drop tables no longer referenced by the manifest
+    for path in TABLES_DIR.glob('*.feather'):
+        if path.name not in (manifest['preprocessed'], manifest['features']):
+            path.unlink(missing_ok=True)
+    return manifest
+
+# Rebuild both tables from scratch
+def rebuild_tables(history_version=HISTORY_VERSION):
+    fill_values = {'preprocessed': {}, 'features': {}}
+    df_preprocessed = build_preprocessed_data(fill_values['preprocessed'])
+    df_features = build_features(df_preprocessed, with_keys=True, history_version=history_version,
+                                 fill_values=fill_values['features'])
+    events = df_preprocessed['EVENT'].dropna().unique().tolist()
+    _write_tables(df_preprocessed, df_features, events, preprocessed_cache_key(), history_version, fill_values)
+    return df_preprocessed, df_features
+
+# Whether the stored tables were built by this code for the given history version
+def _manifest_matches(manifest, history_version):
+    return (manifest is not None and manifest.get('features_version') == FEATURES_VERSION
+            and manifest.get('history_version') == history_version)
+
+# Load a stored table, or None if the store is missing, older than the CSVs or (for the
+# features) built for another history version
+def load_ingested_table(name, history_version=HISTORY_VERSION):
+    manifest = _read_manifest()
+    if (manifest is None or manifest.get('features_version') != FEATURES_VERSION
+            or manifest['input_key'] != preprocessed_cache_key()):
+        return None
+    # The preprocessed table is the same for every history version
+    if name != 'preprocessed' and manifest.get('history_version') != history_version:
+        return None
+    return read_cached_frame(TABLES_DIR / manifest[name])
+
+# Levels of each one-hot encoded column across the whole preprocessed table
+def _category_levels(df_preprocessed):
+    stance_matchup = (df_preprocessed['fighter1_stance'].fillna('Unknown') + '_vs_' +
+                      df_preprocessed['fighter2_stance'].fillna('Unknown'))
+    return {
+        'REFEREE': sorted(df_preprocessed['REFEREE'].dropna().unique()),
+        'WEIGHTCLASS': sorted(df_preprocessed['WEIGHTCLASS'].dropna().unique()),
+        'stance_matchup': sorted(stance_matchup.unique()),
+    }
+
+# Events with results in the CSVs that are not in the stored tables yet, oldest first
+def _pending_events(ingested):
+    events = pd.read_csv(DATA_DIR / 'ufc_event_details.csv', usecols=['EVENT', 'DATE'])
+    events['EVENT'] = events['EVENT'].str.strip()
+    events['DATE'] = pd.to_datetime(events['DATE'], errors='coerce')
+    results = pd.read_csv(DATA_DIR / 'ufc_fight_results.csv', usecols=['EVENT'])
+    with_results = set(results['EVENT'].str.strip())
+    pending = events[~events['EVENT'].isin(ingested) & events['EVENT'].isin(with_results)]
+    return pending.sort_values('DATE', kind='stable')
+
+# Append the bouts of the given events to the stored tables
+def _ingest_card(df_preprocessed, df_features, event_names, history_version, fill_values):
+    new_rows = combine_event_dataframes(event_names)
+    if len(new_rows) == 0:
+        return df_preprocessed, df_features
+    # Impute physical attributes and stance with the weight-class stats of the stored rows
+    new_rows = fill_nan_values(new_rows, dict(fill_values['preprocessed'])).drop_duplicates()
+    start = df_preprocessed.index.max() + 1 if len(df_preprocessed) else 0
+    new_rows.index = pd.RangeIndex(start, start + len(new_rows))
+
+    # Recompute features over the full history of the fighters on this card only
+    card_fighters = set(new_rows['fighter1_name']) | set(new_rows['fighter2_name'])
+    history = df_preprocessed[(df_preprocessed['fighter1_name'].isin(card_fighters) |
+                               df_preprocessed['fighter2_name'].isin(card_fighters)) &
+                              df_preprocessed['DATE'].notna()]
+    if len(history) and history['DATE'].max() >= new_rows['DATE'].min():
+        raise ValueError(
+            f"Events {event_names} predate fights already ingested for their fighters; "
+            "rebuild the tables instead"
+        )
+    df_preprocessed = pd.concat([df_preprocessed, new_rows])
+    # New rows sort after their fighters' history, so they are the tail of the result
+    card_features = build_features(pd.concat([history, new_rows]),
+                                   categories=_category_levels(df_preprocessed), with_keys=True,
+                                   history_version=history_version, fill_values=dict(fill_values['features']))
+    card_features = card_features.iloc[-len(new_rows):]
+    # Categories unseen in the stored table (e.g. a new referee) have no column to land in
+    card_features = card_features.reindex(columns=df_features.columns, fill_value=False)
+    card_features.index = pd.RangeIndex(len(df_features), len(df_features) + len(card_features))
+
+    df_features = pd.concat([df_features, card_features])
+    return df_preprocessed, df_features
+
+# Ingest every event added to the CSVs since the tables were last written
+def ingest_new_events(history_version=HISTORY_VERSION):
+    manifest = _read_manifest()
+    if not _manifest_matches(manifest, history_version) or 'fill_values' not in manifest:
+        return rebuild_tables(history_version)
+    ingested = set(manifest['events'])
+    pending = _pending_events(ingested)
+    if len(pending) and history_version == LEGACY_HISTORY_VERSION:
+        print(f"Rebuilding the tables for {len(pending)} new events (version 1 features cannot be appended)")
+        return rebuild_tables(history_version)
+    df_preprocessed = read_cached_frame(TABLES_DIR / manifest['preprocessed'])
+    df_features = read_cached_frame(TABLES_DIR / manifest['features'])
+    # Events held on the same day are ingested together
+    for _, card in pending.groupby('DATE', sort=True):
+        event_names = card['EVENT'].tolist()
+        df_preprocessed, df_features = _ingest_card(df_preprocessed, df_features, event_names,
+                                                  history_version, manifest['fill_values'])
+        ingested.update(event_names)
+        print(f"Ingested {', '.join(event_names)}")
+    _write_tables(df_preprocessed, df_features, ingested, preprocessed_cache_key(), history_version,
+                  manifest['fill_values'])
+    return df_preprocessed, df_features
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append new UFC events to the stored feature tables")
+    parser.add_argument('--rebuild', action='store_true', help="rebuild the tables from scratch")
+    parser.add_argument('--history-version', type=int,
+                        help="per-fighter history version (default: that of the deployed model)")
+    args = parser.parse_args()
+
+    history_version = args.history_version
+    if history_version is None:
+        model = UFCXGBoostModel()
+        model.load(MODEL_PATH)
+        history_version = model.history_version
+
+    if args.rebuild:
+        df_preprocessed, df_features = rebuild_tables(history_version)
+    else:
+        df_preprocessed, df_features = ingest_new_events(history_version)
+    print(f"Tables hold {len(df_preprocessed)} fights with {len(df_features.columns)} feature columns")
@@ -66,6 +66,9 @@ COLS_TO_DROP = ['URL', 'EVENT', 'BOUT', 'DETAILS', 'fighter1_name', 'fighter2_na
                 'fighter2_leg_landed', 'fighter2_distance_landed', 'fighter2_clinch_landed',
                 'fighter2_ground_landed', 'fighter2_KD', 'fighter2_SUB.ATT', 'fighter2_REV.']
 
+# Categorical columns one-hot encoded as '{column}_{level}'
+CATEGORICAL_COLS = ['REFEREE', 'WEIGHTCLASS', 'stance_matchup']
+
 # Rate columns to fill with 0.0 for NaN values
 RATE_COLS = ['fighter1_finish_rate_last_5', 'fighter2_finish_rate_last_5',
              'fighter1_ko_rate_last_5', 'fighter2_ko_rate_last_5',
@@ -0,0 +1,109 @@
+import bisect
+import threading
+
+# In-process metrics for the serving hot path, exported by the API at GET /metrics in the
+# Prometheus text format. Recording a value is a bisect into fixed bucket bounds and two
+# increments under a lock (well under a microsecond), so the instrumentation stays on in
+# production; all formatting happens when /metrics is scraped.
+
+# Latency bucket upper bounds in seconds, from 10 µs to 10 s
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+
+
+class Counter:
+    """A monotonically increasing count per combination of label values."""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values=(), amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [(self.name, dict(zip(self.labels, key)), value) for key, value in sorted(values.items())]
+
+class Histogram:
+    """Counts of observed values per bucket, with their count and sum, per combination of label values."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one +Inf), sum of values]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        samples = []
+        for key, (counts, total) in sorted(series.items()):
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', dict(labels, le=_format_value(bound)), cumulative))
+            samples.append((f'{self.name}_count', labels, cumulative))
+            samples.append((f'{self.name}_sum', labels, total))
+        return samples
+
+class ScrapedMetric:
+    """
+    A gauge or counter kept elsewhere (the prediction cache's hit count, the served
+    version, ...), read when the metrics are scraped: `read` returns (label values,
+    value) pairs.
+    """
+
+    def __init__(self, name, help, type, read, labels=()):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.labels = tuple(labels)
+        self.read = read
+
+    def samples(self):
+        return [(self.name, dict(zip(self.labels, key)), value) for key, value in self.read()]
+
+#Formats metrics in the Prometheus text exposition format
+def render(metrics):
+    lines = []
+    for metric in metrics:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for name, labels, value in metric.samples():
+            if labels:
+                label_text = ','.join(f'{key}="{_escape(str(label))}"' for key, label in labels.items())
+                lines.append(f'{name}{{{label_text}}} {_format_value(value)}')
+            else:
+                lines.append(f'{name} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -1,13 +1,21 @@
+import hashlib
+import os
 import xgboost as xgb
 import joblib
 from tuning import MODEL_PARAMS
 
+# Per-fighter history version (see features/timeline.py) of models saved before the
+# version was recorded in them
+UNRECORDED_HISTORY_VERSION = 1
+
 # XGBoost model wrapper for UFC fight prediction
 class UFCXGBoostModel:
     def __init__(self, **params):
         tuned_params = MODEL_PARAMS
         tuned_params.update(params)
         self.model = xgb.XGBClassifier(**tuned_params)
+        # Per-fighter history version of the features the model is trained on; saved with it
+        self.history_version = None
     
     def fit(self, X_train, y_train, X_val=None, y_val=None):
         if X_val is not None and y_val is not None:
@@ -27,7 +35,16 @@ class UFCXGBoostModel:
         return self.model.feature_importances_
     
     def save(self, filepath):
+        if self.history_version is not None:
+            self.model.get_booster().set_attr(history_version=str(self.history_version))
         joblib.dump(self.model, filepath)
     
     def load(self, filepath):
         self.model = joblib.load(filepath)
+        history_version = self.model.get_booster().attr('history_version')
+        self.history_version = int(history_version) if history_version is not None else UNRECORDED_HISTORY_VERSION
+        # Identifies the loaded file: (path, modification time, size)
+        stat = os.stat(filepath)
+        self.source = (str(filepath), stat.st_mtime_ns, stat.st_size)
+        with open(filepath, 'rb') as f:
+            self.digest = hashlib.sha256(f.read()).hexdigest()
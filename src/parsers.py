@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+# Vectorized counterparts of the scalar parsers in preprocessor.py. Each function
+# parses a whole raw column in one pass and mirrors the scalar version's handling
+# of missing values ('---', '--', NaN) and malformed strings. Raw stats columns
+# repeat the same few thousand strings across tens of thousands of rows, so every
+# distinct string is parsed once and the results are broadcast back by code.
+
+MISSING_VALUES = ['---', '--']
+DOB_FORMAT = '%b %d, %Y'
+
+# Factorize a raw column and parse each distinct value once. `parse` maps a string
+# Series of distinct values to an (n_distinct, k) float array with NaN where the
+# value is missing or malformed; NaN cells of the raw column also come back as NaN.
+def _parse_distinct(series, parse, missing=MISSING_VALUES):
+    codes, uniques = pd.factorize(series)
+    distinct = pd.Series(np.asarray(uniques, dtype=object), dtype='string').str.strip()
+    distinct = distinct.mask(distinct.isin(missing))
+    parsed = parse(distinct)
+    # Code -1 (NaN in the raw column) picks up the trailing all-NaN row
+    parsed = np.vstack([parsed, np.full((1, parsed.shape[1]), np.nan)])
+    return parsed[codes]
+
+# Convert extracted string groups to a float array, NaN where the pattern did not match
+def _to_float(frame):
+    return frame.apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+def _fraction_parts(distinct):
+    return _to_float(distinct.str.extract(r'^(\d+)\s+of\s+(\d+)$'))
+
+def _percentage_parts(distinct):
+    return _to_float(distinct.str.replace('%', '', regex=False).to_frame()) / 100
+
+def _time_parts(distinct):
+    parts = _to_float(distinct.str.extract(r'^(\d+):(\d+)$'))
+    return parts[:, [0]] * 60 + parts[:, [1]]
+
+def _height_parts(distinct):
+    parts = _to_float(distinct.str.extract(r"""^(\d+)\s*'\s*(\d+)\s*"?$"""))
+    return parts[:, [0]] * 12 + parts[:, [1]]
+
+def _weight_parts(distinct):
+    return _to_float(distinct.str.replace(' lbs.', '', regex=False).to_frame())
+
+def _reach_parts(distinct):
+    return _to_float(distinct.str.replace('"', '', regex=False).to_frame())
+
+# Parse a column of fraction strings to (landed, attempted) int arrays, e.g. '17 of 26'
+def parse_fraction_column(series):
+    parts = np.nan_to_num(_parse_distinct(series, _fraction_parts), nan=0).astype('int64')
+    return parts[:, 0], parts[:, 1]
+
+# Parse a column of percentage strings to decimal values, e.g. '65%' to 0.65
+def parse_percentage_column(series):
+    return np.nan_to_num(_parse_distinct(series, _percentage_parts)[:, 0], nan=0.0)
+
+# Parse a column of time strings to total seconds, e.g. '4:32' to 272
+def parse_time_seconds_column(series):
+    return np.nan_to_num(_parse_distinct(series, _time_parts)[:, 0], nan=0).astype('int64')
+
+# Parse a column of height strings to total inches, e.g. "5' 9\"" to 69
+def parse_height_inches_column(series):
+    return _parse_distinct(series, _height_parts, missing=['--'])[:, 0]
+
+# Parse a column of weight strings to numeric pounds, e.g. '125 lbs.' to 125
+def parse_weight_lbs_column(series):
+    return _parse_distinct(series, _weight_parts, missing=['--'])[:, 0]
+
+# Parse a column of reach strings to numeric inches, e.g. '68"' to 68
+def parse_reach_inches_column(series):
+    return _parse_distinct(series, _reach_parts, missing=['--'])[:, 0]
+
+# Parse a column of DOB strings to datetimes, handling '--' as NaT
+def parse_dob_column(series):
+    values = series.where(series != '--')
+    dob = pd.to_datetime(values, format=DOB_FORMAT, errors='coerce')
+    # Fall back to per-element parsing for the rare value in another format
+    unparsed = dob.isna() & values.notna()
+    if unparsed.any():
+        dob[unparsed] = pd.to_datetime(values[unparsed], format='mixed', errors='coerce')
+    return dob
+
+
+# Stats columns parsed as 'landed of attempted', mapped to their output column names
+FRACTION_COLUMNS = {
+    'SIG.STR.': ('sig_strikes_landed', 'sig_strikes_attempted'),
+    'TOTAL STR.': ('total_strikes_landed', 'total_strikes_attempted'),
+    'TD': ('takedowns_landed', 'takedowns_attempted'),
+    'HEAD': ('head_landed', None),
+    'BODY': ('body_landed', None),
+    'LEG': ('leg_landed', None),
+    'DISTANCE': ('distance_landed', None),
+    'CLINCH': ('clinch_landed', None),
+    'GROUND': ('ground_landed', None),
+}
+PERCENTAGE_COLUMNS = {'SIG.STR. %': 'sig_strikes_pct', 'TD %': 'takedown_pct'}
+TIME_COLUMNS = {'CTRL': 'control_time_sec'}
+
+# Parse every raw round-level stats column into its numeric columns in one pass
+def parse_fight_stats(stats):
+    parsed = {}
+    for raw_col, (landed_col, attempted_col) in FRACTION_COLUMNS.items():
+        landed, attempted = parse_fraction_column(stats[raw_col])
+        parsed[landed_col] = landed
+        if attempted_col is not None:
+            parsed[attempted_col] = attempted
+    for raw_col, col in PERCENTAGE_COLUMNS.items():
+        parsed[col] = parse_percentage_column(stats[raw_col])
+    for raw_col, col in TIME_COLUMNS.items():
+        parsed[col] = parse_time_seconds_column(stats[raw_col])
+    return pd.DataFrame(parsed, index=stats.index)
+
+# Parse the raw fighter tale-of-the-tape columns into numeric attributes
+def parse_fighter_attributes(fighter_tott):
+    return pd.DataFrame({
+        'height_inches': parse_height_inches_column(fighter_tott['HEIGHT']),
+        'weight_lbs': parse_weight_lbs_column(fighter_tott['WEIGHT']),
+        'reach_inches': parse_reach_inches_column(fighter_tott['REACH']),
+        'dob_datetime': parse_dob_column(fighter_tott['DOB']),
+    }, index=fighter_tott.index)
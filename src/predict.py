@@ -1,8 +1,14 @@
-import pandas as pd
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
 import numpy as np
 from pathlib import Path
-from model import UFCXGBoostModel
-from fighters import get_fighter_features, _get_preprocessed_data, _get_features_data
+from fighters import _get_snapshots, _current_snapshots, load_serving_data, set_serving_data
+from serving import (BundledModel, get_bundle, read_bundle, set_bundle, bundle_build_lock, build_bundle_subprocess,
+                     candidate_bundle_path, publish_bundle_file)
+from metrics import Histogram
 
 # Get project root directory (go up from src/predict.py)
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -11,83 +17,523 @@ MODELS_DIR = PROJECT_ROOT / "models"
 # Cache the model to avoid reloading from disk on every request
 _model_cache = None
 _model_path_cache = None
+_plan_cache = None
+
+# Plan predictions are served with by default; reload_plan swaps it for a new one
+_serving_plan = None
+_reload_lock = threading.Lock()
+
+# Bounds of the prediction cache: PREDICTION_CACHE_SIZE entries, each kept for
+# PREDICTION_CACHE_TTL seconds (unset or empty to keep entries until evicted)
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 4096))
+PREDICTION_CACHE_TTL = float(os.environ["PREDICTION_CACHE_TTL"]) if os.environ.get("PREDICTION_CACHE_TTL") else None
+
+# Time spent per scoring stage: scope 'fight' is one predict_fight (name lookup, row
+# assembly, model), 'batch' one call scoring many fights ('cache': validating the pairs
+# and looking them up in the cache, then rows and model for the misses)
+stage_latency = Histogram('ufc_predict_stage_seconds', "Time spent per prediction stage", ('stage', 'scope'))
 
 def _get_model(model_path: str = None):
     """Load and cache the model (reload only if path changes)"""
     global _model_cache, _model_path_cache
     
-    if model_path is None:
-        model_path = str(MODELS_DIR / 'ufc_model_final.pkl')
-    else:
-        # Convert relative paths to absolute
-        if not Path(model_path).is_absolute():
-            model_path = str(MODELS_DIR / model_path)
-    
+    model_path = _resolve_model_path(model_path)
     if _model_cache is None or _model_path_cache != model_path:
-        model = UFCXGBoostModel()
-        model.load(model_path)
-        _model_cache = model
+        _model_cache = _load_model(model_path)
         _model_path_cache = model_path
     
     return _model_cache
 
-def predict_fight(fighter1_name: str, fighter2_name: str, model_path: str = None):
-    # Load cached model (only loads from disk once)
-    model = _get_model(model_path)
-    
-    # Get full datasets (with all historical data for proper feature calculation)
-    df_preprocessed = _get_preprocessed_data()
-    df_features = _get_features_data()
-    
-    # Get each fighter's latest features (normalized to fighter1_* format)
-    f1_features = get_fighter_features(fighter1_name, df_preprocessed, df_features)
-    f2_features = get_fighter_features(fighter2_name, df_preprocessed, df_features)
-    
-    # Build prediction row as dictionary (avoids DataFrame fragmentation)
-    fight_row_dict = f1_features.to_dict()
-    
-    # Add fighter2 features (rename fighter1_* to fighter2_*)
-    for col in f2_features.index:
-        fighter2_col = col.replace('fighter1_', 'fighter2_')
-        fight_row_dict[fighter2_col] = f2_features[col]
-    
-    # Get non-fighter-specific features from fighter1's latest fight
-    latest_f1_fight = df_preprocessed[
-        (df_preprocessed['fighter1_name'] == fighter1_name) | 
-        (df_preprocessed['fighter2_name'] == fighter1_name)
-    ].sort_values('DATE').iloc[-1]
-    
-    latest_f1_features = df_features[df_features['DATE'] == latest_f1_fight['DATE']].iloc[0]
-    
-    # Add non-fighter-specific features (month, is_title_fight, etc.)
-    non_fighter_cols = [col for col in latest_f1_features.index 
-                       if not col.startswith('fighter') and col not in ['DATE', 'target']]
-    for col in non_fighter_cols:
-        fight_row_dict[col] = latest_f1_features[col]
-    
-    # Get model's expected feature names
+def _resolve_model_path(model_path: str = None):
+    if model_path is None:
+        return str(MODELS_DIR / 'ufc_model_final.pkl')
+    # Convert relative paths to absolute
+    if not Path(model_path).is_absolute():
+        return str(MODELS_DIR / model_path)
+    return model_path
+
+def _load_model(model_path: str):
+    # xgboost is imported on first load; the serving bundle scores without it
+    from model import UFCXGBoostModel
+    model = UFCXGBoostModel()
+    model.load(model_path)
+    return model
+
+def _get_model_feature_names(model, df_features=None):
+    """Feature columns the model was trained on, in training order"""
+    if isinstance(model, BundledModel):
+        return model.feature_names
     if hasattr(model.model, 'feature_names_in_') and model.model.feature_names_in_ is not None:
-        model_feature_names = list(model.model.feature_names_in_)
-    else:
+        return [str(col) for col in model.model.feature_names_in_]
+    try:
+        return model.model.get_booster().feature_names
+    except:
+        if df_features is None:
+            return None
+        return [col for col in df_features.columns if col not in ['DATE', 'target']]
+
+def _serving_columns(model):
+    """Feature columns needed to build the model's prediction rows (None for all)"""
+    feature_names = _get_model_feature_names(model)
+    if feature_names is None:
+        return None
+    # A fighter's features come from whichever corner they fought in last, so both
+    # corners of every per-fighter feature are needed, plus DATE
+    columns = ['DATE']
+    for col in feature_names:
+        for name in [col, col.replace('fighter1_', 'fighter2_'), col.replace('fighter2_', 'fighter1_')]:
+            if name not in columns:
+                columns.append(name)
+    return columns
+
+def _get_serving_snapshots(model):
+    """Fighter snapshot index over the model's serving feature table"""
+    return _get_snapshots(_serving_columns(model), model.history_version)
+
+class ScoringPlan:
+    """
+    Where each of a model's input columns comes from in a snapshot index, resolved once
+    per loaded model and snapshot index. A prediction row is assembled by three fancy-
+    index copies into a per-thread float32 buffer (columns with no source stay 0) and
+    scored with the booster's in-place prediction, without building a DataFrame. A
+    BundledModel from the serving bundle scores the rows itself.
+    """
+
+    def __init__(self, model, snapshots):
+        self.model = model
+        self.snapshots = snapshots
+        # Identifies the model file and snapshot index predictions were made with
+        self.version = (getattr(model, 'source', id(model)), snapshots.version)
+        # The same, as a string that is equal in every process serving the same files
+        model_digest = getattr(model, 'digest', None) or 'unknown'
+        self.label = f"{model_digest[:12]}.{snapshots.digest()[:12]}"
+        if isinstance(model, BundledModel):
+            self.booster, self.iteration_range, self.missing = None, model.iteration_range, model.missing
+        else:
+            self.booster = model.model.get_booster()
+            self.missing = getattr(model.model, 'missing', np.nan)
+            try:
+                self.iteration_range = (0, model.model.best_iteration + 1)
+            except AttributeError:
+                self.iteration_range = (0, 0)
+
+        feature_names = _get_model_feature_names(model, snapshots.df_features)
+        self.n_features = len(feature_names)
+        position = {col: i for i, col in enumerate(feature_names)}
+        self.fighter1 = self._permutation(position, snapshots.fighter_columns)
+        self.fighter2 = self._permutation(position, snapshots.fighter2_columns)
+        self.bout = self._permutation(position, snapshots.bout_columns)
+        self._local = threading.local()
+
+    # (model positions, source positions) of the source columns the model reads
+    @staticmethod
+    def _permutation(position, source_columns):
+        pairs = [(position[col], i) for i, col in enumerate(source_columns) if col in position]
+        return tuple(np.array([pair[k] for pair in pairs], dtype=np.intp) for k in [0, 1])
+
+    def _buffer(self):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._local.buffer = np.zeros((1, self.n_features), dtype=np.float32)
+        return buffer
+
+    def fight_row(self, fighter1_name, fighter2_name):
+        """Model input row for a fight, in the model's column order"""
+        snapshots = self.snapshots
+        return self.position_row(snapshots.position(fighter1_name), snapshots.position(fighter2_name))
+
+    def position_row(self, fighter1, fighter2):
+        """Model input row for a fight given as snapshot rows of both fighters"""
+        snapshots = self.snapshots
+        row = self._buffer()
+        row[0, self.fighter1[0]] = snapshots.vectors[fighter1][self.fighter1[1]]
+        row[0, self.fighter2[0]] = snapshots.vectors[fighter2][self.fighter2[1]]
+        # Non-fighter-specific features (month, is_title_fight, etc.) from fighter1's latest bout
+        row[0, self.bout[0]] = snapshots.bout_vectors[fighter1][self.bout[1]]
+        return row
+
+    def fight_rows(self, fighter1_names, fighter2_names):
+        """Model input matrix for several fights, one row per fight"""
+        snapshots = self.snapshots
+        return self.position_rows(snapshots.positions(fighter1_names), snapshots.positions(fighter2_names))
+
+    def position_rows(self, fighter1, fighter2):
+        """Model input matrix for fights given as snapshot rows of both fighters"""
+        snapshots = self.snapshots
+        rows = np.zeros((len(fighter1), self.n_features), dtype=np.float32)
+        rows[:, self.fighter1[0]] = snapshots.vectors[np.ix_(fighter1, self.fighter1[1])]
+        rows[:, self.fighter2[0]] = snapshots.vectors[np.ix_(fighter2, self.fighter2[1])]
+        rows[:, self.bout[0]] = snapshots.bout_vectors[np.ix_(fighter1, self.bout[1])]
+        return rows
+
+    def predict_proba(self, rows):
+        """Fighter1 win probability for each row"""
+        if self.booster is None:
+            return self.model.predict_proba(rows)
+        return self.booster.inplace_predict(rows, iteration_range=self.iteration_range, missing=self.missing)
+
+class PredictionCache:
+    """
+    Bounded LRU cache of fighter1 win probabilities keyed by (fighter1, fighter2, model
+    file, snapshot version), with an optional TTL. Concurrent misses on the same key are
+    single-flight: one caller computes while the others wait for its result.
+    """
+
+    def __init__(self, maxsize=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _lookup(self, key):
+        # Caller holds the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, value):
+        # Caller holds the lock
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        """Cached value, or None"""
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_compute(self, key, compute):
+        """Cached value, computing it with compute() on a miss (once across threads)"""
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            value = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            with self._lock:
+                self._store(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+            }
+
+prediction_cache = PredictionCache()
+
+#Gets the scoring plan for a model over its serving snapshot index, or over `snapshots`
+#(rebuilt when either changes); a new plan means a different model or snapshot, so cached
+#predictions are dropped
+def _get_scoring_plan(model, snapshots=None):
+    global _plan_cache
+    if snapshots is None:
+        current = _plan_cache is not None and _plan_cache.model is model and _plan_cache.snapshots is _current_snapshots()
+        snapshots = _plan_cache.snapshots if current else _get_serving_snapshots(model)
+    if _plan_cache is None or _plan_cache.model is not model or _plan_cache.snapshots is not snapshots:
+        _plan_cache = ScoringPlan(model, snapshots)
+        prediction_cache.clear()
+    return _plan_cache
+
+#Gets the plan predictions are served with: the one published by reload_plan, or on first
+#use the serving bundle's model and snapshots when a bundle is loaded, else the model file
+#over the data. A model_path gets a plan for that model instead
+def _get_plan(model_path: str = None):
+    global _serving_plan
+    if model_path is not None:
+        return _get_scoring_plan(_get_model(model_path))
+    if _serving_plan is None:
+        with _reload_lock:
+            if _serving_plan is None:
+                bundle = get_bundle()
+                if bundle is not None:
+                    _serving_plan = _get_scoring_plan(bundle.model, bundle.snapshots)
+                else:
+                    _serving_plan = _get_scoring_plan(_get_model())
+    return _serving_plan
+
+def reload_plan():
+    """
+    Build a new serving plan from the files on disk in the calling thread, validate it
+    (see validate_plan) and swap it in: the serving bundle when it is current, else the
+    model file over freshly loaded data. Requests that already hold the old plan finish
+    with it; the swap itself is a few reference assignments. Returns the plan served
+    afterwards, which is the current one when nothing changed.
+    """
+    global _model_cache, _model_path_cache
+    with _reload_lock:
+        bundle = read_bundle()
+        if bundle is not None:
+            plan, index, data = ScoringPlan(bundle.model, bundle.snapshots), bundle.index, None
+        else:
+            model_path = _resolve_model_path()
+            model = _load_model(model_path)
+            data = load_serving_data(_serving_columns(model), model.history_version)
+            plan, index = ScoringPlan(model, data['snapshots']), data['index']
+
+        if _serving_plan is not None and plan.label == _serving_plan.label:
+            return _serving_plan
+        validate_plan(plan, index, _serving_plan)
+        _publish_plan(plan, index, bundle, data)
+        if bundle is None:
+            _model_cache, _model_path_cache = model, model_path
+    return plan
+
+def refresh_plan():
+    """
+    Bring the serving bundle up to date with the model file and data and serve it. When
+    the bundle on disk is stale it is rebuilt in a separate process (the pandas pipeline
+    never runs here), validated, and published over the bundle file with an atomic rename;
+    workers watching the files then reload it. Returns the plan served afterwards, which
+    is the current one when nothing changed.
+    """
+    with _reload_lock, bundle_build_lock():
+        # Another worker may have rebuilt the bundle already
+        bundle, candidate = read_bundle(), None
+        if bundle is None:
+            candidate = build_bundle_subprocess(candidate_bundle_path())
+            bundle = read_bundle(candidate)
+            if bundle is None:
+                raise RuntimeError("The model file or data changed while the serving bundle was being built")
+
+        plan = ScoringPlan(bundle.model, bundle.snapshots)
+        if _serving_plan is not None and plan.label == _serving_plan.label:
+            if candidate is not None:
+                publish_bundle_file(candidate)
+            return _serving_plan
         try:
-            model_feature_names = model.model.get_booster().feature_names
-        except:
-            model_feature_names = [col for col in df_features.columns if col not in ['DATE', 'target']]
+            validate_plan(plan, bundle.index, _serving_plan)
+        except ValueError:
+            if candidate is not None:
+                candidate.unlink()
+            raise
+        if candidate is not None:
+            publish_bundle_file(candidate)
+        _publish_plan(plan, bundle.index, bundle)
+    return plan
+
+def validate_plan(plan, index, previous=None):
+    """
+    Check a new plan before it is served; raises ValueError when it has no fighters or
+    fewer than the plan it replaces, a model input with no column or only NaN in the
+    snapshot, or smoke predictions that are not probabilities
+    """
+    snapshots = plan.snapshots
+    n_fighters = len(snapshots.names)
+    if n_fighters == 0 or len(index.names) == 0:
+        raise ValueError("The new snapshot has no fighters")
+    if previous is not None and n_fighters < len(previous.snapshots.names):
+        raise ValueError(f"The new snapshot has {n_fighters} fighters, fewer than the {len(previous.snapshots.names)} served now")
+
+    n_sourced = len(plan.fighter1[0]) + len(plan.fighter2[0]) + len(plan.bout[0])
+    if n_sourced < plan.n_features:
+        raise ValueError(f"{plan.n_features - n_sourced} model inputs have no column in the new snapshot")
+    for values, columns, (_, used) in [(snapshots.vectors, snapshots.fighter_columns, plan.fighter1),
+                                       (snapshots.bout_vectors, snapshots.bout_columns, plan.bout)]:
+        empty = [columns[i] for i in used[np.isnan(values[:, used]).all(axis=0)]]
+        if empty:
+            raise ValueError(f"Model inputs with only NaN in the new snapshot: {', '.join(empty[:5])}")
+
+    # Smoke predictions (these also warm the plan up before requests use it)
+    fighters = np.arange(min(n_fighters, 16))
+    probs = plan.predict_proba(plan.position_rows(fighters, np.roll(fighters, 1)))
+    if not (np.isfinite(probs).all() and ((probs >= 0) & (probs <= 1)).all()):
+        raise ValueError("Smoke predictions with the new snapshot are not probabilities")
+
+def _publish_plan(plan, index, bundle=None, data=None):
+    global _serving_plan
+    index.search('a', 1)
+    set_bundle(bundle)
+    set_serving_data(index, data)
+    _serving_plan = plan
+    prediction_cache.clear()
+
+def predict_fight(fighter1_name: str, fighter2_name: str, model_path: str = None, plan=None):
+    # Load cached model (only loads from disk once), unless the caller holds a plan
+    plan = plan or _get_plan(model_path)
     
-    # Ensure all features exist (fill missing with 0)
-    for col in model_feature_names:
-        if col not in fight_row_dict:
-            fight_row_dict[col] = 0
+    def score():
+        start = time.perf_counter()
+        fighter1, fighter2 = plan.snapshots.position(fighter1_name), plan.snapshots.position(fighter2_name)
+        looked_up = time.perf_counter()
+        # Each fighter's latest features (precomputed, with all historical data) in model column order
+        fight_row = plan.position_row(fighter1, fighter2)
+        assembled = time.perf_counter()
+        prob = float(plan.predict_proba(fight_row)[0])
+        done = time.perf_counter()
+        stage_latency.observe(('lookup', 'fight'), looked_up - start)
+        stage_latency.observe(('assemble', 'fight'), assembled - looked_up)
+        stage_latency.observe(('model', 'fight'), done - assembled)
+        return prob
     
-    # Create DataFrame once from dictionary (no fragmentation)
-    fight_row = pd.DataFrame([fight_row_dict])
+    # Make prediction (cache hits skip feature assembly and the model)
+    prob = prediction_cache.get_or_compute((fighter1_name, fighter2_name) + plan.version, score)
     
-    # Convert to numeric and select features in correct order
-    fight_row = fight_row[model_feature_names].astype(float)
+    return _prediction_result(fighter1_name, fighter2_name, prob)
+
+def predict_fights(pairs, model_path: str = None, plan=None, cache: bool = True):
+    """
+    Predict several (fighter1, fighter2) matchups with one feature matrix and one booster
+    call. Results are in input order; a pair that cannot be predicted (unknown fighter,
+    same fighter twice) gets {'fighter1', 'fighter2', 'error'} instead of probabilities.
+    With cache=False the prediction cache is neither read nor filled, so bulk scoring
+    does not evict the entries interactive requests hit.
+    """
+    plan = plan or _get_plan(model_path)
+    pairs = [tuple(pair) for pair in pairs]
+    probs, errors, _, _ = _score_pairs(pairs, plan, cache)
+    return [_pair_result(pair, prob, error) for pair, prob, error in zip(pairs, probs, errors)]
+
+def predict_card(bouts, event: str = None, model_path: str = None, plan=None):
+    """
+    Predict every bout of a card, given as (fighter1, fighter2) pairs, with one booster
+    call (see predict_fights). Each result also says whether it came from the prediction
+    cache and how many milliseconds after the start of the call it was ready: cached
+    bouts after the cache lookup, the others after the shared scoring call. `timings_ms`
+    breaks the call down into cache lookup, feature assembly and model time.
+    """
+    start = time.perf_counter()
+    plan = plan or _get_plan(model_path)
+    bouts = [tuple(bout) for bout in bouts]
+    probs, errors, cached, timings = _score_pairs(bouts, plan)
+    lookup_ms = timings['lookup'] * 1000
+    scored_ms = (time.perf_counter() - start) * 1000
+
+    results = []
+    for bout, prob, error, hit in zip(bouts, probs, errors, cached):
+        ready_ms = lookup_ms if hit or error is not None else scored_ms
+        results.append(dict(_pair_result(bout, prob, error), cached=hit, latency_ms=round(ready_ms, 3)))
+    return {
+        'event': event,
+        'bouts': results,
+        'timings_ms': {
+            'lookup': round(lookup_ms, 3),
+            'features': round(timings['features'] * 1000, 3),
+            'model': round(timings['model'] * 1000, 3),
+            'total': round((time.perf_counter() - start) * 1000, 3),
+        },
+    }
+
+def _score_pairs(pairs, plan, cache=True):
+    """
+    Fighter1 win probabilities of (fighter1, fighter2) pairs, from the prediction cache (if
+    `cache`) or scored together in one booster call. Returns the probabilities (None for invalid pairs),
+    errors, whether each came from the cache, and the seconds spent per stage.
+    """
+    start = time.perf_counter()
+    # Validate every pair, then look the valid ones up in the prediction cache
+    errors = [_pair_error(plan.snapshots, fighter1_name, fighter2_name) for fighter1_name, fighter2_name in pairs]
+    probs = [prediction_cache.get(pair + plan.version) if error is None and cache else None
+             for pair, error in zip(pairs, errors)]
+    cached = [prob is not None for prob in probs]
+    lookup_done = features_done = time.perf_counter()
     
-    # Make prediction
-    prob = model.predict_proba(fight_row)[0]
+    # Score the remaining valid pairs together
+    missing = [i for i, (prob, error) in enumerate(zip(probs, errors)) if prob is None and error is None]
+    if missing:
+        fighter1_names, fighter2_names = zip(*[pairs[i] for i in missing])
+        rows = plan.fight_rows(fighter1_names, fighter2_names)
+        features_done = time.perf_counter()
+        scored = plan.predict_proba(rows)
+        for i, prob in zip(missing, scored.tolist()):
+            probs[i] = prob
+            if cache:
+                prediction_cache.put(pairs[i] + plan.version, prob)
+    timings = {'lookup': lookup_done - start, 'features': features_done - lookup_done,
+               'model': time.perf_counter() - features_done if missing else 0.0}
+    stage_latency.observe(('cache', 'batch'), timings['lookup'])
+    if missing:
+        stage_latency.observe(('assemble', 'batch'), timings['features'])
+        stage_latency.observe(('model', 'batch'), timings['model'])
+    return probs, errors, cached, timings
+
+def _pair_result(pair, prob, error):
+    if error is not None:
+        return {'fighter1': pair[0], 'fighter2': pair[1], 'error': error}
+    return _prediction_result(pair[0], pair[1], prob)
+
+# Most fights scored per booster call when predicting a matrix
+MATRIX_CHUNK_ROWS = 16384
+
+def predict_matrix(fighter_names, model_path: str = None, plan=None):
+    """
+    All-pairs win probabilities: a float32 N x N array whose [i, j] is the probability
+    that fighter_names[i] beats fighter_names[j] as fighter1 (NaN on the diagonal).
+    Fights are scored a block of fighter1 rows at a time, at most MATRIX_CHUNK_ROWS
+    fights per booster call.
+    """
+    plan = plan or _get_plan(model_path)
+    positions = plan.snapshots.positions(fighter_names)
+    n = len(positions)
+    matrix = np.empty((n, n), dtype=np.float32)
     
+    block = max(1, MATRIX_CHUNK_ROWS // max(n, 1))
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        fighter1 = np.repeat(positions[start:stop], n)
+        fighter2 = np.tile(positions, stop - start)
+        matrix[start:stop] = plan.predict_proba(plan.position_rows(fighter1, fighter2)).reshape(stop - start, n)
+    np.fill_diagonal(matrix, np.nan)
+    return matrix
+
+def _pair_error(snapshots, fighter1_name, fighter2_name):
+    if fighter1_name == fighter2_name:
+        return "Fighter1 and Fighter2 must be different"
+    for name in [fighter1_name, fighter2_name]:
+        if name not in snapshots:
+            return f"Fighter '{name}' not found"
+    return None
+
+def _prediction_result(fighter1_name, fighter2_name, prob):
     return {
         'fighter1': fighter1_name,
         'fighter2': fighter2_name,
@@ -1,10 +1,20 @@
+import hashlib
+import os
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from parsers import parse_fight_stats, parse_fighter_attributes
+from serving import BOUT_SEPARATOR
 
 # Get project root directory (go up from src/preprocessor.py)
 PROJECT_ROOT = Path(__file__).parent.parent
 DATA_DIR = PROJECT_ROOT / "data"
+CACHE_DIR = PROJECT_ROOT / ".cache"
+
+# Bump when merge_dataframes/fill_nan_values change so cached output is rebuilt
+PIPELINE_VERSION = 1
+INPUT_FILES = ['ufc_event_details.csv', 'ufc_fight_results.csv',
+               'ufc_fight_stats.csv', 'ufc_fighter_tott.csv']
 
 # Parse fraction strings to (landed, attempted) tuple, e.g. '17 of 26'
 def parse_fraction(value):
@@ -60,6 +70,39 @@ def combine_dataframes():
     results = pd.read_csv(DATA_DIR / 'ufc_fight_results.csv')
     stats = pd.read_csv(DATA_DIR / 'ufc_fight_stats.csv')
     fighter_tott = pd.read_csv(DATA_DIR / 'ufc_fighter_tott.csv')
+    return merge_dataframes(events, results, stats, fighter_tott)
+
+# Combine only the bouts of the given events, reading just their rows of the results and
+# stats CSVs and parsing just the attributes of the fighters in them
+def combine_event_dataframes(event_names):
+    events = pd.read_csv(DATA_DIR / 'ufc_event_details.csv')
+    results = read_event_rows(DATA_DIR / 'ufc_fight_results.csv', event_names)
+    stats = read_event_rows(DATA_DIR / 'ufc_fight_stats.csv', event_names)
+    fighter_tott = pd.read_csv(DATA_DIR / 'ufc_fighter_tott.csv')
+    card_fighters = {name.strip() for bout in results['BOUT'] for name in bout.split(BOUT_SEPARATOR)}
+    fighter_tott = fighter_tott[fighter_tott['FIGHTER'].isin(card_fighters)].reset_index(drop=True)
+    return merge_dataframes(events, results, stats, fighter_tott)
+
+# Rows read per chunk when looking for an event's rows
+EVENT_CHUNK_ROWS = 2000
+
+# Read the rows of the given events from a results or stats CSV. Each event's rows are
+# together (the scrape writes one event at a time, newest first), so reading stops at the
+# first chunk that ends outside them once every event has been seen: new events at the
+# top of the file cost one chunk, and events missing from the file a full scan.
+def read_event_rows(path, event_names):
+    event_names = set(event_names)
+    seen, rows = set(), []
+    for chunk in pd.read_csv(path, chunksize=EVENT_CHUNK_ROWS):
+        selected = chunk['EVENT'].str.strip().isin(event_names)
+        rows.append(chunk[selected])
+        seen.update(chunk.loc[selected, 'EVENT'].str.strip())
+        if seen == event_names and not selected.iloc[-1]:
+            break
+    return pd.concat(rows, ignore_index=True)
+
+# Merge the loaded CSVs into one row per bout with both fighters' stats and attributes
+def merge_dataframes(events, results, stats, fighter_tott):
     # Strip whitespace from EVENT and BOUT columns to fix merge issues
     events['EVENT'] = events['EVENT'].str.strip()
     results['EVENT'] = results['EVENT'].str.strip()
@@ -72,27 +115,13 @@ def combine_dataframes():
     df = df.merge(events[['EVENT', 'DATE', 'LOCATION']], on='EVENT', how='left')
     # Convert DATE to datetime
     df['DATE'] = pd.to_datetime(df['DATE'], errors='coerce')
-    # Extract fighter names
-    df[['fighter1_name', 'fighter2_name']] = df['BOUT'].str.split(' vs. ', expand=True)
+    # Extract fighter names (serving.split_bout splits a single bout the same way)
+    df[['fighter1_name', 'fighter2_name']] = df['BOUT'].str.split(BOUT_SEPARATOR, expand=True)
     df['fighter1_name'] = df['fighter1_name'].str.strip()
     df['fighter2_name'] = df['fighter2_name'].str.strip()
     # Parse and aggregate fight stats per fighter
-    stats_clean = stats.copy()
-    stats_clean['sig_strikes_landed'] = stats_clean['SIG.STR.'].apply(lambda x: parse_fraction(x)[0])
-    stats_clean['sig_strikes_attempted'] = stats_clean['SIG.STR.'].apply(lambda x: parse_fraction(x)[1])
-    stats_clean['sig_strikes_pct'] = stats_clean['SIG.STR. %'].apply(parse_percentage)
-    stats_clean['total_strikes_landed'] = stats_clean['TOTAL STR.'].apply(lambda x: parse_fraction(x)[0])
-    stats_clean['total_strikes_attempted'] = stats_clean['TOTAL STR.'].apply(lambda x: parse_fraction(x)[1])
-    stats_clean['takedowns_landed'] = stats_clean['TD'].apply(lambda x: parse_fraction(x)[0])
-    stats_clean['takedowns_attempted'] = stats_clean['TD'].apply(lambda x: parse_fraction(x)[1])
-    stats_clean['control_time_sec'] = stats_clean['CTRL'].apply(parse_time_seconds)
-    stats_clean['head_landed'] = stats_clean['HEAD'].apply(lambda x: parse_fraction(x)[0])
-    stats_clean['body_landed'] = stats_clean['BODY'].apply(lambda x: parse_fraction(x)[0])
-    stats_clean['leg_landed'] = stats_clean['LEG'].apply(lambda x: parse_fraction(x)[0])
-    stats_clean['distance_landed'] = stats_clean['DISTANCE'].apply(lambda x: parse_fraction(x)[0])
-    stats_clean['clinch_landed'] = stats_clean['CLINCH'].apply(lambda x: parse_fraction(x)[0])
-    stats_clean['ground_landed'] = stats_clean['GROUND'].apply(lambda x: parse_fraction(x)[0])
-    stats_clean['takedown_pct'] = stats_clean['TD %'].apply(parse_percentage)
+    stats_clean = pd.concat([stats[['EVENT', 'BOUT', 'FIGHTER', 'KD', 'SUB.ATT', 'REV.']],
+                             parse_fight_stats(stats)], axis=1)
     # Aggregate per fighter per fight
     agg_dict = {
         'sig_strikes_landed': 'sum', 'sig_strikes_attempted': 'sum',
@@ -115,10 +144,7 @@ def combine_dataframes():
                   right_on=['EVENT', 'BOUT', 'FIGHTER'], how='left')
     df = df.drop(columns=['FIGHTER'])
     # Add fighter attributes
-    fighter_tott['height_inches'] = fighter_tott['HEIGHT'].apply(parse_height_inches)
-    fighter_tott['weight_lbs'] = fighter_tott['WEIGHT'].apply(parse_weight_lbs)
-    fighter_tott['reach_inches'] = fighter_tott['REACH'].apply(parse_reach_inches)
-    fighter_tott['dob_datetime'] = fighter_tott['DOB'].apply(parse_dob)
+    fighter_tott = pd.concat([fighter_tott, parse_fighter_attributes(fighter_tott)], axis=1)
     # Merge fighter1 attributes
     df = df.merge(fighter_tott[['FIGHTER', 'height_inches', 'weight_lbs', 'reach_inches', 'STANCE', 'dob_datetime']],
                   left_on='fighter1_name', right_on='FIGHTER', how='left')
@@ -139,32 +165,97 @@ def get_mode(series):
     mode_values = series.mode()
     return mode_values.iloc[0] if len(mode_values) > 0 else np.nan
 
-# Fill NaN values using weight-class-specific means
-def fill_nan_values(df):
+# Fill NaN values using weight-class-specific means. The fill constants are taken from
+# `fill_values` when given there (e.g. those of the whole dataset for a few new rows),
+# else computed from df and added to it
+def fill_nan_values(df, fill_values=None):
+    fill_values = {} if fill_values is None else fill_values
+    def constant(name, compute):
+        if name not in fill_values:
+            fill_values[name] = compute()
+        return fill_values[name]
+
     # Fill NaN values for height, weight, reach using weight-class-specific means
     for attr in ['height', 'weight', 'reach']:
         for fighter_num in [1, 2]:
             col = f'fighter{fighter_num}_{attr}'
-            df[col] = df[col].fillna(df.groupby('WEIGHTCLASS')[col].transform('mean'))
-            df[col] = df[col].fillna(df[col].mean())
+            means = constant(f'{col}_by_weightclass', lambda: df.groupby('WEIGHTCLASS')[col].mean().to_dict())
+            df[col] = df[col].fillna(df['WEIGHTCLASS'].map(means))
+            df[col] = df[col].fillna(constant(col, lambda: float(df[col].mean())))
     
     # Fill NaN values for stance using weight-class-specific mode
     for fighter_num in [1, 2]:
         col = f'fighter{fighter_num}_stance'
-        weight_class_modes = df.groupby('WEIGHTCLASS')[col].agg(get_mode)
+        weight_class_modes = constant(f'{col}_by_weightclass',
+                                      lambda: df.groupby('WEIGHTCLASS')[col].agg(get_mode).dropna().to_dict())
         df[col] = df[col].fillna(df['WEIGHTCLASS'].map(weight_class_modes))
-        overall_mode = df[col].mode()
-        if len(overall_mode) > 0:
-            df[col] = df[col].fillna(overall_mode.iloc[0])
+        overall_mode = constant(col, lambda: df[col].mode().iloc[0] if len(df[col].mode()) > 0 else None)
+        if overall_mode is not None:
+            df[col] = df[col].fillna(overall_mode)
     
     return df
 
 
-def preprocess_data():
+# Build the merged, imputed dataset from the raw CSVs (see fill_nan_values for fill_values)
+def build_preprocessed_data(fill_values=None):
     df = combine_dataframes()
-    df = fill_nan_values(df)
+    df = fill_nan_values(df, fill_values)
     #print(df.columns)
     df.drop_duplicates(inplace=True)
     return df
 
+# Hash the raw input CSVs together with the pipeline version
+def preprocessed_cache_key():
+    digest = hashlib.sha256(f'pipeline-v{PIPELINE_VERSION}'.encode())
+    for name in INPUT_FILES:
+        file_digest = hashlib.sha256()
+        with open(DATA_DIR / name, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                file_digest.update(chunk)
+        digest.update(f'{name}:{file_digest.hexdigest()}'.encode())
+    return digest.hexdigest()[:16]
 
+# Read a frame written by write_cached_frame
+def read_cached_frame(path):
+    df = pd.read_feather(path)
+    df = df.set_index('__index__')
+    df.index.name = None
+    return df
+
+# Write a frame as Feather, keeping its index, and prune files sharing its prefix down to
+# the `keep` most recently used (this one included)
+def write_cached_frame(df, path, prefix=None, keep=1):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temp file and rename so concurrent readers never see a partial file
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    df.rename_axis('__index__').reset_index().to_feather(tmp_path)
+    os.replace(tmp_path, path)
+    # Drop the least recently used entries
+    if prefix is not None:
+        others = [(_mtime(entry), entry) for entry in path.parent.glob(f'{prefix}_*.feather') if entry != path]
+        for _, stale in sorted(others, reverse=True)[keep - 1:]:
+            stale.unlink(missing_ok=True)
+
+# Marks a cache file as just used, so pruning keeps it longest
+def touch_cached_frame(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def _mtime(path):
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+# Load the preprocessed dataset, rebuilding it only when the input CSVs change
+def preprocess_data(use_cache=True):
+    if not use_cache:
+        return build_preprocessed_data()
+    cache_path = CACHE_DIR / f'preprocessed_{preprocessed_cache_key()}.feather'
+    if cache_path.exists():
+        return read_cached_frame(cache_path)
+    df = build_preprocessed_data()
+    write_cached_frame(df, cache_path, 'preprocessed')
+    return df
@@ -0,0 +1,155 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from predict import ScoringPlan, _get_plan, _pair_error, _serving_columns
+from serving import BundledModel, load_bundle
+
+# Offline bulk scoring: python src/score.py matchups.csv predictions.parquet --workers 8
+#
+# The input is a CSV or Parquet file with fighter1 and fighter2 columns and an optional
+# as_of date column. Rows are cut into chunks and scored across a process pool: each
+# worker loads the model and fighter snapshots once (memory-mapping the serving bundle
+# when it is current, so workers share it) and scores a chunk with one vectorized lookup
+# and one model call. A row with an as_of date is scored with each fighter's features
+# from their latest bout before that date, built from the feature table in the worker.
+
+# Rows per chunk handed to a worker
+CHUNK_ROWS = 20000
+
+# Snapshots kept per worker for as_of dates (consecutive chunks share dates, as rows are
+# chunked in date order)
+AS_OF_CACHE_SIZE = 8
+
+OUTPUT_COLUMNS = ['fighter1_win_probability', 'fighter2_win_probability', 'predicted_winner', 'error']
+
+_plan = None
+
+#Loads the model and snapshots of a worker process (or of this one with --workers 1)
+def _init_worker(model_path=None):
+    global _plan
+    if model_path is None:
+        load_bundle()
+    _plan = _get_plan(model_path)
+    # One thread per process; the pool provides the parallelism
+    if _plan.booster is not None:
+        _plan.booster.set_param({'nthread': 1})
+    elif isinstance(_plan.model, BundledModel):
+        _plan.model.set_booster_params({'nthread': 1})
+    _as_of_plan.cache_clear()
+
+#Gets the plan scoring fights as of a date (YYYY-MM-DD): each fighter's features from
+#their latest bout before it
+@lru_cache(maxsize=AS_OF_CACHE_SIZE)
+def _as_of_plan(as_of):
+    from fighters import build_snapshots, _get_preprocessed_data, _get_features_data
+    df_features = _get_features_data(_serving_columns(_plan.model), _plan.model.history_version)
+    earlier = df_features[df_features['DATE'] < pd.Timestamp(as_of)]
+    return ScoringPlan(_plan.model, build_snapshots(_get_preprocessed_data(), earlier))
+
+#Scores one chunk in a worker
+def _score_chunk(fighter1_names, fighter2_names, as_of=None):
+    plan = _plan if as_of is None else _as_of_plan(as_of)
+    return score_matchups(plan, fighter1_names, fighter2_names)
+
+def score_matchups(plan, fighter1_names, fighter2_names):
+    """
+    Fighter1 win probabilities (float32, NaN where a pair cannot be predicted) and an
+    error per row (None when predicted) for arrays of fighter names, with one model call
+    """
+    fighter1_names, fighter2_names = np.asarray(fighter1_names, dtype=str), np.asarray(fighter2_names, dtype=str)
+    snapshots = plan.snapshots
+    fighter1, fighter2 = snapshots.lookup(fighter1_names), snapshots.lookup(fighter2_names)
+    valid = (fighter1 >= 0) & (fighter2 >= 0) & (fighter1_names != fighter2_names)
+
+    probs = np.full(len(fighter1), np.nan, dtype=np.float32)
+    if valid.any():
+        probs[valid] = plan.predict_proba(plan.position_rows(fighter1[valid], fighter2[valid]))
+    errors = np.full(len(fighter1), None, dtype=object)
+    for i in np.flatnonzero(~valid):
+        errors[i] = _pair_error(snapshots, fighter1_names[i], fighter2_names[i])
+    return probs, errors
+
+#Reads matchups from a CSV or Parquet file
+def read_matchups(path):
+    path = Path(path)
+    df = pd.read_parquet(path) if path.suffix == '.parquet' else pd.read_csv(path)
+    missing = [col for col in ['fighter1', 'fighter2'] if col not in df.columns]
+    if missing:
+        raise ValueError(f"{path} has no {' or '.join(missing)} column")
+    return df
+
+#Writes scored matchups to a CSV or Parquet file (by extension)
+def write_predictions(df, path):
+    path = Path(path)
+    if path.suffix == '.parquet':
+        df.to_parquet(path, index=False)
+    elif path.suffix == '.csv':
+        df.to_csv(path, index=False)
+    else:
+        raise ValueError(f"Unsupported output format '{path.suffix}'; use .csv or .parquet")
+
+#Cuts row positions into chunks of at most `chunk_rows` rows sharing one as_of date
+def _chunks(df, chunk_rows):
+    if 'as_of' in df.columns:
+        as_of = pd.to_datetime(df['as_of'], errors='coerce').dt.strftime('%Y-%m-%d').to_numpy(dtype=object)
+    else:
+        as_of = np.full(len(df), None, dtype=object)
+    as_of[pd.isna(as_of)] = None
+    # Rows without a date first, then in date order, so chunks with one date are consecutive
+    keys = np.array(['' if date is None else date for date in as_of])
+    order = np.argsort(keys, kind='stable')
+    bounds = np.flatnonzero(keys[order][1:] != keys[order][:-1]) + 1
+    for group in np.split(order, bounds):
+        for start in range(0, len(group), chunk_rows):
+            rows = group[start:start + chunk_rows]
+            yield rows, as_of[rows[0]]
+
+def score_matchups_file(input_path, output_path, workers=None, model_path=None, chunk_rows=CHUNK_ROWS):
+    """Score every matchup in a file across `workers` processes and write them with their predictions"""
+    df = read_matchups(input_path)
+    workers = workers or os.cpu_count()
+    fighter1 = df['fighter1'].fillna('').astype(str).to_numpy()
+    fighter2 = df['fighter2'].fillna('').astype(str).to_numpy()
+    chunks = list(_chunks(df, chunk_rows))
+    args = ([fighter1[rows] for rows, _ in chunks], [fighter2[rows] for rows, _ in chunks],
+            [as_of for _, as_of in chunks])
+
+    start = time.perf_counter()
+    if workers == 1:
+        _init_worker(model_path)
+        results = list(map(_score_chunk, *args))
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+            results = list(pool.map(_score_chunk, *args))
+    elapsed = time.perf_counter() - start
+
+    probs = np.empty(len(df), dtype=np.float32)
+    errors = np.empty(len(df), dtype=object)
+    for (rows, _), (chunk_probs, chunk_errors) in zip(chunks, results):
+        probs[rows], errors[rows] = chunk_probs, chunk_errors
+    predicted = ~np.isnan(probs)
+    df = df.drop(columns=[col for col in OUTPUT_COLUMNS if col in df.columns])
+    df['fighter1_win_probability'] = probs
+    df['fighter2_win_probability'] = np.where(predicted, 1 - probs, np.nan).astype(np.float32)
+    df['predicted_winner'] = np.where(predicted, np.where(probs > 0.5, fighter1, fighter2), None)
+    df['error'] = errors
+    write_predictions(df, output_path)
+    return len(df), int((~predicted).sum()), elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a file of matchups (fighter1, fighter2, optional as_of) in bulk")
+    parser.add_argument('input', help="CSV or Parquet file of matchups")
+    parser.add_argument('output', help="CSV or Parquet file to write the predictions to")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--model', default=None, help="model file (default: the serving bundle when current, else ufc_model_final.pkl)")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help=f"rows per model call (default {CHUNK_ROWS})")
+    args = parser.parse_args()
+    n_rows, n_errors, elapsed = score_matchups_file(args.input, args.output, args.workers, args.model, args.chunk_rows)
+    print(f"Scored {n_rows} matchups ({n_errors} could not be predicted) in {elapsed:.2f}s "
+          f"({n_rows / elapsed:,.0f} rows/s) -> {args.output}")
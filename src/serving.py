@@ -0,0 +1,685 @@
+import argparse
+import fcntl
+import hashlib
+import io
+import itertools
+import json
+import math
+import mmap
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+import unicodedata
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+
+# Serving runtime: the fighter name index, fighter snapshots and the model (its XGBoost
+# booster, and a NumPy evaluator for its trees when it supports the model), plus the
+# serving bundle that stores all three in one .npz file. Servers memory-map the bundle
+# read-only, so worker processes share one copy of it. Nothing here imports pandas or
+# the feature pipeline, and xgboost only when the booster has to score, so an API
+# booting from a bundle skips the CSV -> merge -> feature build and those imports.
+#
+# Build the bundle after retraining or adding events: python src/serving.py
+# The API boots from it only when it was built from the current model file and data CSVs.
+
+PROJECT_ROOT = Path(__file__).parent.parent
+DATA_DIR = PROJECT_ROOT / "data"
+MODELS_DIR = PROJECT_ROOT / "models"
+MODEL_PATH = MODELS_DIR / "ufc_model_final.pkl"
+BUNDLE_PATH = MODELS_DIR / "serving_bundle.npz"
+
+# Bump when the bundle layout changes so older bundles are rebuilt
+BUNDLE_VERSION = 5
+
+# Fighters count as active when they have fought within this many days of the newest fight
+ACTIVE_DAYS = 730
+
+# Weight classes, matched in this order against the WEIGHTCLASS of a bout ("UFC Interim
+# Featherweight Title Bout", "Ultimate Fighter 27 Lightweight Tournament Title Bout", ...)
+WEIGHTCLASSES = ["Women's Strawweight", "Women's Flyweight", "Women's Bantamweight", "Women's Featherweight",
+                 'Flyweight', 'Bantamweight', 'Featherweight', 'Lightweight', 'Welterweight',
+                 'Middleweight', 'Light Heavyweight', 'Heavyweight']
+
+_bundle = None
+_snapshot_versions = itertools.count(1)
+
+#Lowercases a name and strips accents ("José Aldo" -> "jose aldo") for matching
+def normalize_name(name: str) -> str:
+    decomposed = unicodedata.normalize('NFKD', name)
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).casefold().split())
+
+# Separates the fighters in a BOUT ("Jon Jones vs. Stipe Miocic")
+BOUT_SEPARATOR = ' vs. '
+
+#Splits a BOUT into its two fighter names, as combine_dataframes does for the fight results
+def split_bout(bout: str):
+    fighters = [name.strip() for name in bout.split(BOUT_SEPARATOR)]
+    if len(fighters) != 2 or not all(fighters):
+        raise ValueError(f"Bout '{bout}' is not in 'Fighter1{BOUT_SEPARATOR}Fighter2' form")
+    return tuple(fighters)
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _sorted_position(sorted_values, value):
+    """Position of `value` in a sorted string array, or -1"""
+    i = int(np.searchsorted(sorted_values, value))
+    return i if i < len(sorted_values) and sorted_values[i] == value else -1
+
+class FighterIndex:
+    """
+    Every fighter name with how long ago they last fought and their weight class, as flat
+    arrays so a bundle can memory-map them: sorted names for exact lookups, sorted
+    normalized name and word keys for prefix search, and trigram postings (sorted keys,
+    offsets, name ids) for substring and typo-tolerant search. Searches rank active
+    fighters first among equally good matches. Also holds every event's card: events
+    sorted by normalized name, with offsets into the fighters of their bouts in card
+    order.
+    """
+
+    # Arrays saved in a bundle; everything else is derived from them
+    ARRAYS = ['names', 'normalized', 'days_since_last_fight', 'weightclass_ids', 'prefix_keys', 'prefix_ids',
+              'trigram_keys', 'trigram_offsets', 'trigram_ids', 'event_keys', 'event_names', 'card_offsets',
+              'card_fighter1', 'card_fighter2']
+
+    def __init__(self, arrays):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.active = self.days_since_last_fight <= ACTIVE_DAYS
+
+    @classmethod
+    def build(cls, names, days_since_last_fight, weightclasses, cards=()):
+        """
+        Index sorted `names`; weightclasses[i] is None when the fighter never fought in a
+        weight class. `cards` holds an (event, fighter1, fighter2) triple per bout, in card order
+        """
+        normalized = [normalize_name(name) for name in names]
+
+        # Prefix keys: the whole name and the name from each later word ("jones" finds "Jon Jones")
+        keys = []
+        for i, name in enumerate(normalized):
+            words = name.split(' ')
+            keys.extend((' '.join(words[k:]), i) for k in range(len(words)))
+        keys.sort()
+
+        # Trigrams of each name, padded so word starts and ends form their own trigrams
+        postings = {}
+        for i, name in enumerate(normalized):
+            for trigram in _trigrams(f' {name} '):
+                postings.setdefault(trigram, []).append(i)
+        trigram_keys = sorted(postings)
+
+        # Bouts grouped by event, events in normalized name order
+        bouts = {}
+        for event, fighter1, fighter2 in cards:
+            bouts.setdefault(event, []).append((fighter1, fighter2))
+        events = sorted(bouts, key=normalize_name)
+        card = [bout for event in events for bout in bouts[event]]
+
+        return cls({
+            'names': np.array(names, dtype=str),
+            'normalized': np.array(normalized, dtype=str),
+            'days_since_last_fight': np.asarray(days_since_last_fight, dtype=np.int32),
+            'weightclass_ids': np.array([WEIGHTCLASSES.index(wc) if wc is not None else -1 for wc in weightclasses],
+                                        dtype=np.int8),
+            'prefix_keys': np.array([key for key, _ in keys], dtype=str),
+            'prefix_ids': np.array([i for _, i in keys], dtype=np.int32),
+            'trigram_keys': np.array(trigram_keys, dtype=str),
+            'trigram_offsets': np.cumsum([0] + [len(postings[t]) for t in trigram_keys]).astype(np.int64),
+            'trigram_ids': np.array([i for t in trigram_keys for i in postings[t]], dtype=np.int32),
+            'event_keys': np.array([normalize_name(event) for event in events], dtype=str),
+            'event_names': np.array(events, dtype=str),
+            'card_offsets': np.cumsum([0] + [len(bouts[event]) for event in events]).astype(np.int64),
+            'card_fighter1': np.array([fighter1 for fighter1, _ in card], dtype=str),
+            'card_fighter2': np.array([fighter2 for _, fighter2 in card], dtype=str),
+        })
+
+    def __contains__(self, fighter_name):
+        return _sorted_position(self.names, fighter_name) >= 0
+
+    def search(self, query: str, limit: int = 10):
+        """Names matching `query`, best first: whole-name prefix, word prefix, then trigram matches"""
+        query = normalize_name(query)
+        if not query or limit <= 0:
+            return []
+        # Best (tier, -similarity) per matching name; lower tiers rank higher
+        matches = {}
+        start, stop = np.searchsorted(self.prefix_keys, [query, query + '\U0010ffff'])
+        for key, i in zip(self.prefix_keys[start:stop].tolist(), self.prefix_ids[start:stop].tolist()):
+            tier = 0 if key == self.normalized[i] else 1
+            matches[i] = min(matches.get(i, (tier, 0.0)), (tier, 0.0))
+
+        # Trigram matches when prefixes do not fill the page: names sharing at least half
+        # of the query's trigrams (substrings score 1.0)
+        query_trigrams = _trigrams(f' {query}')
+        if len(matches) < limit and len(query_trigrams) >= 2:
+            postings = [self.trigram_ids[self.trigram_offsets[k]:self.trigram_offsets[k + 1]]
+                        for k in (_sorted_position(self.trigram_keys, trigram) for trigram in query_trigrams) if k >= 0]
+            if postings:
+                ids, counts = np.unique(np.concatenate(postings), return_counts=True)
+                for i, count in zip(ids.tolist(), counts.tolist()):
+                    similarity = count / len(query_trigrams)
+                    if i not in matches and similarity >= 0.5:
+                        matches[i] = (2, -similarity)
+
+        # Prefix matches before trigram matches: active fighters first among prefix matches,
+        # closest names first among trigram matches (activity only breaking ties)
+        def rank(i):
+            tier, score = matches[i]
+            if tier == 2:
+                return (True, score, not self.active[i], self.names[i])
+            return (False, not self.active[i], tier, self.names[i])
+        ranked = sorted(matches, key=rank)
+        return [str(self.names[i]) for i in ranked[:limit]]
+
+    def weightclass_fighters(self, weightclass: str, active_days: int = ACTIVE_DAYS):
+        """Fighters whose latest weight-class bout was in `weightclass`, fought within `active_days` (any time if None)"""
+        if weightclass not in WEIGHTCLASSES:
+            raise ValueError(f"Weight class '{weightclass}' not found")
+        selected = self.weightclass_ids == WEIGHTCLASSES.index(weightclass)
+        if active_days is not None:
+            selected &= self.days_since_last_fight <= active_days
+        return self.names[selected].tolist()
+
+    def card(self, event: str):
+        """(event name, [(fighter1, fighter2), ...]) of an event's bouts in card order (case- and accent-insensitive)"""
+        i = _sorted_position(self.event_keys, normalize_name(event))
+        if i < 0:
+            raise ValueError(f"Event '{event}' not found")
+        start, stop = self.card_offsets[i], self.card_offsets[i + 1]
+        return str(self.event_names[i]), list(zip(self.card_fighter1[start:stop].tolist(),
+                                                  self.card_fighter2[start:stop].tolist()))
+
+class FighterSnapshots:
+    """
+    Each fighter's features from their latest bout, normalized to the fighter1_ layout,
+    and that bout's fight-level (non-fighter) features, as contiguous float rows
+    (built from the feature table by fighters.build_snapshots, or mapped from a bundle).
+    Every instance gets a new `version`; lookups are a binary search over the sorted
+    names and a row slice.
+    """
+
+    def __init__(self, names, vectors, bout_vectors, fighter_columns, bout_columns, df_features=None):
+        self.df_features = df_features
+        self.version = next(_snapshot_versions)
+        # names[i] is the fighter of row i
+        self.names = np.asarray(names, dtype=str)
+        self._order = np.argsort(self.names, kind='stable')
+        self._sorted_names = self.names[self._order]
+        self.fighter_columns = list(fighter_columns)
+        self.fighter2_columns = [col.replace('fighter1_', 'fighter2_', 1) for col in self.fighter_columns]
+        self.bout_columns = list(bout_columns)
+        self.vectors = np.ascontiguousarray(vectors)
+        self.bout_vectors = np.ascontiguousarray(bout_vectors)
+
+    def __contains__(self, fighter_name):
+        return _sorted_position(self._sorted_names, fighter_name) >= 0
+
+    def digest(self):
+        """SHA-256 of the names and feature rows (the same in every process serving this snapshot)"""
+        # Rows as float32 (as bundles store them), so a bundle and the data it came from agree
+        digest = hashlib.sha256('\n'.join(self.names.tolist()).encode())
+        for array in [self.vectors, self.bout_vectors]:
+            digest.update(np.ascontiguousarray(array, dtype=np.float32).data)
+        digest.update(json.dumps([self.fighter_columns, self.bout_columns]).encode())
+        return digest.hexdigest()
+
+    def position(self, fighter_name):
+        """Row of a fighter; raises ValueError when the fighter is not in the snapshot"""
+        i = _sorted_position(self._sorted_names, fighter_name)
+        if i < 0:
+            raise ValueError(f"Fighter '{fighter_name}' not found")
+        return self._order[i]
+
+    def positions(self, fighter_names):
+        """Rows of several fighters at once"""
+        return np.fromiter((self.position(name) for name in fighter_names), dtype=np.intp, count=len(fighter_names))
+
+    def lookup(self, fighter_names):
+        """Rows of many fighters with one vectorized search, -1 for names not in the snapshot"""
+        names = np.asarray(fighter_names, dtype=str)
+        if len(self._sorted_names) == 0:
+            return np.full(len(names), -1, dtype=np.intp)
+        i = np.minimum(np.searchsorted(self._sorted_names, names), len(self._sorted_names) - 1)
+        return np.where(self._sorted_names[i] == names, self._order[i], -1).astype(np.intp)
+
+    def fighter_vector(self, fighter_name):
+        """Latest per-fighter features, ordered as fighter_columns"""
+        return self.vectors[self.position(fighter_name)]
+
+    def bout_vector(self, fighter_name):
+        """Fight-level features of the fighter's latest bout, ordered as bout_columns"""
+        return self.bout_vectors[self.position(fighter_name)]
+
+# Largest difference in probability between a TreeEnsemble and XGBoost accepted for a
+# bundle to score with it, and how many fights it is checked on
+CHECK_TOLERANCE = 1e-5
+CHECK_ROWS = 4096
+
+class TreeEnsemble:
+    """
+    A binary:logistic XGBoost model as NumPy arrays, scored without importing xgboost.
+
+    Only plain models are supported: a gbtree booster with the binary:logistic objective,
+    one output, numerical splits only, a single base_score, and NaN as the missing value.
+    from_booster raises ValueError for anything else, and the bundle then scores with the
+    booster itself (see BundledModel).
+
+    Each tree is padded to a complete tree of the ensemble's depth (a leaf above the
+    bottom level is copied into every bottom-level leaf below it), so a row descends one
+    level per step with node = 2 * node + 1 + went_right. Splits follow XGBoost: NaN takes
+    the default branch, otherwise x < threshold goes left. Margins are accumulated in
+    float32 in tree order starting from the base margin, as XGBoost's CPU predictor does,
+    so they match it bit for bit; probabilities can differ from its sigmoid by one float32
+    ulp.
+    """
+
+    # Rows descended together; the per-(row, tree) arrays of a block stay in cache
+    BLOCK_ROWS = 2048
+
+    def __init__(self, feature_names, features, thresholds, default_left, leaf_values, base_margin):
+        self.feature_names = list(feature_names)
+        self.features = features          # (n_trees, 2**depth - 1) split feature per node
+        self.thresholds = thresholds      # (n_trees, 2**depth - 1) float32
+        self.default_left = default_left  # (n_trees, 2**depth - 1) bool
+        self.leaf_values = leaf_values    # (n_trees, 2**depth) float32
+        self.base_margin = np.float32(base_margin)
+        self.depth = int(np.log2(leaf_values.shape[1]))
+        self._node_offsets = np.arange(len(features))[None, :] * features.shape[1]
+        self._leaf_offsets = np.arange(len(features))[None, :] * leaf_values.shape[1]
+
+    @classmethod
+    def from_booster(cls, booster, feature_names, iteration_range=(0, 0), missing=np.nan):
+        """Convert a trained binary:logistic Booster (only the trees in iteration_range)"""
+        if not np.isnan(missing):
+            raise ValueError(f"Unsupported missing value {missing}")
+        learner = json.loads(booster.save_raw('json'))['learner']
+        if learner['objective']['name'] != 'binary:logistic':
+            raise ValueError(f"Unsupported objective {learner['objective']['name']}")
+        if learner['gradient_booster']['name'] != 'gbtree':
+            raise ValueError(f"Unsupported booster {learner['gradient_booster']['name']}")
+        params = learner['learner_model_param']
+        if int(params.get('num_class', 0)) > 1 or int(params.get('num_target', 1)) > 1:
+            raise ValueError("Only single-output models are supported")
+        trees = learner['gradient_booster']['model']['trees']
+        if iteration_range[1] > 0:
+            trees = trees[iteration_range[0]:iteration_range[1]]
+        if any(any(tree['split_type']) for tree in trees):
+            raise ValueError("Categorical splits are not supported")
+
+        def node_depth(tree, node=0):
+            if tree['left_children'][node] == -1:
+                return 0
+            return 1 + max(node_depth(tree, tree['left_children'][node]), node_depth(tree, tree['right_children'][node]))
+        depth = max(1, max(node_depth(tree) for tree in trees))
+
+        n_nodes, n_leaves = 2 ** depth - 1, 2 ** depth
+        features = np.zeros((len(trees), n_nodes), dtype=np.int32)
+        thresholds = np.zeros((len(trees), n_nodes), dtype=np.float32)
+        default_left = np.ones((len(trees), n_nodes), dtype=bool)
+        leaf_values = np.zeros((len(trees), n_leaves), dtype=np.float32)
+        for t, tree in enumerate(trees):
+            # (node in the tree, position in the complete tree, level)
+            stack = [(0, 0, 0)]
+            while stack:
+                node, position, level = stack.pop()
+                left = tree['left_children'][node]
+                if left == -1:
+                    # Leaf: fill every bottom-level leaf under this position
+                    first = position
+                    for _ in range(depth - level):
+                        first = 2 * first + 1
+                    first -= n_nodes
+                    leaf_values[t, first:first + 2 ** (depth - level)] = tree['split_conditions'][node]
+                    continue
+                features[t, position] = tree['split_indices'][node]
+                thresholds[t, position] = tree['split_conditions'][node]
+                default_left[t, position] = bool(tree['default_left'][node])
+                stack.append((left, 2 * position + 1, level + 1))
+                stack.append((tree['right_children'][node], 2 * position + 2, level + 1))
+
+        # XGBoost's logistic ProbToMargin in float32: -log(1 / base_score - 1)
+        base_scores = params['base_score'].strip('[]').split(',')
+        if len(base_scores) != 1:
+            raise ValueError(f"Unsupported base_score {params['base_score']}")
+        base_score = np.float32(float(base_scores[0]))
+        base_margin = np.float32(-np.log(float(np.float32(1) / base_score - np.float32(1))))
+        return cls(feature_names, features, thresholds, default_left, leaf_values, base_margin)
+
+    def predict_margin(self, rows):
+        rows = np.asarray(rows, dtype=np.float32)
+        if len(rows) > self.BLOCK_ROWS:
+            return np.concatenate([self._block_margin(rows[i:i + self.BLOCK_ROWS])
+                                   for i in range(0, len(rows), self.BLOCK_ROWS)])
+        return self._block_margin(rows)
+
+    def _block_margin(self, rows):
+        node = np.zeros((len(rows), len(self.features)), dtype=np.intp)
+        for _ in range(self.depth):
+            flat = self._node_offsets + node
+            x = np.take_along_axis(rows, self.features.ravel()[flat], axis=1)
+            went_right = np.where(np.isnan(x), ~self.default_left.ravel()[flat], ~(x < self.thresholds.ravel()[flat]))
+            node = 2 * node + 1 + went_right
+        leaves = self.leaf_values.ravel()[self._leaf_offsets + node - self.features.shape[1]]
+        # Sequential float32 sum in tree order (cumsum accumulates left to right)
+        start = np.full((len(rows), 1), self.base_margin, dtype=np.float32)
+        return np.cumsum(np.concatenate([start, leaves], axis=1), axis=1, dtype=np.float32)[:, -1]
+
+    def predict_proba(self, rows):
+        """Probability of the positive class (fighter1 wins) for each row"""
+        margin = self.predict_margin(rows)
+        exp = np.exp(np.minimum(-margin, np.float32(88.7)).astype(np.float64)).astype(np.float32)
+        return np.float32(1) / (exp + np.float32(1))
+
+    def check(self, booster, rows, iteration_range=(0, 0), tolerance=CHECK_TOLERANCE):
+        """
+        Raise ValueError unless the probabilities for `rows` match the booster's own
+        in-place prediction within `tolerance`, so a model the conversion gets wrong
+        (a split type or parameter it does not know) is never served
+        """
+        rows = np.asarray(rows, dtype=np.float32)
+        expected = booster.inplace_predict(rows, iteration_range=iteration_range)
+        difference = np.abs(self.predict_proba(rows).astype(np.float64) - expected)
+        if not difference.max(initial=0.0) <= tolerance:
+            raise ValueError(f"Tree ensemble disagrees with XGBoost on {int((~(difference <= tolerance)).sum())} "
+                             f"of {len(rows)} rows (max difference {np.nanmax(difference):.3g})")
+
+class BundledModel:
+    """
+    The model a serving bundle scores with: its trees as a TreeEnsemble when they support
+    the model (see TreeEnsemble), else the XGBoost booster, loaded from its saved bytes
+    (importing xgboost) the first time it scores.
+    """
+
+    def __init__(self, feature_names, booster_raw, iteration_range=(0, 0), trees=None, missing=np.nan,
+                 source=None, digest=None, history_version=None):
+        self.feature_names = list(feature_names)
+        # The booster as Booster.save_raw('ubj') bytes
+        self.booster_raw = np.frombuffer(booster_raw, dtype=np.uint8)
+        self.iteration_range = tuple(iteration_range)
+        self.trees = trees
+        self.missing = missing
+        self.source = source
+        # SHA-256 of the model file the booster came from
+        self.digest = digest
+        # Per-fighter history version of the features it was trained on (see features/timeline.py)
+        self.history_version = history_version
+        self._booster = None
+        self._booster_params = {}
+        self._lock = threading.Lock()
+
+    @property
+    def booster(self):
+        if self._booster is None:
+            with self._lock:
+                if self._booster is None:
+                    import xgboost as xgb
+                    booster = xgb.Booster(self._booster_params)
+                    booster.load_model(bytearray(self.booster_raw))
+                    self._booster = booster
+        return self._booster
+
+    def set_booster_params(self, params):
+        """Booster parameters (e.g. nthread), applied now or when the booster is loaded"""
+        with self._lock:
+            self._booster_params.update(params)
+            if self._booster is not None:
+                self._booster.set_param(params)
+
+    def predict_proba(self, rows):
+        """Probability of the positive class (fighter1 wins) for each row"""
+        if self.trees is not None:
+            return self.trees.predict_proba(rows)
+        return self.booster.inplace_predict(np.asarray(rows, dtype=np.float32), iteration_range=self.iteration_range,
+                                            missing=self.missing)
+
+class ServingBundle:
+    """Everything the API needs to serve predictions, loaded from a bundle file."""
+
+    def __init__(self, meta, index, snapshots, model):
+        self.meta = meta
+        self.index = index
+        self.snapshots = snapshots
+        self.model = model
+
+#Gets the SHA-256 of a file
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+#Gets a hash of every data CSV (None when there is no data directory)
+def data_fingerprint(data_dir=None):
+    data_dir = DATA_DIR if data_dir is None else Path(data_dir)
+    if not data_dir.is_dir():
+        return None
+    digest = hashlib.sha256()
+    for path in sorted(data_dir.glob('*.csv')):
+        digest.update(f'{path.name}:{file_digest(path)}'.encode())
+    return digest.hexdigest()
+
+#Writes a serving bundle (a single uncompressed .npz, so servers can memory-map it)
+def save_bundle(path, index, snapshots, model, meta):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    meta = dict(meta, bundle_version=BUNDLE_VERSION, feature_names=model.feature_names,
+                history_version=model.history_version, iteration_range=list(model.iteration_range),
+                missing=float(model.missing), tree_evaluator=model.trees is not None,
+                fighter_columns=snapshots.fighter_columns, bout_columns=snapshots.bout_columns)
+    arrays = {f'index_{name}': getattr(index, name) for name in FighterIndex.ARRAYS}
+    if model.trees is not None:
+        arrays.update(tree_features=model.trees.features,
+                      tree_thresholds=model.trees.thresholds,
+                      tree_default_left=model.trees.default_left,
+                      tree_leaf_values=model.trees.leaf_values,
+                      tree_base_margin=np.array(model.trees.base_margin, dtype=np.float32))
+    # Write to a temp file and rename so a booting server never reads a partial bundle
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        save_npz(f,
+                 meta=np.array(json.dumps(meta)),
+                 **arrays,
+                 snapshot_names=snapshots.names,
+                 snapshot_vectors=snapshots.vectors.astype(np.float32),
+                 snapshot_bout_vectors=snapshots.bout_vectors.astype(np.float32),
+                 booster=model.booster_raw)
+    tmp_path.replace(path)
+    return path
+
+# Zip extra-field id used to pad member data to an alignment (as Android's zipalign does)
+_PADDING_EXTRA_ID = 0xD935
+NPZ_ALIGNMENT = 64
+
+#Writes arrays as an uncompressed .npz (readable by np.load) whose array data starts on
+#NPZ_ALIGNMENT-byte boundaries, so mapped arrays are aligned; numpy's slow unaligned
+#paths make lookups in unaligned string arrays several times slower
+def save_npz(f, **arrays):
+    with zipfile.ZipFile(f, 'w', zipfile.ZIP_STORED) as archive:
+        for name, array in arrays.items():
+            member = io.BytesIO()
+            np.lib.format.write_array(member, np.asarray(array), allow_pickle=False)
+            data = member.getvalue()
+            header_length = data.index(b'\n') + 1  # .npy headers end with a newline
+            info = zipfile.ZipInfo(f'{name}.npy', date_time=(1980, 1, 1, 0, 0, 0))
+            # Local header (30 bytes + name + extra field) then the .npy header precede the data
+            unpadded = archive.fp.tell() + 30 + len(info.filename) + header_length
+            padding = -unpadded % NPZ_ALIGNMENT
+            if padding:
+                padding += NPZ_ALIGNMENT if padding < 4 else 0  # an extra-field entry takes at least 4 bytes
+                info.extra = struct.pack('<HH', _PADDING_EXTRA_ID, padding - 4) + bytes(padding - 4)
+            archive.writestr(info, data)
+
+#Maps the arrays of an uncompressed .npz read-only. They are views of one shared memory
+#map, so every process serving the same bundle file shares its pages through the OS
+def map_npz(path):
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        arrays = {}
+        with zipfile.ZipFile(f) as archive:
+            for info in archive.infolist():
+                if info.compress_type != zipfile.ZIP_STORED:
+                    raise ValueError(f"{path} is compressed and cannot be memory-mapped")
+                # Member data follows its local header: 30 bytes, the name and an extra field
+                name_length, extra_length = struct.unpack_from('<HH', buffer, info.header_offset + 26)
+                f.seek(info.header_offset + 30 + name_length + extra_length)
+                version = np.lib.format.read_magic(f)
+                read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+                shape, fortran_order, dtype = read_header(f)
+                array = np.frombuffer(buffer, dtype, count=math.prod(shape), offset=f.tell())
+                arrays[info.filename.removesuffix('.npy')] = array.reshape(shape, order='F' if fortran_order else 'C')
+    return arrays
+
+#Reads a serving bundle (memory-mapped). With `check`, returns None when the bundle is
+#missing or was built from another model file or other data
+def read_bundle(path=None, check=True):
+    path = BUNDLE_PATH if path is None else Path(path)
+    if not path.exists():
+        return None
+    arrays = map_npz(path)
+    meta = json.loads(str(arrays['meta']))
+    if check and not _bundle_is_current(meta):
+        return None
+    index = FighterIndex({name: arrays[f'index_{name}'] for name in FighterIndex.ARRAYS})
+    snapshots = FighterSnapshots(arrays['snapshot_names'], arrays['snapshot_vectors'], arrays['snapshot_bout_vectors'],
+                                 meta['fighter_columns'], meta['bout_columns'])
+    trees = None
+    if meta['tree_evaluator']:
+        trees = TreeEnsemble(meta['feature_names'], arrays['tree_features'], arrays['tree_thresholds'],
+                             arrays['tree_default_left'], arrays['tree_leaf_values'], arrays['tree_base_margin'])
+    model = BundledModel(meta['feature_names'], arrays['booster'], meta['iteration_range'], trees, meta['missing'],
+                         ('bundle', meta['model_sha256']), meta['model_sha256'], meta['history_version'])
+    return ServingBundle(meta, index, snapshots, model)
+
+#Reads a serving bundle and makes it the one the API serves from (see read_bundle)
+def load_bundle(path=None, check=True):
+    bundle = read_bundle(path, check)
+    if bundle is not None:
+        set_bundle(bundle)
+    return bundle
+
+def _bundle_is_current(meta):
+    if meta.get('bundle_version') != BUNDLE_VERSION:
+        print(f"Serving bundle has version {meta.get('bundle_version')}, expected {BUNDLE_VERSION}; rebuild it")
+        return False
+    if MODEL_PATH.exists() and file_digest(MODEL_PATH) != meta['model_sha256']:
+        print("Serving bundle was built from another model file; rebuild it")
+        return False
+    fingerprint = data_fingerprint()
+    if fingerprint is not None and fingerprint != meta['data_fingerprint']:
+        print("Serving bundle was built from other data; rebuild it")
+        return False
+    return True
+
+#Gets the path a new bundle is built at before it is validated and published
+def candidate_bundle_path():
+    return BUNDLE_PATH.with_name(BUNDLE_PATH.stem + '.candidate' + BUNDLE_PATH.suffix)
+
+# CPU priority of bundle builds started by a server (higher is lower priority), so request
+# handling keeps the CPU while the pipeline runs. The build lowers its own priority: the
+# server is multi-threaded, so nothing may run in the child between fork and exec
+BUILD_NICENESS = 5
+
+#Builds a serving bundle at `path` in a separate Python process (python src/serving.py
+#--output), so the caller never runs the pandas pipeline or holds its memory
+def build_bundle_subprocess(path, timeout=None):
+    result = subprocess.run([sys.executable, str(Path(__file__)), '--output', str(path)],
+                            capture_output=True, text=True, timeout=timeout)
+    if result.returncode != 0:
+        lines = (result.stderr or result.stdout).strip().splitlines()
+        raise RuntimeError(f"Building the serving bundle failed: {lines[-1] if lines else f'exit code {result.returncode}'}")
+    return Path(path)
+
+#Makes a bundle file the serving bundle; the rename is atomic, so readers see either the
+#old bundle or the new one
+def publish_bundle_file(path):
+    Path(path).replace(BUNDLE_PATH)
+
+#Holds an exclusive lock across processes while building the bundle, so several workers
+#refreshing at once build it only once
+@contextmanager
+def bundle_build_lock():
+    BUNDLE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(BUNDLE_PATH.with_name(BUNDLE_PATH.name + '.lock'), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+#Gets the serving bundle loaded by load_bundle (None when serving from the data)
+def get_bundle():
+    return _bundle
+
+#Sets the serving bundle (None to serve from the data)
+def set_bundle(bundle):
+    global _bundle
+    _bundle = bundle
+
+#Gets (mtime, size) of the bundle, the model file and every data CSV, which changes when
+#any of them is rewritten (cheap enough to poll)
+def watched_files_signature():
+    paths = [BUNDLE_PATH, MODEL_PATH] + (sorted(DATA_DIR.glob('*.csv')) if DATA_DIR.is_dir() else [])
+    signature = []
+    for path in paths:
+        try:
+            stat = path.stat()
+            signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append((str(path), None, None))
+    return tuple(signature)
+
+#Gets model input rows to check a TreeEnsemble on: random pairs of fighters, and the
+#same fights with a tenth of the values missing so default branches are taken too
+def check_rows(plan, n_rows=CHECK_ROWS, seed=0):
+    rng = np.random.default_rng(seed)
+    n_fighters = len(plan.snapshots.names)
+    rows = plan.position_rows(rng.integers(n_fighters, size=n_rows // 2), rng.integers(n_fighters, size=n_rows // 2))
+    missing = rows.copy()
+    missing[rng.random(missing.shape) < 0.1] = np.nan
+    return np.concatenate([rows, missing])
+
+#Builds the serving bundle from the data and the deployed model
+def build_bundle(path=None):
+    # The build runs the full pipeline, so it imports it here rather than at module level
+    from fighters import _get_fighter_index
+    from predict import _get_model, _get_scoring_plan, _get_model_feature_names
+
+    model = _get_model(str(MODEL_PATH))
+    plan = _get_scoring_plan(model)
+    feature_names = _get_model_feature_names(model)
+    # Score with the NumPy trees only when they support the model and agree with XGBoost
+    try:
+        trees = TreeEnsemble.from_booster(plan.booster, feature_names, plan.iteration_range, plan.missing)
+        trees.check(plan.booster, check_rows(plan), plan.iteration_range)
+    except ValueError as e:
+        print(f"Serving bundle will score with XGBoost: {e}")
+        trees = None
+    bundled = BundledModel(feature_names, plan.booster.save_raw('ubj'), plan.iteration_range, trees, plan.missing,
+                           digest=file_digest(MODEL_PATH), history_version=model.history_version)
+    meta = {
+        'model_file': MODEL_PATH.name,
+        'model_sha256': file_digest(MODEL_PATH),
+        'data_fingerprint': data_fingerprint(),
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    return save_bundle(BUNDLE_PATH if path is None else path, _get_fighter_index(), plan.snapshots, bundled, meta)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the serving bundle the API boots from")
+    parser.add_argument('--output', default=None, help=f"bundle path (default {BUNDLE_PATH})")
+    args = parser.parse_args()
+    if args.output is not None:
+        # Builds to a given path are the ones servers start (see build_bundle_subprocess)
+        os.nice(BUILD_NICENESS)
+    start = time.perf_counter()
+    path = build_bundle(args.output)
+    print(f"Wrote {path} ({path.stat().st_size / 1e6:.1f} MB) in {time.perf_counter() - start:.1f}s")
@@ -5,6 +5,7 @@ from model import UFCXGBoostModel
 from listOfFeatures import FEATURES
 from collections import Counter
 from tuning import SCALE_POS_WEIGHT
+from features import HISTORY_VERSION
 
 
 print(len(FEATURES))
@@ -79,6 +80,7 @@ X_test_filtered = X_test[important_features]
 
 # Retrain with filtered features
 model_filtered = UFCXGBoostModel(scale_pos_weight=scale_pos_weight)
+model_filtered.history_version = HISTORY_VERSION  # split_data builds the latest features
 model_filtered.fit(X_train_filtered, y_train, X_val=X_val_filtered, y_val=y_val)
 
 # Evaluate filtered model
@@ -1,6 +1,6 @@
 from pathlib import Path
 import pandas as pd
-from features import create_features
+from features import create_features, HISTORY_VERSION
 from model import UFCXGBoostModel
 from tuning import SCALE_POS_WEIGHT
 
@@ -10,7 +10,7 @@ MODELS_DIR = PROJECT_ROOT / "models"
 
 # Load all data
 print("Loading and creating features...")
-df = create_features()
+df = create_features(history_version=HISTORY_VERSION)
 
 # Remove rows with NaN target (draws)
 df = df[df['target'].notna()].copy()
@@ -57,6 +57,7 @@ X_filtered = X[important_features]
 # Retrain on ALL data with filtered features (no validation set)
 print("Retraining final model on all data with filtered features...")
 model_final = UFCXGBoostModel(scale_pos_weight=SCALE_POS_WEIGHT)
+model_final.history_version = HISTORY_VERSION  # Serving builds its features the same way
 model_final.fit(X_filtered, y)  # Training on all data
 
 # Save the filtered final model
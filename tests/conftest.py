@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules under src/ import each other by top-level name, as when run from src/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import pytest
+from backend.batching import PredictionBatcher
+
+
+def _predict_many(pairs):
+    return [{'fighter1': f1, 'fighter2': f2, 'probability': 0.5} for f1, f2 in pairs]
+
+
+def test_batches_concurrent_predictions():
+    calls = []
+    def predict_many(pairs):
+        calls.append(len(pairs))
+        return _predict_many(pairs)
+
+    async def run():
+        batcher = PredictionBatcher(predict_many, window_ms=50, max_batch_size=3)
+        results = await asyncio.gather(*[batcher.predict(f'a{i}', f'b{i}') for i in range(5)])
+        assert not batcher._tasks
+        return results
+    results = asyncio.run(run())
+    assert [result['fighter1'] for result in results] == [f'a{i}' for i in range(5)]
+    assert calls == [3, 2]
+
+
+def test_close_scores_pending_predictions():
+    async def run():
+        batcher = PredictionBatcher(_predict_many, window_ms=10000)
+        prediction = asyncio.ensure_future(batcher.predict('a', 'b'))
+        await asyncio.sleep(0)
+        await batcher.close()
+        assert not batcher._tasks
+        return await prediction
+    assert asyncio.run(run())['fighter2'] == 'b'
+
+
+def test_close_cancels_stuck_batches():
+    release = threading.Event()
+    def predict_many(pairs):
+        release.wait(5)
+        return _predict_many(pairs)
+
+    async def run():
+        batcher = PredictionBatcher(predict_many, window_ms=0, max_batch_size=1)
+        prediction = asyncio.ensure_future(batcher.predict('a', 'b'))
+        await asyncio.sleep(0)
+        try:
+            await batcher.close(timeout=0.05)
+        finally:
+            release.set()
+        assert not batcher._tasks
+        with pytest.raises(asyncio.CancelledError):
+            await prediction
+    asyncio.run(run())
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from features.timeline import FighterTimeline
+from preprocessor import fill_nan_values
+
+
+def _fights():
+    return pd.DataFrame({
+        'WEIGHTCLASS': ['Lightweight', 'Lightweight', 'Heavyweight', 'Heavyweight'],
+        **{f'fighter{k}_{attr}': [70.0, np.nan, 76.0, 78.0] for k in [1, 2] for attr in ['height', 'weight', 'reach']},
+        **{f'fighter{k}_stance': ['Orthodox', 'Orthodox', None, 'Southpaw'] for k in [1, 2]},
+    })
+
+
+def test_fill_nan_values_records_constants():
+    fill_values = {}
+    df = fill_nan_values(_fights(), fill_values)
+    assert df['fighter1_height'].tolist() == [70.0, 70.0, 76.0, 78.0]
+    assert fill_values['fighter1_height_by_weightclass'] == {'Heavyweight': 77.0, 'Lightweight': 70.0}
+    assert df['fighter1_stance'].tolist() == ['Orthodox', 'Orthodox', 'Southpaw', 'Southpaw']
+
+
+def test_fill_nan_values_uses_given_constants():
+    # A new fight in a weight class whose stored rows have other stats
+    fill_values = {}
+    fill_nan_values(_fights(), fill_values)
+    new = pd.DataFrame({
+        'WEIGHTCLASS': ['Lightweight', 'Flyweight'],
+        **{f'fighter{k}_{attr}': [np.nan, np.nan] for k in [1, 2] for attr in ['height', 'weight', 'reach']},
+        **{f'fighter{k}_stance': [None, None] for k in [1, 2]},
+    })
+    df = fill_nan_values(new, dict(fill_values))
+    # Unknown weight classes fall back to the overall constants
+    assert df['fighter1_reach'].tolist() == [70.0, fill_values['fighter1_reach']]
+    assert df['fighter2_stance'].tolist() == ['Orthodox', fill_values['fighter2_stance']]
+
+
+def test_timeline_fill_value():
+    fights = pd.DataFrame({'fighter1_name': ['A'], 'fighter2_name': ['B']})
+    timeline = FighterTimeline(fights)
+    assert timeline.fill_value('x', lambda: 3) == 3.0
+    assert timeline.fill_value('x', lambda: 4) == 3.0
+    pinned = FighterTimeline(fights, fill_values={'x': 5.0})
+    assert pinned.fill_value('x', lambda: 3) == 5.0
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+from features.timeline import FighterTimeline, HISTORY_VERSION, LEGACY_HISTORY_VERSION
+from model import UFCXGBoostModel, UNRECORDED_HISTORY_VERSION
+
+
+@pytest.fixture
+def fights():
+    # A fights from corner 1, then corner 2, then corner 1 again
+    return pd.DataFrame({
+        'fighter1_name': ['A', 'C', 'A'],
+        'fighter2_name': ['B', 'A', 'D'],
+        'fighter1_x': [1.0, 2.0, 3.0],
+        'fighter2_x': [10.0, 20.0, 30.0],
+    })
+
+
+def test_history_spans_both_corners(fights):
+    timeline = FighterTimeline(fights)
+    lagged = timeline.scatter(timeline.lag(timeline.gather(fights, ['x'])))
+    np.testing.assert_array_equal(lagged['fighter2_x'][1], 1.0)
+    np.testing.assert_array_equal(lagged['fighter1_x'][2], 20.0)
+
+
+def test_legacy_history_is_per_corner(fights):
+    timeline = FighterTimeline(fights, LEGACY_HISTORY_VERSION)
+    lagged = timeline.scatter(timeline.lag(timeline.gather(fights, ['x'])))
+    assert np.isnan(lagged['fighter2_x'][1])
+    np.testing.assert_array_equal(lagged['fighter1_x'][2], 1.0)
+
+
+def test_unknown_history_version(fights):
+    with pytest.raises(ValueError):
+        FighterTimeline(fights, HISTORY_VERSION + 1)
+
+
+def test_model_records_history_version(tmp_path):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(100, 3)), columns=['a', 'b', 'c'])
+    y = (X['a'] > 0).astype(int)
+
+    def saved(history_version):
+        model = UFCXGBoostModel()
+        model.history_version = history_version
+        model.fit(X, y)
+        path = tmp_path / f'model_{history_version}.pkl'
+        model.save(path)
+        loaded = UFCXGBoostModel()
+        loaded.load(path)
+        return loaded
+
+    assert saved(HISTORY_VERSION).history_version == HISTORY_VERSION
+    assert saved(None).history_version == UNRECORDED_HISTORY_VERSION
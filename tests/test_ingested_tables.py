@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+import fighters
+import ingest
+import preprocessor
+from features import HISTORY_VERSION, LEGACY_HISTORY_VERSION
+
+
+@pytest.fixture
+def tables(tmp_path, monkeypatch):
+    # Tables stored for the version 1 model, current with the CSVs
+    monkeypatch.setattr(ingest, 'TABLES_DIR', tmp_path / 'tables')
+    monkeypatch.setattr(ingest, 'MANIFEST_PATH', tmp_path / 'tables' / 'manifest.json')
+    monkeypatch.setattr(ingest, 'preprocessed_cache_key', lambda: 'key')
+    df_preprocessed = pd.DataFrame({'EVENT': ['UFC 1'], 'fighter1_name': ['A'], 'fighter2_name': ['B']})
+    df_features = pd.DataFrame({'EVENT': ['UFC 1'], 'BOUT': ['A vs. B'], 'fighter1_total_fights': [1]})
+    ingest._write_tables(df_preprocessed, df_features, ['UFC 1'], 'key', LEGACY_HISTORY_VERSION,
+                         {'preprocessed': {}, 'features': {}})
+
+    # Nothing may be rebuilt from the CSVs
+    def rebuild(*args, **kwargs):
+        raise AssertionError("rebuilt from the CSVs")
+    monkeypatch.setattr(preprocessor, 'preprocess_data', rebuild)
+    monkeypatch.setattr('features.create_features', rebuild)
+    return df_preprocessed, df_features
+
+
+def test_serving_loads_both_tables_for_a_version_1_model(tables):
+    df_preprocessed, df_features = tables
+    pd.testing.assert_frame_equal(fighters._load_preprocessed_data(), df_preprocessed)
+    loaded, complete = fighters._load_features_data(history_version=LEGACY_HISTORY_VERSION)
+    pd.testing.assert_frame_equal(loaded, df_features)
+    assert complete
+
+
+def test_features_of_another_version_are_not_served(tables):
+    assert ingest.load_ingested_table('preprocessed', HISTORY_VERSION) is not None
+    assert ingest.load_ingested_table('features', HISTORY_VERSION) is None
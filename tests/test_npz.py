@@ -0,0 +1,85 @@
+import json
+import numpy as np
+import pytest
+from serving import (FighterIndex, FighterSnapshots, TreeEnsemble, BundledModel, NPZ_ALIGNMENT, map_npz, read_bundle,
+                     save_bundle, save_npz)
+
+
+def _arrays():
+    rng = np.random.default_rng(0)
+    return {
+        'meta': np.array(json.dumps({'model': 'm.pkl', 'columns': ['a', 'b']})),
+        'floats': rng.normal(size=(37, 5)).astype(np.float32),
+        'doubles': rng.normal(size=11),
+        'ints': np.arange(-5, 8, dtype=np.int32),
+        'int8': np.array([-1, 0, 7], dtype=np.int8),
+        'flags': rng.random((3, 4)) < 0.5,
+        'names': np.array(['Jon Jones', 'José Aldo', 'B', ''], dtype=str),
+        'fortran': np.asfortranarray(rng.normal(size=(4, 3))),
+        'empty': np.zeros((0, 4), dtype=np.float32),
+        'scalar': np.array(np.float32(0.25)),
+    }
+
+
+@pytest.fixture
+def npz_path(tmp_path):
+    path = tmp_path / 'arrays.npz'
+    with open(path, 'wb') as f:
+        save_npz(f, **_arrays())
+    return path
+
+
+def test_map_npz_round_trip(npz_path):
+    mapped = map_npz(npz_path)
+    expected = _arrays()
+    assert list(mapped) == list(expected)
+    for name, array in expected.items():
+        assert mapped[name].dtype == array.dtype, name
+        np.testing.assert_array_equal(mapped[name], array)
+    assert json.loads(str(mapped['meta'])) == {'model': 'm.pkl', 'columns': ['a', 'b']}
+
+
+def test_mapped_arrays_are_aligned_and_read_only(npz_path):
+    for name, array in map_npz(npz_path).items():
+        if array.size:
+            assert array.ctypes.data % NPZ_ALIGNMENT == 0, name
+        assert not array.flags.writeable, name
+
+
+def test_readable_by_numpy(npz_path):
+    expected = _arrays()
+    with np.load(npz_path) as loaded:
+        for name, array in expected.items():
+            np.testing.assert_array_equal(loaded[name], array)
+
+
+def test_rejects_compressed(tmp_path):
+    path = tmp_path / 'compressed.npz'
+    np.savez_compressed(path, values=np.arange(10))
+    with pytest.raises(ValueError, match="compressed"):
+        map_npz(path)
+
+
+def test_bundle_round_trip(tmp_path):
+    names = ['Anna Smith', 'Jon Jones', 'Zed Zulu']
+    index = FighterIndex.build(names, [10, 400, 30], ['Lightweight', None, 'Heavyweight'],
+                               [('UFC 1', 'Jon Jones', 'Zed Zulu')])
+    rng = np.random.default_rng(1)
+    snapshots = FighterSnapshots(names, rng.normal(size=(3, 2)), rng.normal(size=(3, 1)),
+                                 ['fighter1_a', 'fighter1_b'], ['c'])
+    trees = TreeEnsemble(['fighter1_a', 'fighter2_a'], np.array([[0, 1, 1]], dtype=np.int32),
+                         np.array([[0.5, -1.0, 2.0]], dtype=np.float32), np.ones((1, 3), dtype=bool),
+                         np.array([[0.1, -0.2, 0.3, -0.4]], dtype=np.float32), 0.0)
+    model = BundledModel(trees.feature_names, b'booster', trees=trees, history_version=2)
+    path = save_bundle(tmp_path / 'bundle.npz', index, snapshots, model, {'model_sha256': 'abc'})
+
+    bundle = read_bundle(path, check=False)
+    assert bundle.meta['model_sha256'] == 'abc'
+    assert bundle.model.history_version == 2
+    assert bytes(bundle.model.booster_raw) == b'booster'
+    for name in FighterIndex.ARRAYS:
+        np.testing.assert_array_equal(getattr(bundle.index, name), getattr(index, name))
+    assert bundle.index.card('UFC 1') == index.card('UFC 1')
+    assert bundle.snapshots.digest() == snapshots.digest()
+    rows = rng.normal(size=(20, 2)).astype(np.float32)
+    np.testing.assert_array_equal(bundle.model.predict_proba(rows), model.predict_proba(rows))
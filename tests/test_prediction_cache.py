@@ -0,0 +1,89 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import predict
+from predict import PredictionCache
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_lru_eviction():
+    cache = PredictionCache(maxsize=2, ttl=None)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' is now the least recently used
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 1)
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(predict.time, 'monotonic', lambda: now[0])
+    cache = PredictionCache(maxsize=10, ttl=5)
+    cache.put('a', 1)
+    now[0] += 5
+    assert cache.get('a') == 1
+    now[0] += 0.5
+    assert cache.get('a') is None
+    # An expired entry is computed again
+    assert cache.get_or_compute('a', lambda: 2) == 2
+    assert cache.get('a') == 2
+
+
+def test_get_or_compute_caches():
+    cache = PredictionCache(maxsize=10, ttl=None)
+    calls = []
+    compute = lambda: calls.append(1) or 0.7
+    assert cache.get_or_compute('a', compute) == 0.7
+    assert cache.get_or_compute('a', compute) == 0.7
+    assert len(calls) == 1
+
+
+def _concurrent_misses(cache, compute, n_followers=4):
+    # Start one caller that blocks in compute, then followers on the same key
+    with ThreadPoolExecutor(n_followers + 1) as pool:
+        leader = pool.submit(cache.get_or_compute, 'a', compute)
+        _wait_for(lambda: 'a' in cache._inflight)
+        followers = [pool.submit(cache.get_or_compute, 'a', compute) for _ in range(n_followers)]
+        _wait_for(lambda: cache.coalesced == n_followers)
+        return leader, followers
+
+
+def test_single_flight():
+    cache = PredictionCache(maxsize=10, ttl=None)
+    release, calls = threading.Event(), []
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 0.25
+    with ThreadPoolExecutor(1) as releaser:
+        releaser.submit(lambda: (_wait_for(lambda: cache.coalesced == 4), release.set()))
+        leader, followers = _concurrent_misses(cache, compute)
+    assert [f.result() for f in [leader] + followers] == [0.25] * 5
+    assert len(calls) == 1
+    assert cache._inflight == {}
+    assert cache.get('a') == 0.25
+
+
+def test_single_flight_error_is_shared_and_not_cached():
+    cache = PredictionCache(maxsize=10, ttl=None)
+    release = threading.Event()
+    def compute():
+        release.wait(5)
+        raise RuntimeError("model failed")
+    with ThreadPoolExecutor(1) as releaser:
+        releaser.submit(lambda: (_wait_for(lambda: cache.coalesced == 4), release.set()))
+        leader, followers = _concurrent_misses(cache, compute)
+    for future in [leader] + followers:
+        with pytest.raises(RuntimeError, match="model failed"):
+            future.result()
+    assert cache._inflight == {}
+    assert cache.get('a') is None
@@ -0,0 +1,71 @@
+import os
+import pandas as pd
+import pytest
+import preprocessor
+from preprocessor import INPUT_FILES, read_cached_frame, write_cached_frame
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    data = tmp_path / "data"
+    data.mkdir()
+    for name in INPUT_FILES:
+        (data / name).write_text("EVENT\nUFC 1\n")
+    monkeypatch.setattr(preprocessor, "DATA_DIR", data)
+    monkeypatch.setattr(preprocessor, "CACHE_DIR", tmp_path / ".cache")
+    return data
+
+
+def test_cache_key_follows_input_content(data_dir):
+    key = preprocessor.preprocessed_cache_key()
+    assert preprocessor.preprocessed_cache_key() == key
+    # Touching a file without changing it keeps the key
+    os.utime(data_dir / INPUT_FILES[0])
+    assert preprocessor.preprocessed_cache_key() == key
+    (data_dir / INPUT_FILES[0]).write_text("EVENT\nUFC 2\n")
+    assert preprocessor.preprocessed_cache_key() != key
+
+
+def test_cache_key_follows_pipeline_version(data_dir, monkeypatch):
+    key = preprocessor.preprocessed_cache_key()
+    monkeypatch.setattr(preprocessor, "PIPELINE_VERSION", preprocessor.PIPELINE_VERSION + 1)
+    assert preprocessor.preprocessed_cache_key() != key
+
+
+def test_cached_frame_round_trip(tmp_path):
+    df = pd.DataFrame({
+        'name': ['a', None, 'c'],
+        'value': [1.5, float('nan'), 3.0],
+        'DATE': pd.to_datetime(['2020-01-01', None, '2021-06-30']),
+    }, index=[5, 2, 9])
+    path = tmp_path / "frame.feather"
+    write_cached_frame(df, path)
+    pd.testing.assert_frame_equal(read_cached_frame(path), df)
+
+
+def test_write_prunes_least_recently_used(tmp_path):
+    df = pd.DataFrame({'x': [1]})
+    paths = [tmp_path / f"stage_{i}.feather" for i in range(4)]
+    for i, path in enumerate(paths[:3]):
+        write_cached_frame(df, path)
+        os.utime(path, (1000 + i, 1000 + i))
+    # The oldest entry was used most recently
+    os.utime(paths[0], (2000, 2000))
+    write_cached_frame(df, paths[3], prefix='stage', keep=3)
+    assert sorted(p.name for p in tmp_path.glob('*.feather')) == ['stage_0.feather', 'stage_2.feather', 'stage_3.feather']
+
+
+def test_preprocess_data_builds_once_per_input(data_dir, monkeypatch):
+    builds = []
+    def build():
+        builds.append(1)
+        return pd.DataFrame({'EVENT': [f'UFC {len(builds)}']})
+    monkeypatch.setattr(preprocessor, "build_preprocessed_data", build)
+
+    first = preprocessor.preprocess_data()
+    pd.testing.assert_frame_equal(preprocessor.preprocess_data(), first)
+    assert len(builds) == 1
+    (data_dir / INPUT_FILES[1]).write_text("EVENT\nUFC 3\n")
+    assert preprocessor.preprocess_data()['EVENT'].tolist() == ['UFC 2']
+    # Only the entry for the current inputs is kept
+    assert len(list((data_dir.parent / ".cache").glob('preprocessed_*.feather'))) == 1
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+from features import rolling
+
+WINDOWS = [1, 3, 5]
+
+
+@pytest.fixture
+def grouped():
+    # Sorted groups of 1-12 rows, three value columns with about 20% missing
+    rng = np.random.default_rng(0)
+    sizes = rng.integers(1, 13, size=60)
+    group = np.repeat(np.arange(len(sizes)), sizes)
+    values = rng.normal(size=(len(group), 3))
+    values[rng.random(values.shape) < 0.2] = np.nan
+    return group, values, rolling.GroupIndex(group)
+
+
+def _expected(group, values, func):
+    # Per-group pandas result for each column, in row order
+    frame = pd.DataFrame(values)
+    return frame.groupby(group).transform(func).to_numpy(dtype='float64')
+
+
+def _windowed(window, min_periods, func):
+    # pandas rejects min_periods > window; no window then has enough values
+    if min_periods > window:
+        return lambda x: pd.Series(np.nan, index=x.index)
+    return lambda x: func(x.shift(1).rolling(window, min_periods=min_periods))
+
+
+def test_group_index(grouped):
+    group, _, index = grouped
+    expected_pos = pd.Series(group).groupby(group).cumcount().to_numpy()
+    np.testing.assert_array_equal(index.pos, expected_pos)
+    np.testing.assert_array_equal(index.start, np.arange(len(group)) - expected_pos)
+
+
+@pytest.mark.parametrize('window', WINDOWS)
+@pytest.mark.parametrize('min_periods', [0, 1, 2])
+def test_lagged_rolling_mean_and_sum(grouped, window, min_periods):
+    group, values, index = grouped
+    np.testing.assert_allclose(
+        rolling.lagged_rolling_mean(values, index, window, min_periods),
+        _expected(group, values, _windowed(window, max(min_periods, 1), lambda r: r.mean())),
+        rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(
+        rolling.lagged_rolling_sum(values, index, window, min_periods),
+        _expected(group, values, _windowed(window, min_periods, lambda r: r.sum())),
+        rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize('window', WINDOWS)
+@pytest.mark.parametrize('min_periods', [2, 3])
+def test_lagged_rolling_std(grouped, window, min_periods):
+    group, values, index = grouped
+    np.testing.assert_allclose(
+        rolling.lagged_rolling_std(values, index, window, min_periods),
+        _expected(group, values, _windowed(window, min_periods, lambda r: r.std())),
+        rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize('min_periods', [1, 3])
+def test_lagged_expanding(grouped, min_periods):
+    group, values, index = grouped
+    np.testing.assert_allclose(
+        rolling.lagged_expanding_mean(values, index, min_periods),
+        _expected(group, values, lambda x: x.shift(1).expanding(min_periods=min_periods).mean()),
+        rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(
+        rolling.lagged_cumsum(values, index),
+        _expected(group, values, lambda x: x.shift(1).fillna(0).cumsum()),
+        rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize('periods', [1, 2])
+def test_lag(grouped, periods):
+    group, values, index = grouped
+    np.testing.assert_array_equal(
+        rolling.take(values[:, 0], rolling.lag_index(index, periods)),
+        pd.Series(values[:, 0]).groupby(group).shift(periods).to_numpy())
+
+
+def test_ffill_and_first(grouped):
+    group, values, index = grouped
+    series = pd.Series(values[:, 0])
+    valid = series.notna().to_numpy()
+    np.testing.assert_array_equal(
+        rolling.take(values[:, 0], rolling.ffill_index(index, valid)),
+        series.groupby(group).ffill().to_numpy())
+    np.testing.assert_array_equal(
+        rolling.take(values[:, 0], rolling.first_valid_index(index, valid)),
+        series.groupby(group).transform('first').to_numpy())
+
+
+def test_take_fills_missing_rows():
+    result = rolling.take(np.array([1, 2, 3]), np.array([2, -1, 0]))
+    np.testing.assert_array_equal(result, [3.0, np.nan, 1.0])
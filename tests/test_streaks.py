@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+from features import rolling
+from features.timeline import FighterTimeline
+
+
+def _run_lengths(mask, group):
+    # Trues so far in each run: a False row starts a new run (and counts 0)
+    mask = pd.Series(mask)
+    breaks = (~mask).groupby(group).cumsum()
+    return mask.astype(int).groupby([group, breaks]).cumsum().to_numpy()
+
+
+@pytest.fixture
+def fights():
+    # Dated fights between 25 fighters; fighter1 won (1), lost (0) or drew/no contest (NaN)
+    rng = np.random.default_rng(1)
+    names = np.array([f'Fighter {i}' for i in range(25)])
+    pairs = np.array([rng.choice(len(names), 2, replace=False) for _ in range(400)])
+    won = rng.choice([1.0, 0.0, np.nan], size=len(pairs), p=[0.45, 0.45, 0.1])
+    return pd.DataFrame({
+        'fighter1_name': names[pairs[:, 0]],
+        'fighter2_name': names[pairs[:, 1]],
+        'fighter1_won': won,
+        'fighter2_won': 1 - won,
+    })
+
+
+def _expected_streaks(fights, value):
+    # Streak of `value` results each fighter carries into each fight, and their longest
+    # before it, by groupby over a long frame of every fighter's fights in fight order
+    long = pd.concat([
+        pd.DataFrame({'row': fights.index, 'corner': k, 'fighter': fights[f'fighter{k}_name'],
+                      'won': fights[f'fighter{k}_won']})
+        for k in [1, 2]
+    ]).sort_values(['fighter', 'row'], kind='stable').reset_index(drop=True)
+    previous = long.groupby('fighter')['won'].shift(1)
+    long['streak'] = _run_lengths((previous == value).to_numpy(), long['fighter'].to_numpy())
+    long['longest'] = long.groupby('fighter')['streak'].cummax()
+    return {
+        (k, col): long[long['corner'] == k].sort_values('row')[col].to_numpy()
+        for k in [1, 2] for col in ['streak', 'longest']
+    }
+
+
+@pytest.mark.parametrize('share', [0.3, 0.7])
+def test_run_lengths(share):
+    rng = np.random.default_rng(2)
+    group = np.repeat(np.arange(50), rng.integers(1, 15, size=50))
+    mask = rng.random(len(group)) < share
+    np.testing.assert_array_equal(rolling.run_lengths(mask, rolling.GroupIndex(group)), _run_lengths(mask, group))
+
+
+def test_grouped_cummax():
+    rng = np.random.default_rng(3)
+    group = np.repeat(np.arange(50), rng.integers(1, 15, size=50))
+    values = rng.integers(0, 8, size=len(group))
+    np.testing.assert_array_equal(rolling.grouped_cummax(values, rolling.GroupIndex(group)),
+                                  pd.Series(values).groupby(group).cummax().to_numpy())
+
+
+@pytest.mark.parametrize('value', [1, 0])
+def test_timeline_streaks(fights, value):
+    timeline = FighterTimeline(fights)
+    results = timeline.gather(fights, ['won'])
+    streaks = timeline.scatter(timeline.streak(results, value))
+    longest = timeline.scatter(timeline.longest_streak(results, value))
+    expected = _expected_streaks(fights, value)
+    for k in [1, 2]:
+        np.testing.assert_array_equal(streaks[f'fighter{k}_won'], expected[(k, 'streak')])
+        np.testing.assert_array_equal(longest[f'fighter{k}_won'], expected[(k, 'longest')])
@@ -0,0 +1,79 @@
+import asyncio
+import json
+from backend.streaming import MAX_LINE_BYTES, stream_predictions
+
+
+def _predict_many(pairs):
+    return [{'fighter1': f1, 'fighter2': f2, 'probability': 0.5} for f1, f2 in pairs]
+
+
+def _stream(body, chunk_size=2, piece=7):
+    # Feed the body in `piece`-byte chunks, so lines arrive split across chunks
+    calls = []
+    def predict_many(pairs):
+        calls.append(len(pairs))
+        return _predict_many(pairs)
+
+    async def chunks():
+        for i in range(0, len(body), piece):
+            yield body[i:i + piece]
+
+    async def collect():
+        return [chunk async for chunk in stream_predictions(chunks(), predict_many, chunk_size)]
+    output = asyncio.run(collect())
+    results = [json.loads(line) for chunk in output for line in chunk.decode().splitlines()]
+    return results, calls
+
+
+def _line(fighter1, fighter2):
+    return json.dumps({'fighter1': fighter1, 'fighter2': fighter2})
+
+
+def test_scores_every_line_in_chunks():
+    body = '\n'.join(_line(f'A{i}', f'B{i}') for i in range(5)).encode()  # no trailing newline
+    results, calls = _stream(body)
+    assert [(r['fighter1'], r['fighter2']) for r in results] == [(f'A{i}', f'B{i}') for i in range(5)]
+    assert calls == [2, 2, 1]
+
+
+def test_blank_lines_are_skipped():
+    body = f'\n{_line("A", "B")}\n   \n\r\n{_line("C", "D")}\n\n{{bad\n'.encode()
+    results, _ = _stream(body)
+    assert [r['fighter1'] for r in results] == ['A', 'C', None]
+    # Blank lines still count toward line numbers
+    assert results[2]['error'].startswith('Line 7:')
+
+
+def test_bad_lines_get_numbered_errors():
+    body = '\n'.join([
+        _line('A', 'B'),
+        '{not json',
+        json.dumps({'fighter1': 'A'}),
+        _line('A', 7),
+        '[1, 2]',
+        '',
+        _line('C', 'D'),
+    ]).encode()
+    results, calls = _stream(body, chunk_size=3)
+    assert results[0]['fighter1'] == 'A' and 'error' not in results[0]
+    assert [r['error'].split(':')[0] for r in results[1:5]] == ['Line 2', 'Line 3', 'Line 4', 'Line 5']
+    assert all(r['fighter1'] is None and r['fighter2'] is None for r in results[1:5])
+    assert results[5]['fighter1'] == 'C'
+    # Invalid and blank lines are never sent to the model
+    assert sum(calls) == 2
+
+
+def test_overlong_line_ends_the_stream():
+    body = (_line('A', 'B') + '\n' + 'x' * (MAX_LINE_BYTES + 10) + '\n' + _line('C', 'D') + '\n').encode()
+    results, _ = _stream(body, chunk_size=10, piece=1024)
+    assert results[0]['fighter1'] == 'A'
+    assert results[-1]['error'].startswith('Line 2:')
+    assert 'C' not in [r['fighter1'] for r in results]
+
+
+def test_lines_before_an_overlong_one_are_scored():
+    # Both lines arrive in one chunk
+    body = (_line('A', 'B') + '\n' + 'x' * (MAX_LINE_BYTES + 10) + '\n').encode()
+    results, _ = _stream(body, chunk_size=10, piece=len(body))
+    assert results[0]['fighter1'] == 'A'
+    assert results[1]['error'].startswith('Line 2:')
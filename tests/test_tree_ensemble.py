@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+import xgboost as xgb
+from serving import BundledModel, TreeEnsemble
+
+N_FEATURES = 6
+FEATURE_NAMES = [f'f{i}' for i in range(N_FEATURES)]
+
+
+def _data(n, seed):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, N_FEATURES)).astype(np.float32)
+    y = (X[:, 0] + 0.5 * X[:, 1] * X[:, 2] + rng.normal(scale=0.5, size=n) > 0).astype(int)
+    # Missing values in training give splits both default directions
+    X[rng.random(X.shape) < 0.15] = np.nan
+    return X, y
+
+
+@pytest.fixture(scope='module')
+def booster():
+    X, y = _data(2000, 0)
+    model = xgb.XGBClassifier(n_estimators=60, max_depth=5, learning_rate=0.2, min_child_weight=5,
+                              n_jobs=1, random_state=0)
+    model.fit(X, y)
+    return model.get_booster()
+
+
+@pytest.fixture(scope='module')
+def rows(booster):
+    X, _ = _data(5000, 1)
+    # Put some values exactly on split thresholds, which go right (x < threshold goes left)
+    ensemble = TreeEnsemble.from_booster(booster, FEATURE_NAMES)
+    splits = ensemble.thresholds != 0
+    features, thresholds = ensemble.features[splits], ensemble.thresholds[splits]
+    rng = np.random.default_rng(2)
+    picks = rng.integers(len(features), size=1000)
+    X[rng.integers(len(X), size=1000), features[picks]] = thresholds[picks]
+    return X
+
+
+def test_matches_xgboost(booster, rows):
+    # More rows than one block, so blocks are stitched together
+    assert len(rows) > TreeEnsemble.BLOCK_ROWS
+    ensemble = TreeEnsemble.from_booster(booster, FEATURE_NAMES)
+    # Margins are summed in XGBoost's order, so they match bit for bit
+    np.testing.assert_array_equal(ensemble.predict_margin(rows), booster.inplace_predict(rows, predict_type='margin'))
+    np.testing.assert_allclose(ensemble.predict_proba(rows), booster.inplace_predict(rows), rtol=0, atol=1e-6)
+    ensemble.check(booster, rows)
+
+
+def test_iteration_range(booster, rows):
+    ensemble = TreeEnsemble.from_booster(booster, FEATURE_NAMES, iteration_range=(0, 20))
+    assert len(ensemble.features) == 20
+    np.testing.assert_allclose(ensemble.predict_proba(rows),
+                               booster.inplace_predict(rows, iteration_range=(0, 20)), rtol=0, atol=1e-6)
+
+
+def test_shallow_trees():
+    # Depth-1 stumps and trees of mixed depth are padded to complete trees
+    X, y = _data(500, 3)
+    booster = xgb.XGBClassifier(n_estimators=10, max_depth=1, n_jobs=1).fit(X, y).get_booster()
+    ensemble = TreeEnsemble.from_booster(booster, FEATURE_NAMES)
+    assert ensemble.depth == 1
+    ensemble.check(booster, X)
+
+
+def test_check_rejects_disagreement(booster, rows):
+    ensemble = TreeEnsemble.from_booster(booster, FEATURE_NAMES)
+    ensemble.leaf_values = ensemble.leaf_values.copy()
+    ensemble.leaf_values[0, 0] += 0.5
+    with pytest.raises(ValueError, match="disagrees with XGBoost"):
+        ensemble.check(booster, rows)
+
+
+def test_rejects_unsupported_models():
+    X, _ = _data(300, 4)
+    y = np.arange(len(X)) % 3
+    multiclass = xgb.XGBClassifier(n_estimators=3, max_depth=2, n_jobs=1).fit(X, y).get_booster()
+    with pytest.raises(ValueError):
+        TreeEnsemble.from_booster(multiclass, FEATURE_NAMES)
+    regressor = xgb.XGBRegressor(n_estimators=3, max_depth=2, n_jobs=1).fit(X, y).get_booster()
+    with pytest.raises(ValueError, match="Unsupported objective"):
+        TreeEnsemble.from_booster(regressor, FEATURE_NAMES)
+    dart = xgb.XGBClassifier(n_estimators=3, max_depth=2, booster='dart', n_jobs=1).fit(X, y % 2).get_booster()
+    with pytest.raises(ValueError, match="Unsupported booster"):
+        TreeEnsemble.from_booster(dart, FEATURE_NAMES)
+    booster = xgb.XGBClassifier(n_estimators=3, max_depth=2, n_jobs=1).fit(X, y % 2).get_booster()
+    with pytest.raises(ValueError, match="Unsupported missing value"):
+        TreeEnsemble.from_booster(booster, FEATURE_NAMES, missing=-1.0)
+
+
+def test_bundled_model_falls_back_to_booster(rows):
+    X, y = _data(500, 5)
+    X = np.nan_to_num(X, nan=-999.0)
+    model = xgb.XGBClassifier(n_estimators=10, max_depth=3, booster='dart', missing=-999.0, n_jobs=1).fit(X, y)
+    booster = model.get_booster()
+    bundled = BundledModel(FEATURE_NAMES, booster.save_raw('ubj'), missing=-999.0)
+    bundled.set_booster_params({'nthread': 1})
+    # The booster is only loaded (and xgboost imported) when the first prediction is scored
+    assert bundled._booster is None
+    np.testing.assert_array_equal(bundled.predict_proba(rows), booster.inplace_predict(rows, missing=-999.0))
+    assert bundled._booster is not None
+
+
+def test_bundled_model_scores_with_trees(booster, rows):
+    trees = TreeEnsemble.from_booster(booster, FEATURE_NAMES)
+    bundled = BundledModel(FEATURE_NAMES, booster.save_raw('ubj'), trees=trees)
+    np.testing.assert_array_equal(bundled.predict_proba(rows), trees.predict_proba(rows))
+    assert bundled._booster is None